@@ -0,0 +1,450 @@
+"""
+File: anomaly.py
+Author: Ben Miller
+Brief: Flags meters whose 15 minute readings suddenly spike or flatline using rolling
+       median/MAD or z-score windows computed across every meter at once.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import numpy as np
+import pandas as pd
+import convert
+
+# Joins the meter and utility of a matrix column, meters without an id share the site name across utilities
+SERIES_SEPARATOR = "\x1f"
+
+def utility_column(columns: pd.Index) -> str | None:
+    """
+    Picks the column that tells the utilities of a meter apart.
+
+    Converted data keeps the utility (its units are all kJ), raw data only has its units.
+
+    Args:
+        columns: pd.Index - the columns of the meter data
+
+    Return:
+        str | None (utility, readingunits or None when there is neither)
+    """
+    for col in ["utility", "readingunits"]:
+        if col in columns:
+            return col
+
+    return None
+
+"""
+Brief: Rolling window anomaly engine over converted meter data. Readings are pivoted into
+       a time x series matrix, one column per meter and utility, so every rolling statistic is
+       one call over all meters, and the tail of the matrix is carried between calls so new
+       windows can be streamed in.
+"""
+class anomaly_detector:
+    def __init__(
+        self,
+        window: int = 96,
+        threshold: float = 3.5,
+        method: str = "mad",
+        flatline_window: int = 8,
+        min_periods: int | None = None,
+        freq: str = "15min",
+        meter_column: str | None = None
+    ) -> None:
+        """
+        Creates the anomaly detector.
+
+        A reading is a spike when it sits more than threshold robust standard deviations away
+        from the trailing window (the reading itself is not part of its own baseline). A meter
+        is flatlined when flatline_window consecutive readings are identical.
+
+        Args:
+            window: int - the number of trailing intervals in the baseline window (96 = one day)
+            threshold: float - the score above which a reading is flagged as a spike
+            method: str - "mad" for rolling median/MAD or "zscore" for rolling mean/std
+            flatline_window: int - the number of identical consecutive readings flagged as a flatline
+            min_periods: int | None - the readings needed in the window before scoring, defaults to half the window
+            freq: str - the reading interval that the time axis is regularized to
+            meter_column: str | None - the meter identifier column, picked by convert.meter_key_column when None
+
+        Return:
+            None (anomaly_detector is instantiated)
+        """
+        if (method not in ["mad", "zscore"]):
+            raise ValueError(f"Unknown anomaly method: {method}")
+
+        self.window = window
+        self.threshold = threshold
+        self.method = method
+        self.flatline_window = flatline_window
+        self.min_periods = min_periods if min_periods is not None else max(window // 2, 1)
+        self.freq = pd.Timedelta(freq)
+        self.meter_column = meter_column
+
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forgets all streamed history and open intervals.
+
+        Args:
+            None
+
+        Return:
+            None
+        """
+        # Trailing rows of the time x meter matrix needed to score the next chunk
+        self.history = pd.DataFrame()
+        # Last timestamp that has already been scored, per meter (meters may arrive in any order)
+        self.watermark = pd.Series(dtype="datetime64[ns]")
+        # Intervals still running at the end of the last chunk, one row per (meter, kind)
+        self.open_intervals = pd.DataFrame(columns=["meter", "kind", "start", "last", "n_intervals", "peak_score"])
+
+    def pivot(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Turns long meter rows into a regular time x series matrix of reading values.
+
+        Every meter and utility is its own column, without a meter id the meter is the site
+        name and the steam, chilled water and electricity readings of a site would otherwise
+        be averaged together. Duplicate readings for the same series and window are averaged
+        and missing intervals become NaN.
+
+        Args:
+            data: pd.DataFrame - converted meter data (readingvalue, readingwindowstart, a meter column
+                                 and utility or readingunits)
+
+        Return:
+            pd.DataFrame (the reading matrix indexed by window start with one column per series)
+        """
+        if (self.meter_column is None):
+            self.meter_column = convert.meter_key_column(data.columns)
+
+        series = data[self.meter_column].astype(str)
+        utility = utility_column(data.columns)
+        if (utility is not None):
+            series = series + SERIES_SEPARATOR + data[utility].fillna("unknown").astype(str)
+
+        wide = pd.pivot_table(
+            pd.DataFrame({
+                "time": pd.to_datetime(data["readingwindowstart"]),
+                "meter": series,
+                "value": pd.to_numeric(data["readingvalue"], errors="coerce")
+            }),
+            index="time",
+            columns="meter",
+            values="value",
+            aggfunc="mean"
+        )
+
+        if (len(wide) == 0):
+            return wide
+
+        grid = pd.date_range(wide.index.min(), wide.index.max(), freq=self.freq)
+        return wide.reindex(grid)
+
+    def score(self, wide: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Computes the spike scores and flatline flags for every meter at once.
+
+        Args:
+            wide: pd.DataFrame - the time x meter reading matrix
+
+        Return:
+            tuple[pd.DataFrame, pd.DataFrame] (the signed spike scores and the flatline flags)
+        """
+        baseline = wide.shift(1).rolling(self.window, min_periods=self.min_periods)
+
+        if (self.method == "mad"):
+            center = baseline.median()
+            deviation = (wide.shift(1) - center).abs()
+            spread = 1.4826 * deviation.rolling(self.window, min_periods=self.min_periods).median()
+        else:
+            center = baseline.mean()
+            spread = baseline.std()
+
+        # A constant baseline has no spread to scale by, those meters are covered by the flatline check
+        scores = (wide - center) / spread.where(spread > 0)
+
+        recent = wide.rolling(self.flatline_window, min_periods=self.flatline_window)
+        flatlines = (recent.max() - recent.min()) == 0
+
+        return scores, flatlines
+
+    def intervals(self, flags: pd.DataFrame, scores: pd.DataFrame, kind: str) -> pd.DataFrame:
+        """
+        Collapses a flag matrix into one row per run of consecutive flagged intervals.
+
+        Runs that were still open at the end of the previous chunk are continued, runs that
+        are still open at the end of this chunk are kept in self.open_intervals.
+
+        Args:
+            flags: pd.DataFrame - the time x meter boolean flags
+            scores: pd.DataFrame - the time x meter scores, the largest absolute score of a run is reported
+            kind: str - the label of the anomaly ("spike" or "flatline")
+
+        Return:
+            pd.DataFrame (the closed intervals: meter, kind, start, last, n_intervals, peak_score)
+        """
+        n_rows, n_meters = flags.shape
+        meters = flags.columns.to_numpy()
+        times = flags.index
+
+        carried = self.open_intervals[self.open_intervals["kind"] == kind].set_index("meter").reindex(meters)
+        was_open = carried["start"].notna().to_numpy()
+
+        # +1 on the row a run starts and -1 one row after a run ends (row n_rows means still open)
+        padded = np.vstack((was_open, flags.to_numpy(dtype=bool), np.zeros(n_meters, dtype=bool))).astype(np.int8)
+        edges = np.diff(padded, axis=0).T
+        start_meters, start_rows = np.nonzero(edges == 1)
+        end_meters, end_rows = np.nonzero(edges == -1)
+
+        # Runs carried over from the previous chunk start on row 0, so after sorting by
+        # meter then row the i-th start always pairs with the i-th end
+        continued = np.concatenate((np.zeros(len(start_rows), dtype=bool), np.ones(was_open.sum(), dtype=bool)))
+        start_meters = np.concatenate((start_meters, np.flatnonzero(was_open)))
+        start_rows = np.concatenate((start_rows, np.zeros(was_open.sum(), dtype=np.int64)))
+        order = np.lexsort((start_rows, start_meters))
+        start_meters, start_rows, continued = start_meters[order], start_rows[order], continued[order]
+
+        # Largest absolute score inside every run, reduced over the column-major flattened matrix
+        abs_scores = np.nan_to_num(np.abs(scores.to_numpy(dtype=float)), nan=0.0).T.ravel()
+        abs_scores = np.append(abs_scores, 0.0)
+        starts_flat = start_meters * n_rows + start_rows
+        ends_flat = end_meters * n_rows + end_rows
+        if (len(starts_flat) > 0):
+            peak = np.maximum.reduceat(abs_scores, np.column_stack((starts_flat, ends_flat)).ravel())[::2]
+            peak = np.where(ends_flat > starts_flat, peak, 0.0)
+        else:
+            peak = np.zeros(0)
+
+        runs = pd.DataFrame({
+            "meter": meters[start_meters],
+            "kind": kind,
+            "start": times[start_rows],
+            "last": times[np.maximum(end_rows - 1, 0)],
+            "n_intervals": end_rows - start_rows,
+            "peak_score": peak,
+            "is_open": end_rows == n_rows
+        })
+
+        # Carried runs keep their original start, count and best score
+        if (continued.any()):
+            previous = carried.loc[meters[start_meters[continued]]]
+            stopped = (end_rows[continued] == 0)
+            runs.loc[continued, "start"] = previous["start"].to_numpy()
+            runs.loc[continued, "n_intervals"] += previous["n_intervals"].to_numpy().astype(np.int64)
+            runs.loc[continued, "peak_score"] = np.maximum(peak[continued], previous["peak_score"].to_numpy(dtype=float))
+            runs.loc[continued, "last"] = np.where(stopped, previous["last"].to_numpy(), runs.loc[continued, "last"].to_numpy())
+
+        replaced = (self.open_intervals["kind"] == kind) & self.open_intervals["meter"].isin(meters)
+        self.open_intervals = pd.concat([
+            self.open_intervals[~replaced],
+            runs[runs["is_open"]].drop(columns="is_open")
+        ], ignore_index=True)
+
+        return runs[~runs["is_open"]].drop(columns="is_open")
+
+    def update(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Streams a new chunk of converted meter data through the detector.
+
+        The chunk is scored together with the carried history so the rolling windows are
+        continuous across chunks. Every meter keeps its own watermark and is only flagged
+        between it and its newest reading in the chunk, so the data can arrive in any meter
+        order (the converter writes it unit by unit), only readings of a meter at or before
+        its own watermark are ignored.
+
+        Args:
+            data: pd.DataFrame - the next chunk of converted meter data
+
+        Return:
+            pd.DataFrame (the flagged intervals that closed within this chunk)
+        """
+        try:
+            new = self.pivot(data)
+            if (len(new) == 0):
+                return self.format_intervals(self.open_intervals.iloc[0:0])
+
+            meters = new.columns
+            wide = new
+            if (len(self.history) > 0):
+                # Only the history of the meters in this chunk is needed to continue their windows
+                history = self.history.reindex(columns=meters).dropna(how="all")
+                wide = wide.combine_first(history)
+                wide = wide.reindex(pd.date_range(wide.index.min(), wide.index.max(), freq=self.freq))
+
+            scores, flatlines = self.score(wide)
+            spikes = scores.abs() > self.threshold
+
+            # Meters sharing the same scoring range are flagged together
+            bounds = pd.DataFrame({
+                "lower": self.watermark.reindex(meters),
+                "upper": new.notna().iloc[::-1].idxmax()
+            })
+            closed = []
+            for (lower, upper), group in bounds.groupby(["lower", "upper"], dropna=False):
+                rows = (wide.index <= upper) & ((wide.index > lower) if pd.notna(lower) else True)
+                if (not rows.any()):
+                    continue
+
+                columns = group.index
+                closed.append(self.intervals(spikes.loc[rows, columns], scores.loc[rows, columns], "spike"))
+                closed.append(self.intervals(flatlines.loc[rows, columns], flatlines.loc[rows, columns].astype(float), "flatline"))
+
+            self.watermark = pd.concat([self.watermark, bounds["upper"]]).groupby(level=0).max()
+
+            # The MAD spread is a rolling median over deviations from rolling medians, so two windows are needed
+            keep = 2 * self.window + self.flatline_window
+            history = wide.combine_first(self.history) if len(self.history) > 0 else wide
+            cutoff = (self.watermark.reindex(history.columns) - keep * self.freq).to_numpy()
+            self.history = history.where(history.index.to_numpy()[:, None] > cutoff[None, :]).dropna(how="all")
+
+            if (len(closed) == 0):
+                return self.format_intervals(self.open_intervals.iloc[0:0])
+
+            return self.format_intervals(pd.concat(closed, ignore_index=True))
+        except Exception as e:
+            print(f"Error occured in {self.update.__name__}: {e}")
+            raise RuntimeError(f"Error occured in {self.update.__name__}") from e
+
+    def flush(self) -> pd.DataFrame:
+        """
+        Closes and returns every interval that is still open at the end of the stream.
+
+        Args:
+            None
+
+        Return:
+            pd.DataFrame (the remaining flagged intervals)
+        """
+        closed = self.open_intervals
+        self.open_intervals = closed.iloc[0:0]
+        return self.format_intervals(closed)
+
+    def format_intervals(self, runs: pd.DataFrame) -> pd.DataFrame:
+        """
+        Turns raw runs into the compact flagged interval table.
+
+        A flatline is only detected once flatline_window identical readings have been seen,
+        so its start is moved back to the first identical reading. The end is exclusive.
+        The series of every run is split back into its meter and utility.
+
+        Args:
+            runs: pd.DataFrame - meter (the series), kind, start, last, n_intervals, peak_score
+
+        Return:
+            pd.DataFrame (meter, utility (the units of data without one), kind, start, end, n_intervals,
+                          peak_score sorted by start)
+        """
+        runs = runs.copy()
+        series = runs["meter"].astype(str).str.split(SERIES_SEPARATOR, n=1, regex=False)
+        runs["meter"] = series.str[0]
+        runs["utility"] = series.str[1]
+        runs["start"] = pd.to_datetime(runs["start"])
+        runs["last"] = pd.to_datetime(runs["last"])
+        runs["n_intervals"] = runs["n_intervals"].astype(np.int64)
+        runs["peak_score"] = runs["peak_score"].astype(float)
+
+        flat = runs["kind"] == "flatline"
+        lead = self.freq * (self.flatline_window - 1)
+        runs.loc[flat, "start"] = runs.loc[flat, "start"] - lead
+        runs.loc[flat, "n_intervals"] += self.flatline_window - 1
+        runs.loc[flat, "peak_score"] = np.nan
+
+        runs["end"] = runs["last"] + self.freq
+
+        return runs[["meter", "utility", "kind", "start", "end", "n_intervals", "peak_score"]]\
+            .sort_values(["start", "meter", "utility"])\
+            .reset_index(drop=True)
+
+    def detect(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Scores a complete dataset in one batch, forgetting any previous stream.
+
+        Args:
+            data: pd.DataFrame - converted meter data
+
+        Return:
+            pd.DataFrame (every flagged interval)
+        """
+        self.reset()
+        return pd.concat([self.update(data), self.flush()], ignore_index=True)
+
+def detect_file(input_file: str, output_file: str, chunksize: int = 500_000, **kwargs) -> pd.DataFrame:
+    """
+    Streams a converted meter csv file through the detector chunk by chunk and writes the flagged intervals.
+
+    Description.
+
+    Args:
+        input_file: str - the converted meter csv file
+        output_file: str - the csv file that the flagged intervals are written to
+        chunksize: int - the number of rows read per chunk
+        kwargs - passed on to anomaly_detector
+
+    Return:
+        pd.DataFrame (every flagged interval)
+    """
+    detector = anomaly_detector(**kwargs)
+    found = [detector.update(chunk) for chunk in pd.read_csv(input_file, chunksize=chunksize)]
+    found.append(detector.flush())
+
+    flagged = pd.concat(found, ignore_index=True)
+    flagged.to_csv(output_file, index=False)
+    return flagged
+
+if __name__ == '__main__':
+    """
+    Simple test cases for anomaly are executed because of Debugging purposes.
+
+    Description.
+
+    Args:
+        None
+
+    Return:
+        None (test cases are executed)
+    """
+    import os
+    import tempfile
+
+    # Two meters with a planted spike each, written meter by meter like the converter does
+    times = pd.date_range("2025-01-01", periods=4 * 96, freq="15min")
+    rng = np.random.default_rng(0)
+    meters = []
+    for meter, spike in [("A", 200), ("B", 300)]:
+        values = 10 + rng.normal(0, 1, len(times))
+        values[spike] = 60
+        meters.append(pd.DataFrame({
+            "meterid": meter,
+            "sitename": "Building",
+            "readingwindowstart": times.strftime("%Y-%m-%dT%H:%M:%S"),
+            "readingvalue": values
+        }))
+    data = pd.concat(meters, ignore_index=True)
+
+    expected = anomaly_detector().detect(data)
+    print(expected)
+    assert set(expected.loc[expected["kind"] == "spike", "meter"]) == {"A", "B"}
+
+    # Without a meter id the utilities of a site are still scored apart, a steam spike is not
+    # averaged away by the electricity readings of the same windows
+    values = 10 + rng.normal(0, 1, len(times))
+    values[100] = 60
+    site = pd.DataFrame({
+        "sitename": "Building",
+        "readingwindowstart": np.tile(times.strftime("%Y-%m-%dT%H:%M:%S"), 2),
+        "readingvalue": np.concatenate((values, 1000 + rng.normal(0, 10, len(times)))),
+        "utility": np.repeat(["steam", "electricity"], len(times))
+    })
+    found = anomaly_detector().detect(site)
+    print(found)
+    assert ((found["kind"] == "spike") & (found["utility"] == "steam") & (found["start"] == times[100])).any()
+
+    with tempfile.TemporaryDirectory() as folder:
+        data.to_csv(os.path.join(folder, "meters.csv"), index=False)
+        for chunksize in [600, 97, 384]:
+            found = detect_file(os.path.join(folder, "meters.csv"), os.path.join(folder, "anomalies.csv"), chunksize=chunksize)
+            found = found.sort_values(["start", "meter", "kind"]).reset_index(drop=True)
+            pd.testing.assert_frame_equal(found, expected.sort_values(["start", "meter", "kind"]).reset_index(drop=True))
+            print(f"chunksize {chunksize}: same {len(found)} intervals as a single chunk")
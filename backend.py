@@ -0,0 +1,335 @@
+"""
+File: backend.py
+Author: Ben Miller
+Brief: Query backends for the regression stages. The stages are written once against the
+       backend interface, pandas is always available and a lazy, multi-threaded Polars
+       backend is used when Polars is installed.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import numpy as np
+import pandas as pd
+import regression as rg
+import spatial
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+"""
+Brief: Eager pandas backend, the meter data is streamed in chunks and every chunk materializes
+       its intermediates. This is the reference implementation that the other backends must match.
+"""
+class pandas_backend:
+    name = "pandas"
+
+    def energy_stage(self, energy: str | pd.DataFrame, area: pd.DataFrame, spatial_index: spatial.spatial_index | None = None, consumers: list | None = None, chunksize: int = 500_000) -> tuple[pd.DataFrame, tuple]:
+        """
+        Joins the meter data with the building table and computes the hourly energy in one pass.
+
+        Every joined chunk is also handed to the consumers (anything with an update method taking
+        the joined rows, like the rollup cube, the peak tracker and the quantile sketch), so they
+        are built from the same pass instead of reading the meter file again.
+
+        Args:
+            energy: str | pd.DataFrame - the converted meter csv file or its rows
+            area: pd.DataFrame - the building table with a normalized location column
+            spatial_index: spatial.spatial_index | None - resolves meters by location when given
+            consumers: list | None - updated with every chunk of regression.join_energy_area
+            chunksize: int - the number of rows read per chunk
+
+        Return:
+            tuple[pd.DataFrame, tuple] (regression.hourly_energy and the first and last reading time)
+        """
+        chunks = pd.read_csv(energy, chunksize=chunksize) if isinstance(energy, str) else [energy]
+
+        hourly, firsts, lasts = [], [], []
+        for chunk in chunks:
+            merged = rg.join_energy_area(chunk, area, spatial_index)
+            for consumer in consumers or []:
+                consumer.update(merged)
+
+            hourly.append(rg.hourly_energy(merged))
+            firsts.append(merged["time"].min())
+            lasts.append(merged["time"].max())
+
+        # A building hour split over two chunks is added back together
+        hourly = pd.concat(hourly, ignore_index=True)\
+            .groupby(["location", "minutely_15"], as_index=False)["energy_per_sqft"].sum()
+
+        return hourly, (pd.Series(firsts).min(), pd.Series(lasts).max())
+
+    def weather_stage(self, energy_hourly: pd.DataFrame, building_cells: pd.DataFrame, weather_hourly: pd.DataFrame, alpha: float | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Joins the hourly energy with the hourly weather and computes the weather normalized stats.
+
+        Args:
+            energy_hourly: pd.DataFrame - the hourly energy from energy_stage
+            building_cells: pd.DataFrame - location -> cell_y, cell_x
+            weather_hourly: pd.DataFrame - the output of regression.hourly_weather
+            alpha: float | None - the humidity weight of the weather load, defaults to regression.ALPHA
+
+        Return:
+            tuple[pd.DataFrame, pd.DataFrame] (regression.join_weather and regression.weather_stats)
+        """
+        if (alpha is None):
+            alpha = rg.ALPHA
+        energy_weather = rg.join_weather(energy_hourly, building_cells, weather_hourly, alpha)
+        return energy_weather, rg.weather_stats(energy_weather)
+
+def reading_times(column: "pl.Expr") -> "pl.Expr":
+    """
+    Parses ISO 8601 reading times with explicit formats instead of letting Polars guess one
+    from the first rows, which fails on files that mix offsets or separators.
+
+    Times with an offset ("Z", "+00:00", "-05:00") are converted to UTC, times without one
+    are kept as they are, both as naive datetimes. Times that match neither are null.
+
+    Args:
+        column: pl.Expr - the reading time column
+
+    Return:
+        pl.Expr (the parsed times)
+    """
+    text = column.cast(pl.String).str.replace(" ", "T", literal=True)
+    with_offset = text.str.to_datetime("%Y-%m-%dT%H:%M:%S%.f%#z", time_zone="UTC", strict=False).dt.replace_time_zone(None)
+    return with_offset.fill_null(text.str.to_datetime("%Y-%m-%dT%H:%M:%S%.f", strict=False))
+
+"""
+Brief: Lazy Polars backend. The csv is scanned lazily so the readingvalue > 0 and weather_load > 30
+       filters are pushed down into the scan, and the energy stage runs as one streamed plan on
+       all cores.
+"""
+class polars_backend:
+    name = "polars"
+
+    def __init__(self) -> None:
+        """
+        Creates the Polars backend.
+
+        Args:
+            None
+
+        Return:
+            None (polars_backend is instantiated, raises ImportError without Polars)
+        """
+        if (pl is None):
+            raise ImportError("The polars backend needs the polars package")
+
+    def energy_stage(self, energy: str | pd.DataFrame, area: pd.DataFrame, spatial_index: spatial.spatial_index | None = None, consumers: list | None = None, chunksize: int = 500_000) -> tuple[pd.DataFrame, tuple]:
+        """
+        See pandas_backend.energy_stage. Without consumers the hourly energy and time range run
+        from one shared lazy plan, with consumers the joined rows are streamed in batches through
+        them and the hourly energy is added up batch by batch.
+        """
+        lazy = pl.scan_csv(energy) if isinstance(energy, str) else pl.from_pandas(energy).lazy()
+        lazy = lazy.with_columns(location=pl.col("sitename").str.to_lowercase().str.strip_chars())
+
+        columns = lazy.collect_schema().names()
+        if (spatial_index is not None and "latitude" in columns and "longitude" in columns):
+            # Meters whose site name matches no building but that carry a location
+            sites = lazy.select("location", "latitude", "longitude").unique("location").collect().to_pandas()
+            renames = spatial.location_renames(sites, spatial_index, area["location"])
+            if (len(renames) > 0):
+                lazy = lazy.with_columns(pl.col("location").replace(renames))
+
+        merged = (
+            lazy
+            .filter(pl.col("readingvalue") > 0)
+            .join(pl.from_pandas(area[["location", "grossarea"]]).lazy(), on="location", how="inner")
+            .with_columns(
+                energy_per_sqft=pl.col("readingvalue") / pl.col("grossarea"),
+                time=reading_times(pl.col("readingtime"))
+            )
+            .with_columns(minutely_15=pl.col("time").dt.truncate("1h"))
+        )
+
+        if (not consumers):
+            hourly = merged.group_by("location", "minutely_15").agg(
+                energy_per_sqft=pl.col("energy_per_sqft").sum()
+            ).sort("location", "minutely_15")
+            time_range = merged.select(first=pl.col("time").min(), last=pl.col("time").max())
+            hourly, time_range = pl.collect_all([hourly, time_range])
+        else:
+            hourly, time_range = [], []
+            for batch in merged.collect_batches(chunk_size=chunksize):
+                joined = batch.to_pandas()
+                for consumer in consumers:
+                    consumer.update(joined)
+
+                hourly.append(batch.group_by("location", "minutely_15").agg(energy_per_sqft=pl.col("energy_per_sqft").sum()))
+                time_range.append(batch.select(first=pl.col("time").min(), last=pl.col("time").max()))
+
+            hourly = pl.concat(hourly).group_by("location", "minutely_15").agg(
+                energy_per_sqft=pl.col("energy_per_sqft").sum()
+            ).sort("location", "minutely_15")
+            time_range = pl.concat(time_range).select(first=pl.col("first").min(), last=pl.col("last").max())
+
+        return (
+            hourly.to_pandas(),
+            (pd.Timestamp(time_range["first"][0]), pd.Timestamp(time_range["last"][0]))
+        )
+
+    def weather_stage(self, energy_hourly: pd.DataFrame, building_cells: pd.DataFrame, weather_hourly: pd.DataFrame, alpha: float | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        See pandas_backend.weather_stage.
+        """
+        if (alpha is None):
+            alpha = rg.ALPHA
+        weather = pl.from_pandas(weather_hourly).lazy().with_columns(
+            weather_load=pl.col("apparent_temp") + alpha * (pl.col("humidity") / 100)
+        )
+
+        energy_weather = (
+            pl.from_pandas(energy_hourly).lazy()
+            .join(pl.from_pandas(building_cells).lazy(), on="location", how="inner")
+            .join(weather, on=["cell_y", "cell_x", "minutely_15"], how="inner")
+            .filter(pl.col("weather_load") > rg.WEATHER_LOAD_CUTOFF)
+            .with_columns(energy_weather_norm=pl.col("energy_per_sqft") / pl.col("weather_load"))
+        )
+
+        stats_weather = energy_weather.group_by("location").agg(
+            best=pl.col("energy_weather_norm").min(),
+            worst=pl.col("energy_weather_norm").max(),
+            variance=pl.col("energy_weather_norm").var()
+        ).sort("location")
+
+        energy_weather, stats_weather = pl.collect_all([energy_weather, stats_weather])
+        return energy_weather.to_pandas(), stats_weather.to_pandas()
+
+BACKENDS = {
+    "pandas": pandas_backend,
+    "polars": polars_backend
+}
+
+def get_backend(name: str = "auto"):
+    """
+    Creates a backend by name.
+
+    "auto" picks Polars when it is installed and falls back to pandas otherwise.
+
+    Args:
+        name: str - "auto", "pandas" or "polars"
+
+    Return:
+        pandas_backend | polars_backend (the backend)
+    """
+    if (name == "auto"):
+        name = "polars" if pl is not None else "pandas"
+    if (name not in BACKENDS):
+        raise ValueError(f"Unknown backend: {name}")
+
+    return BACKENDS[name]()
+
+def compare_backends(meter_file: str, building_file: str, weather: tuple[pd.DataFrame, pd.DataFrame] | None = None, rtol: float = 1e-9) -> bool:
+    """
+    Runs the stages on both backends and checks that they give identical hourly energy and statistics.
+
+    Args:
+        meter_file: str - the converted meter csv file
+        building_file: str - the converted building csv file
+        weather: tuple[pd.DataFrame, pd.DataFrame] | None - the output of weather.weather_for_buildings,
+                                                           the weather stage is skipped when None
+        rtol: float - the relative tolerance for floating point differences in summation order
+
+    Return:
+        bool (True when every statistic matches)
+    """
+    results = {}
+    for name in ["pandas", "polars"]:
+        area = pd.read_csv(building_file)
+        area["location"] = area["buildingname"].str.lower().str.strip()
+        index = spatial.spatial_index(area)
+
+        stage = get_backend(name)
+        hourly, _ = stage.energy_stage(meter_file, area, index)
+        results[name] = [hourly.assign(minutely_15=hourly["minutely_15"].astype("datetime64[ns]").astype("int64"))]
+
+        if (weather is not None):
+            building_cells, weather_cells = weather
+            _, stats_weather = stage.weather_stage(hourly, building_cells, rg.hourly_weather(weather_cells.copy()))
+            results[name].append(stats_weather)
+
+    same = True
+    for expected, actual in zip(results["pandas"], results["polars"]):
+        keys = [column for column in ["location", "minutely_15"] if column in expected.columns]
+        expected = expected.sort_values(keys).reset_index(drop=True)
+        actual = actual.sort_values(keys).reset_index(drop=True)
+        numeric = expected.columns.drop("location")
+
+        same = same and list(expected["location"]) == list(actual["location"])
+        same = same and np.allclose(
+            expected[numeric].to_numpy(dtype=float),
+            actual[numeric].to_numpy(dtype=float),
+            rtol=rtol,
+            equal_nan=True
+        )
+
+    return bool(same)
+
+if __name__ == "__main__":
+    """
+    Simple test cases for backend are executed because of Debugging purposes, checks that both
+    backends give identical hourly energy and weather normalized statistics.
+
+    Description.
+
+    Args:
+        None
+
+    Return:
+        None (test cases are executed)
+    """
+    import os
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2025-01-01", periods=7 * 96, freq="15min")
+    meters = pd.concat([
+        pd.DataFrame({
+            "meterid": f"M{building}",
+            "sitename": f" Building {building}",
+            "readingtime": times.strftime("%Y-%m-%dT%H:%M:%S"),
+            "readingvalue": rng.gamma(4, 25, len(times)) * rng.choice([1, -1], len(times), p=[0.95, 0.05])
+        })
+        for building in range(20)
+    ], ignore_index=True)
+    buildings = pd.DataFrame({
+        "buildingname": [f"building {building}" for building in range(18)],
+        "grossarea": rng.uniform(1_000, 50_000, 18),
+        "latitude": 40.0,
+        "longitude": -83.0
+    })
+
+    # Two weather cells, cold enough at night that the weather_load > 30 filter drops some hours
+    building_cells = pd.DataFrame({
+        "location": buildings["buildingname"],
+        "cell_y": np.where(np.arange(18) < 9, 400.0, 401.0),
+        "cell_x": -830.0
+    })
+    weather_cells = pd.concat([
+        pd.DataFrame({
+            "cell_y": cell_y,
+            "cell_x": -830.0,
+            "time": times,
+            "apparent_temp": 35 + 20 * np.sin(2 * np.pi * (times.hour.to_numpy() - 9) / 24) + rng.normal(0, 2, len(times)),
+            "humidity": rng.uniform(20, 90, len(times))
+        })
+        for cell_y in [400.0, 401.0]
+    ], ignore_index=True)
+
+    with tempfile.TemporaryDirectory() as folder:
+        meter_file, building_file = os.path.join(folder, "output.csv"), os.path.join(folder, "buildings.csv")
+        meters.to_csv(meter_file, index=False)
+        buildings.to_csv(building_file, index=False)
+        same = compare_backends(meter_file, building_file, (building_cells, weather_cells))
+        print(f"Backends identical: {same}")
+        assert same
+
+    # Offsets and separators are parsed by format, not guessed from the first rows
+    mixed = pl.Series(["2025-01-01T00:00:00", "2025-01-01 01:15:00.5", "2025-01-01T00:00:00Z", "2025-01-01T00:00:00-05:00"])
+    print(pl.select(reading_times(pl.lit(mixed))).to_series().to_list())
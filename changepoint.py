@@ -0,0 +1,377 @@
+"""
+File: changepoint.py
+Author: Ben Miller
+Brief: Fits per building change point (degree day) models of daily energy against outdoor
+       temperature, the balance temperatures are found by a grid search evaluated for every
+       building and candidate at once.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import numpy as np
+import pandas as pd
+
+# Number of fitted parameters of every model, the balance temperatures count as parameters
+MODEL_PARAMETERS = {
+    "1P": 1,
+    "3PH": 3,
+    "3PC": 3,
+    "5P": 5
+}
+MODEL_PARAMETERS_ARRAY = np.array(list(MODEL_PARAMETERS.values()))
+
+def daily_energy_weather(energy_hourly: pd.DataFrame, building_cells: pd.DataFrame, weather_hourly: pd.DataFrame) -> pd.DataFrame:
+    """
+    Joins the hourly energy of every building with the weather of its weather cell and averages it per day.
+
+    Unlike regression.join_weather no weather load cutoff is applied, the cold days are what
+    the heating part of the models is fitted on.
+
+    Args:
+        energy_hourly: pd.DataFrame - the output of regression.hourly_energy
+        building_cells: pd.DataFrame - location -> cell_y, cell_x (see weather.weather_for_buildings)
+        weather_hourly: pd.DataFrame - the output of regression.hourly_weather
+
+    Return:
+        pd.DataFrame (location, day, energy_per_sqft (the mean hourly energy), apparent_temp and humidity)
+    """
+    joined = energy_hourly.merge(building_cells, on="location", how="inner").merge(
+        weather_hourly,
+        on=["cell_y", "cell_x", "minutely_15"],
+        how="inner"
+    )
+    joined["day"] = joined["minutely_15"].dt.floor("D")
+
+    return (
+        joined
+        .groupby(["location", "day"])
+        .agg(
+            energy_per_sqft=("energy_per_sqft", "mean"),
+            apparent_temp=("apparent_temp", "mean"),
+            humidity=("humidity", "mean")
+        )
+        .reset_index()
+    )
+
+def simple_fit(n: np.ndarray, sy: np.ndarray, syy: np.ndarray, sx: np.ndarray, sxx: np.ndarray, sxy: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Solves y = intercept + slope * x by least squares from the running sums.
+
+    Every argument broadcasts, so one call fits every building and candidate.
+
+    Args:
+        n: np.ndarray - the number of observations
+        sy: np.ndarray - the sum of y
+        syy: np.ndarray - the sum of y squared
+        sx: np.ndarray - the sum of x
+        sxx: np.ndarray - the sum of x squared
+        sxy: np.ndarray - the sum of x times y
+
+    Return:
+        tuple[np.ndarray, np.ndarray, np.ndarray] (intercept, slope and the sum of squared errors,
+                                                   the error is inf where the fit is degenerate)
+    """
+    spread = n * sxx - sx * sx
+    degenerate = spread <= 1e-9 * np.maximum(n * sxx, 1e-300)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (n * sxy - sx * sy) / spread
+        intercept = (sy - slope * sx) / n
+    sse = syy - intercept * sy - slope * sxy
+
+    return intercept, slope, np.where(degenerate, np.inf, sse)
+
+"""
+Brief: Change point models of the daily energy of every building against temperature. The
+       constant (1P), heating (3PH), cooling (3PC) and heating plus cooling (5P) models are
+       fitted for every candidate balance temperature at once from per building running sums,
+       and the model with the lowest BIC is kept per building.
+"""
+class change_point_model:
+    def __init__(self, candidates: int = 25, alphas: np.ndarray | None = None, batch_size: int = 256, min_days: int = 14) -> None:
+        """
+        Creates the change point model.
+
+        The temperature the models are fitted on is the apparent temperature plus
+        alpha * humidity / 100, the same weather load formula regression uses, with alpha
+        picked from alphas by the same grid search as the balance temperatures.
+
+        Args:
+            candidates: int - the number of candidate balance temperatures
+            alphas: np.ndarray | None - the candidate humidity weights, defaults to 0 through 30 in steps of 5
+            batch_size: int - the number of buildings fitted per vectorized batch, bounds the memory used
+            min_days: int - buildings with fewer days are not fitted
+
+        Return:
+            None (change_point_model is instantiated)
+        """
+        self.candidates = candidates
+        self.alphas = np.asarray(alphas, dtype=float) if alphas is not None else np.arange(0, 31, 5, dtype=float)
+        self.batch_size = batch_size
+        self.min_days = min_days
+
+        self.alpha = None
+        self.models = None
+
+    def matrices(self, daily: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Pivots the daily data into building x day matrices.
+
+        Args:
+            daily: pd.DataFrame - the output of daily_energy_weather
+
+        Return:
+            tuple (locations, energy, temperature, humidity and the mask of observed days,
+                   missing days are zero filled)
+        """
+        energy = daily.pivot(index="location", columns="day", values="energy_per_sqft")
+        temperature = daily.pivot(index="location", columns="day", values="apparent_temp").reindex_like(energy)
+        humidity = daily.pivot(index="location", columns="day", values="humidity").reindex_like(energy)
+
+        mask = (energy.notna() & temperature.notna() & humidity.notna()).to_numpy()
+        return (
+            energy.index.to_numpy(),
+            np.where(mask, energy.to_numpy(dtype=float), 0.0),
+            np.where(mask, temperature.to_numpy(dtype=float), 0.0),
+            np.where(mask, humidity.to_numpy(dtype=float), 0.0),
+            mask.astype(float)
+        )
+
+    def fit_batch(self, y: np.ndarray, t: np.ndarray, w: np.ndarray, grid: np.ndarray) -> dict:
+        """
+        Fits every model for every candidate balance temperature of a batch of buildings.
+
+        Args:
+            y: np.ndarray - building x day energy
+            t: np.ndarray - building x day temperature
+            w: np.ndarray - building x day mask of observed days
+            grid: np.ndarray - the candidate balance temperatures
+
+        Return:
+            dict (model -> dict of per building sse, intercept, slopes and balance temperatures of its best candidate)
+        """
+        n = w.sum(axis=1)[:, None]
+        sy = (w * y).sum(axis=1)[:, None]
+        syy = (w * y * y).sum(axis=1)[:, None]
+
+        # building x candidate x day degree days
+        heating = np.maximum(grid[None, :, None] - t[:, None, :], 0.0) * w[:, None, :]
+        cooling = np.maximum(t[:, None, :] - grid[None, :, None], 0.0) * w[:, None, :]
+
+        sh, shh, shy = heating.sum(axis=2), (heating * heating).sum(axis=2), np.einsum("bcd,bd->bc", heating, y)
+        sc, scc, scy = cooling.sum(axis=2), (cooling * cooling).sum(axis=2), np.einsum("bcd,bd->bc", cooling, y)
+
+        rows = np.arange(len(y))
+        fits = {}
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fits["1P"] = {"sse": (syy - sy * sy / n)[:, 0], "intercept": (sy / n)[:, 0]}
+
+            for model, s, ss, sxy, slope_name, balance_name in [
+                ("3PH", sh, shh, shy, "heating_slope", "heating_balance"),
+                ("3PC", sc, scc, scy, "cooling_slope", "cooling_balance")
+            ]:
+                intercept, slope, sse = simple_fit(n, sy, syy, s, ss, sxy)
+                # Energy has to rise with the degree days
+                sse = np.where(slope > 0, sse, np.inf)
+                best = np.argmin(sse, axis=1)
+                fits[model] = {
+                    "sse": sse[rows, best],
+                    "intercept": intercept[rows, best],
+                    slope_name: slope[rows, best],
+                    balance_name: grid[best]
+                }
+
+            # 5P, every heating candidate i paired with every cooling candidate j above it,
+            # solved through the closed form inverse of the symmetric 3 x 3 normal equations
+            a = n[:, :, None]
+            b = sh[:, :, None]
+            c = sc[:, None, :]
+            d = shh[:, :, None]
+            e = np.einsum("bid,bjd->bij", heating, cooling)
+            f = scc[:, None, :]
+            r0, r1, r2 = sy[:, :, None], shy[:, :, None], scy[:, None, :]
+
+            a11, a12, a13 = d * f - e * e, c * e - b * f, b * e - c * d
+            a22, a23, a33 = a * f - c * c, b * c - a * e, a * d - b * b
+            det = a * a11 + b * a12 + c * a13
+
+            intercept = (a11 * r0 + a12 * r1 + a13 * r2) / det
+            heating_slope = (a12 * r0 + a22 * r1 + a23 * r2) / det
+            cooling_slope = (a13 * r0 + a23 * r1 + a33 * r2) / det
+            sse = syy[:, :, None] - (intercept * r0 + heating_slope * r1 + cooling_slope * r2)
+
+            valid = (
+                (grid[None, :, None] < grid[None, None, :]) &
+                (np.abs(det) > 1e-9 * np.abs(a * d * f)) &
+                (heating_slope > 0) & (cooling_slope > 0)
+            )
+            sse = np.where(valid, sse, np.inf).reshape(len(y), -1)
+            best = np.argmin(sse, axis=1)
+            i, j = np.divmod(best, len(grid))
+            fits["5P"] = {
+                "sse": sse[rows, best],
+                "intercept": intercept.reshape(len(y), -1)[rows, best],
+                "heating_slope": heating_slope.reshape(len(y), -1)[rows, best],
+                "cooling_slope": cooling_slope.reshape(len(y), -1)[rows, best],
+                "heating_balance": grid[i],
+                "cooling_balance": grid[j]
+            }
+
+        return fits
+
+    def select(self, fits: dict, n: np.ndarray, sy: np.ndarray, syy: np.ndarray) -> pd.DataFrame:
+        """
+        Keeps the model with the lowest BIC for every building.
+
+        Args:
+            fits: dict - the output of fit_batch
+            n: np.ndarray - the number of days of every building
+            sy: np.ndarray - the sum of the energy of every building
+            syy: np.ndarray - the sum of the squared energy of every building
+
+        Return:
+            pd.DataFrame (model, bic, intercept, slopes, balance temperatures, r2 and cv_rmse per building)
+        """
+        names = list(MODEL_PARAMETERS)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sse = np.stack([np.maximum(fits[name]["sse"], 1e-300) for name in names], axis=1)
+            bic = n[:, None] * np.log(sse / n[:, None]) + np.array([MODEL_PARAMETERS[name] for name in names]) * np.log(n[:, None])
+        chosen = np.argmin(bic, axis=1)
+
+        result = pd.DataFrame({"model": np.array(names)[chosen], "bic": bic[np.arange(len(n)), chosen]})
+        for column in ["intercept", "heating_slope", "cooling_slope", "heating_balance", "cooling_balance"]:
+            values = np.full(len(n), np.nan)
+            for index, name in enumerate(names):
+                if (column in fits[name]):
+                    values = np.where(chosen == index, fits[name][column], values)
+            result[column] = values
+
+        chosen_sse = sse[np.arange(len(n)), chosen]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result["r2"] = 1 - chosen_sse / (syy - sy * sy / n)
+            result["cv_rmse"] = np.sqrt(chosen_sse / np.maximum(n - MODEL_PARAMETERS_ARRAY[chosen], 1)) / (sy / n)
+        result["n_days"] = n.astype(int)
+
+        return result
+
+    def fit_alpha(self, y: np.ndarray, temperature: np.ndarray, humidity: np.ndarray, w: np.ndarray, alpha: float) -> pd.DataFrame:
+        """
+        Fits every building for one humidity weight, batch by batch.
+
+        Args:
+            y: np.ndarray - building x day energy
+            temperature: np.ndarray - building x day apparent temperature
+            humidity: np.ndarray - building x day humidity
+            w: np.ndarray - building x day mask of observed days
+            alpha: float - the humidity weight of the weather load
+
+        Return:
+            pd.DataFrame (see select, one row per building)
+        """
+        t = (temperature + alpha * humidity / 100) * w
+        observed = t[w > 0]
+        # Balance temperatures inside the bulk of the observed range, the tails leave too few days to fit a slope
+        grid = np.linspace(np.percentile(observed, 5), np.percentile(observed, 95), self.candidates)
+
+        batches = []
+        for start in range(0, len(y), self.batch_size):
+            part = slice(start, start + self.batch_size)
+            fits = self.fit_batch(y[part], t[part], w[part], grid)
+            n = w[part].sum(axis=1)
+            batches.append(self.select(fits, n, (w[part] * y[part]).sum(axis=1), (w[part] * y[part] ** 2).sum(axis=1)))
+
+        return pd.concat(batches, ignore_index=True)
+
+    def fit(self, daily: pd.DataFrame) -> pd.DataFrame:
+        """
+        Fits the change point models of every building and the humidity weight of the weather load.
+
+        Alpha is shared by the whole campus, it is the candidate with the lowest total BIC.
+
+        Args:
+            daily: pd.DataFrame - the output of daily_energy_weather
+
+        Return:
+            pd.DataFrame (location, model, intercept (the base load), heating and cooling slopes and
+                          balance temperatures, r2, cv_rmse and n_days, one row per fitted building)
+        """
+        days = daily.groupby("location")["day"].transform("size")
+        locations, y, temperature, humidity, w = self.matrices(daily[days >= self.min_days])
+        if (len(locations) == 0):
+            raise ValueError(f"No building has {self.min_days} days of energy and weather to fit")
+
+        best_total = np.inf
+        for alpha in self.alphas:
+            models = self.fit_alpha(y, temperature, humidity, w, alpha)
+            total = models["bic"].sum()
+            if (total < best_total):
+                best_total = total
+                self.alpha = float(alpha)
+                self.models = models
+
+        self.models.insert(0, "location", locations)
+        self.models = self.models.drop(columns="bic")
+        return self.models
+
+    def predict(self, daily: pd.DataFrame) -> pd.Series:
+        """
+        Predicts the daily energy of every row from the fitted model of its building.
+
+        Args:
+            daily: pd.DataFrame - location, apparent_temp and humidity per day
+
+        Return:
+            pd.Series (the predicted energy_per_sqft, NaN for buildings without a model)
+        """
+        if (self.models is None):
+            raise RuntimeError("The change point model has not been fitted")
+
+        models = daily[["location"]].merge(self.models, on="location", how="left")
+        t = (daily["apparent_temp"] + self.alpha * daily["humidity"] / 100).to_numpy(dtype=float)
+
+        heating = np.nan_to_num(models["heating_slope"].to_numpy()) * np.maximum(models["heating_balance"].to_numpy() - t, 0)
+        cooling = np.nan_to_num(models["cooling_slope"].to_numpy()) * np.maximum(t - models["cooling_balance"].to_numpy(), 0)
+
+        return pd.Series(
+            models["intercept"].to_numpy() + np.nan_to_num(heating) + np.nan_to_num(cooling),
+            index=daily.index,
+            name="energy_per_sqft"
+        )
+
+if __name__ == "__main__":
+    """
+    Simple test cases for changepoint are executed because of Debugging purposes, recovers
+    the balance temperatures of synthetic buildings.
+
+    Description.
+
+    Args:
+        None
+
+    Return:
+        None (test cases are executed)
+    """
+    rng = np.random.default_rng(0)
+    days = pd.date_range("2025-01-01", periods=365, freq="D")
+    temperature = 55 + 25 * np.sin((np.arange(365) - 100) / 365 * 2 * np.pi)
+
+    frames = []
+    for building in range(1000):
+        heating_balance, cooling_balance = rng.uniform(45, 55), rng.uniform(62, 72)
+        energy = 2 + 0.05 * np.maximum(heating_balance - temperature, 0) + 0.08 * np.maximum(temperature - cooling_balance, 0)
+        frames.append(pd.DataFrame({
+            "location": f"building {building}",
+            "day": days,
+            "energy_per_sqft": energy + rng.normal(0, 0.05, 365),
+            "apparent_temp": temperature,
+            "humidity": 50.0
+        }))
+
+    import time
+    started = time.perf_counter()
+    cp = change_point_model()
+    print(cp.fit(pd.concat(frames, ignore_index=True)).head())
+    print(f"alpha {cp.alpha}, fitted in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,254 @@
+"""
+File: charts.py
+Author: Ben Miller
+Brief: Builds matplotlib figures for the regression results and decimates large time series
+       so that embedded charts stay interactive while redrawing and zooming.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import numpy as np
+import pandas as pd
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+
+def min_max_decimate(x: np.ndarray, y: np.ndarray, n_out: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Decimates a series by keeping the minimum and maximum point of every bucket.
+
+    The x values must be sorted. Each of the n_out / 2 buckets contributes its lowest and highest
+    point in time order, so spikes and dips survive the decimation exactly.
+
+    Args:
+        x: np.ndarray - the sorted x values (float, e.g. matplotlib date numbers)
+        y: np.ndarray - the y values that line up with x
+        n_out: int - the maximum number of points to keep
+
+    Return:
+        tuple[np.ndarray, np.ndarray] (the decimated x and y values)
+    """
+    n = len(x)
+    n_buckets = n_out // 2
+    if (n <= n_out or n_buckets < 1):
+        return x, y
+
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+
+    # NaNs would poison the reductions, treat them as neutral for the min and the max
+    y_for_min = np.where(np.isnan(y), np.inf, y)
+    y_for_max = np.where(np.isnan(y), -np.inf, y)
+
+    bucket_min = np.minimum.reduceat(y_for_min, starts)
+    bucket_max = np.maximum.reduceat(y_for_max, starts)
+
+    bucket_id = np.repeat(np.arange(n_buckets), np.diff(edges))
+    # First index in each bucket that holds the bucket min / max
+    is_min = y_for_min == bucket_min[bucket_id]
+    is_max = y_for_max == bucket_max[bucket_id]
+    min_idx = np.full(n_buckets, n, dtype=np.int64)
+    max_idx = np.full(n_buckets, n, dtype=np.int64)
+    np.minimum.at(min_idx, bucket_id[is_min], np.flatnonzero(is_min))
+    np.minimum.at(max_idx, bucket_id[is_max], np.flatnonzero(is_max))
+
+    keep = np.unique(np.concatenate((min_idx, max_idx)))
+    keep = keep[keep < n]
+    return x[keep], y[keep]
+
+def lttb_decimate(x: np.ndarray, y: np.ndarray, n_out: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Decimates a series with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept, the points in between are split into n_out - 2
+    buckets and from each bucket the point forming the largest triangle with the previously
+    selected point and the average of the next bucket is kept. NaN points are dropped first.
+
+    Args:
+        x: np.ndarray - the sorted x values (float, e.g. matplotlib date numbers)
+        y: np.ndarray - the y values that line up with x
+        n_out: int - the number of points to keep
+
+    Return:
+        tuple[np.ndarray, np.ndarray] (the decimated x and y values)
+    """
+    valid = ~np.isnan(y)
+    x = x[valid]
+    y = y[valid]
+    n = len(x)
+    if (n <= n_out or n_out < 3):
+        return x, y
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts = edges[:-1]
+    counts = np.diff(edges)
+
+    # The averages of every bucket are needed as the third triangle point, compute them all at once
+    avg_x = np.add.reduceat(x[1:n - 1], starts - 1) / counts
+    avg_y = np.add.reduceat(y[1:n - 1], starts - 1) / counts
+    avg_x = np.append(avg_x, x[-1])
+    avg_y = np.append(avg_y, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        cx, cy = avg_x[bucket + 1], avg_y[bucket + 1]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        previous = lo + int(np.argmax(area))
+        selected[bucket + 1] = previous
+
+    return x[selected], y[selected]
+
+DECIMATORS = {
+    "lttb": lttb_decimate,
+    "minmax": min_max_decimate
+}
+
+def bar_figure(labels: pd.Series, worst: pd.Series, best: pd.Series, ylabel: str, title: str) -> Figure:
+    """
+    Creates the best versus worst bar chart used by the regression results.
+
+    The figure is not attached to pyplot, so it can be embedded in a Tk window or saved
+    without ever opening a blocking window.
+
+    Args:
+        labels: pd.Series - the building names along the x axis
+        worst: pd.Series - the worst value for every building
+        best: pd.Series - the best value for every building
+        ylabel: str - the label of the y axis
+        title: str - the title of the chart
+
+    Return:
+        Figure (the created bar chart)
+    """
+    x = np.arange(len(labels))
+    w = 0.4
+
+    figure = Figure(figsize=(7, 4))
+    axes = figure.add_subplot()
+    axes.bar(x - w/2, worst, w, label="Worst")
+    axes.bar(x + w/2, best, w, label="Best")
+
+    axes.set_xticks(x, labels, rotation=45, ha="right")
+    axes.set_yscale("log")
+    axes.set_ylabel(ylabel)
+    axes.set_title(title)
+    axes.legend()
+    figure.tight_layout()
+
+    return figure
+
+"""
+Brief: Energy versus weather time series for a single building that keeps the full resolution
+       series in memory and only ever draws a decimated copy of the visible range.
+"""
+class time_series_view:
+    def __init__(
+        self,
+        energy: pd.Series,
+        weather: pd.Series,
+        title: str = "Energy v. Weather",
+        max_points: int = 2_000,
+        method: str = "lttb"
+    ) -> None:
+        """
+        Creates the time series view and draws the first decimated frame.
+
+        Every time the visible x range changes (zooming or panning in the toolbar) the visible
+        slice of the full series is decimated again, so the drawn point count stays at max_points
+        no matter how long the underlying series is.
+
+        Args:
+            energy: pd.Series - the energy per sqft indexed by time
+            weather: pd.Series - the weather value (e.g. apparent temperature) indexed by time
+            title: str - the title of the chart
+            max_points: int - the maximum number of points drawn per line
+            method: str - the decimation method, "lttb" or "minmax"
+
+        Return:
+            None (time_series_view is instantiated)
+        """
+        if (method not in DECIMATORS):
+            raise ValueError(f"Unknown decimation method: {method}")
+
+        self.max_points = max_points
+        self.decimate = DECIMATORS[method]
+
+        energy = energy.sort_index()
+        weather = weather.sort_index()
+        self.energy_x = mdates.date2num(energy.index.to_numpy())
+        self.energy_y = energy.to_numpy(dtype=float)
+        self.weather_x = mdates.date2num(weather.index.to_numpy())
+        self.weather_y = weather.to_numpy(dtype=float)
+
+        self.figure = Figure(figsize=(7, 4))
+        self.energy_axes = self.figure.add_subplot()
+        self.weather_axes = self.energy_axes.twinx()
+
+        self.energy_line, = self.energy_axes.plot([], [], color="tab:blue", linewidth=0.8, label=energy.name or "Energy")
+        self.weather_line, = self.weather_axes.plot([], [], color="tab:orange", linewidth=0.8, label=weather.name or "Weather")
+
+        self.energy_axes.set_ylabel(energy.name or "Energy")
+        self.weather_axes.set_ylabel(weather.name or "Weather")
+        self.energy_axes.set_title(title)
+        self.energy_axes.xaxis_date()
+        self.figure.autofmt_xdate()
+
+        self.redraw(None, None)
+        self.energy_axes.relim()
+        self.energy_axes.autoscale_view()
+        self.weather_axes.relim()
+        self.weather_axes.autoscale_view()
+
+        self.energy_axes.callbacks.connect("xlim_changed", self.on_xlim_changed)
+
+    def visible_slice(self, x: np.ndarray, y: np.ndarray, low: float | None, high: float | None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the decimated part of the series inside [low, high] plus one point on either side
+        so that lines still run to the edge of the axes.
+
+        Args:
+            x: np.ndarray - the full resolution sorted x values
+            y: np.ndarray - the full resolution y values
+            low: float | None - the left edge of the visible range (None for the start)
+            high: float | None - the right edge of the visible range (None for the end)
+
+        Return:
+            tuple[np.ndarray, np.ndarray] (the decimated visible x and y values)
+        """
+        lo = 0 if low is None else max(int(np.searchsorted(x, low)) - 1, 0)
+        hi = len(x) if high is None else min(int(np.searchsorted(x, high, side="right")) + 1, len(x))
+        return self.decimate(x[lo:hi], y[lo:hi], self.max_points)
+
+    def redraw(self, low: float | None, high: float | None) -> None:
+        """
+        Replaces the drawn line data with a decimated copy of the visible range.
+
+        Args:
+            low: float | None - the left edge of the visible range (None for the start)
+            high: float | None - the right edge of the visible range (None for the end)
+
+        Return:
+            None
+        """
+        self.energy_line.set_data(*self.visible_slice(self.energy_x, self.energy_y, low, high))
+        self.weather_line.set_data(*self.visible_slice(self.weather_x, self.weather_y, low, high))
+
+    def on_xlim_changed(self, axes) -> None:
+        """
+        Matplotlib callback, re-decimates the lines whenever the user zooms or pans.
+
+        Args:
+            axes: Axes - the axes whose x limits changed
+
+        Return:
+            None
+        """
+        low, high = axes.get_xlim()
+        self.redraw(low, high)
+        self.figure.canvas.draw_idle()
@@ -10,8 +10,357 @@ Copyright: Copyright (c) 2026
 
 import pandas as pd
 import numpy as np
+import os
 from datetime import datetime
 
+HANDLED_UNITS = ["kg", "kW", "kg/hour", "kWh"]
+# The utility behind every handled unit, kept in the converted data once every reading is in kJ
+UTILITY_TYPES = {
+    "kg": "steam",
+    "kg/hour": "steam",
+    "kW": "chilled water",
+    "kWh": "electricity"
+}
+
+def meter_key_column(columns: pd.Index) -> str:
+    """
+    Picks the column that identifies a single meter within meter data.
+
+    Exports that carry a meter id use it, otherwise the site name is the finest
+    identifier available and every site is treated as one meter.
+
+    Args:
+        columns: pd.Index - the columns of the meter data
+
+    Return:
+        str (the name of the meter identifier column)
+    """
+    for col in ["meterid", "meter", "sitename"]:
+        if col in columns:
+            return col
+
+    raise ValueError("Missing required column: sitename")
+
+BUILDING_COLUMNS = ["buildingname", "grossarea", "latitude", "longitude"]
+
+def building_table(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Selects and normalizes the building columns, the building names are lowercased
+    and anything from the first parenthesis on is dropped.
+
+    Description.
+
+    Args:
+        data: pd.DataFrame - building rows with at least the BUILDING_COLUMNS
+    
+    Return:
+        pd.DataFrame (the filtered building data)
+    """
+    building_names = data["buildingname"].str.lower().str.split('(').str[0].str.strip()
+
+    filtered_data = np.column_stack((
+        building_names.to_numpy(),
+        data["grossarea"].to_numpy(),
+        data["latitude"].to_numpy(),
+        data["longitude"].to_numpy()
+    ))
+
+    return pd.DataFrame(filtered_data, columns=BUILDING_COLUMNS)
+
+DEDUP_POLICIES = ["first", "last", "flag"]
+
+"""
+Brief: Drops meter readings that were already seen for the same meter and reading window.
+       Keys are hashed to 64 bits and kept on disk in one sorted shard per month of readings,
+       so only the months a batch touches are ever loaded and memory stays bounded no matter
+       how many years of history have been seen.
+"""
+class deduplicator:
+    def __init__(self, store_dir: str | None = None, policy: str = "first", meter_column: str | None = None) -> None:
+        """
+        Creates the deduplicator.
+
+        Policies:
+            first - the first reading seen for a key wins, later ones are dropped
+            last  - a later reading with a different value replaces the earlier one and is passed on,
+                    it is also reported as a conflict with the value it replaces so the earlier
+                    reading can be retracted from output that was already written
+            flag  - the first reading wins, later readings with a different value are reported as conflicts
+
+        Resent readings with the same value are always dropped.
+
+        Args:
+            store_dir: str | None - the folder that keeps the seen keys between runs, None only dedupes within a batch
+            policy: str - one of DEDUP_POLICIES
+            meter_column: str | None - the meter identifier column, picked by meter_key_column when None
+
+        Return:
+            None (deduplicator is instantiated)
+        """
+        if (policy not in DEDUP_POLICIES):
+            raise ValueError(f"Unknown dedup policy: {policy}")
+
+        self.store_dir = store_dir
+        self.policy = policy
+        self.meter_column = meter_column
+
+    def shard_path(self, month: str) -> str:
+        """
+        Returns the file that keeps the seen keys of one month.
+
+        Args:
+            month: str - the month (YYYY-MM)
+
+        Return:
+            str (the shard file path)
+        """
+        return os.path.join(self.store_dir, f"{month}.npz")
+
+    def load_shard(self, month: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Loads the sorted seen keys of one month and the reading value stored for each.
+
+        Args:
+            month: str - the month (YYYY-MM)
+
+        Return:
+            tuple[np.ndarray, np.ndarray] (the sorted uint64 keys and their float values)
+        """
+        path = self.shard_path(month)
+        if (not os.path.exists(path)):
+            return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=float)
+
+        with np.load(path) as shard:
+            return shard["keys"], shard["values"]
+
+    def save_shard(self, month: str, keys: np.ndarray, values: np.ndarray) -> None:
+        """
+        Writes the seen keys of one month, replacing the old shard in one step.
+
+        Args:
+            month: str - the month (YYYY-MM)
+            keys: np.ndarray - the sorted uint64 keys
+            values: np.ndarray - the value stored for every key
+
+        Return:
+            None
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        temporary = self.shard_path(month) + ".tmp.npz"
+        np.savez(temporary, keys=keys, values=values)
+        os.replace(temporary, self.shard_path(month))
+
+    def keys(self, data: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Hashes the meter, the units and the reading window of every row and finds the month shard it belongs to.
+
+        The units are part of the key, without a meter id the meter column is the site name and
+        the steam, chilled water and electricity readings of a site share their windows. The window is hashed as parsed UTC timestamps, so the same window written as ...Z or
+        +00:00, with or without the T, is the same key. Windows that can't be parsed fall
+        back to their raw text.
+
+        Args:
+            data: pd.DataFrame - meter rows (readingunits, readingwindowstart, readingwindowend and a meter column)
+
+        Return:
+            tuple[np.ndarray, np.ndarray] (the uint64 key and the month (YYYY-MM) of every row)
+        """
+        if (self.meter_column is None):
+            self.meter_column = meter_key_column(data.columns)
+
+        starts = pd.to_datetime(data["readingwindowstart"], errors="coerce", format="ISO8601", utc=True)
+        ends = pd.to_datetime(data["readingwindowend"], errors="coerce", format="ISO8601", utc=True)
+
+        keys = pd.util.hash_pandas_object(
+            pd.DataFrame({
+                "meter": data[self.meter_column].astype(str).to_numpy(),
+                "units": data["readingunits"].astype(str).to_numpy() if "readingunits" in data.columns else "",
+                "start": starts.to_numpy(dtype="datetime64[ns]").view(np.int64),
+                "end": ends.to_numpy(dtype="datetime64[ns]").view(np.int64),
+                "unparsed": np.where(
+                    starts.isna() | ends.isna(),
+                    data["readingwindowstart"].astype(str) + "|" + data["readingwindowend"].astype(str),
+                    ""
+                )
+            }),
+            index=False
+        ).to_numpy()
+        months = starts.to_numpy(dtype="datetime64[ns]").astype("datetime64[M]").astype(str)
+
+        return keys, months
+
+    def dedupe(self, data: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Removes duplicate readings from a batch of meter rows and records the batch as seen.
+
+        Args:
+            data: pd.DataFrame - meter rows (readingvalue, readingunits, readingwindowstart, readingwindowend and a meter column)
+
+        Return:
+            tuple[pd.DataFrame, pd.DataFrame] (the rows to keep, the conflicting rows with the value seen before,
+                                               for "last" the kept rows that replace an earlier reading)
+        """
+        try:
+            keys, months = self.keys(data)
+            values = pd.to_numeric(data["readingvalue"], errors="coerce").to_numpy(dtype=float)
+
+            # Within the batch
+            frame = pd.DataFrame({"key": keys, "value": values})
+            keep = ~frame.duplicated("key", keep="last" if self.policy == "last" else "first").to_numpy()
+            # The value the batch settles on for every key, for "flag" that is the first one
+            settled = frame[keep].set_index("key")["value"]
+            differs = ~np.isclose(values, settled.reindex(keys).to_numpy(), equal_nan=True)
+            conflict = np.zeros(len(data), dtype=bool)
+            previous = np.full(len(data), np.nan)
+            if (self.policy == "flag"):
+                conflict = ~keep & differs
+                previous[conflict] = settled.reindex(keys[conflict]).to_numpy()
+
+            # Against everything seen in earlier batches, one month shard at a time
+            if (self.store_dir is not None):
+                for month in np.unique(months[keep]):
+                    in_month = keep & (months == month)
+                    seen_keys, seen_values = self.load_shard(month)
+
+                    position = np.searchsorted(seen_keys, keys[in_month])
+                    position = np.minimum(position, max(len(seen_keys) - 1, 0))
+                    seen = np.zeros(in_month.sum(), dtype=bool)
+                    if (len(seen_keys) > 0):
+                        seen = seen_keys[position] == keys[in_month]
+                    old_values = np.where(seen, seen_values[position] if len(seen_keys) > 0 else np.nan, np.nan)
+                    same = seen & np.isclose(values[in_month], old_values, equal_nan=True)
+
+                    rows = np.flatnonzero(in_month)
+                    if (self.policy == "first"):
+                        keep[rows[seen]] = False
+                    elif (self.policy == "last"):
+                        keep[rows[same]] = False
+                        conflict[rows[seen & ~same]] = True
+                        previous[rows[seen & ~same]] = old_values[seen & ~same]
+                        seen_values = seen_values.copy()
+                        seen_values[position[seen & ~same]] = values[rows[seen & ~same]]
+                    else:
+                        keep[rows[seen]] = False
+                        conflict[rows[seen & ~same]] = True
+                        previous[rows[seen & ~same]] = old_values[seen & ~same]
+
+                    new_rows = rows[~seen]
+                    merged_keys = np.concatenate((seen_keys, keys[new_rows]))
+                    merged_values = np.concatenate((seen_values, values[new_rows]))
+                    order = np.argsort(merged_keys, kind="stable")
+                    self.save_shard(month, merged_keys[order], merged_values[order])
+
+            conflicts = data[conflict].copy()
+            conflicts["previousreadingvalue"] = previous[conflict]
+
+            return data[keep], conflicts
+        except Exception as e:
+            print(f"Error occured in {self.dedupe.__name__}: {e}")
+            raise RuntimeError(f"Error occured in {self.dedupe.__name__}") from e
+
+def dedupe_file(input_file: str, output_file: str, store_dir: str = ".dedup_store", policy: str = "first", chunksize: int = 500_000) -> int:
+    """
+    Streams a meter csv file through a deduplicator chunk by chunk.
+
+    Kept rows are appended to output_file, conflicts (policy "flag" and "last") to output_file
+    with a .conflicts.csv suffix. Running it again over overlapping exports only passes on new
+    readings. With policy "last" a reading that replaces one written by an earlier chunk is
+    retracted by rewriting output_file at the end (see retract_replaced), readings that replace
+    one written by an earlier run are listed in the conflicts file to retract them from that output.
+
+    Args:
+        input_file: str - the meter csv file to dedupe
+        output_file: str - the csv file that the kept rows are written to
+        store_dir: str - the folder that keeps the seen keys between chunks and runs
+        policy: str - one of DEDUP_POLICIES
+        chunksize: int - the number of rows read per chunk
+
+    Return:
+        int (the number of rows kept)
+    """
+    dedup = deduplicator(store_dir, policy)
+    conflicts_file = os.path.splitext(output_file)[0] + ".conflicts.csv"
+    kept_rows = 0
+    first = True
+    # Only the keys of replaced readings are held, never the keys of every row
+    replaced = []
+
+    for chunk in pd.read_csv(input_file, chunksize=chunksize):
+        kept, conflicts = dedup.dedupe(chunk)
+        kept.to_csv(output_file, index=False, mode="w" if first else "a", header=first)
+        if (policy in ["flag", "last"]):
+            conflicts.to_csv(conflicts_file, index=False, mode="w" if first else "a", header=first)
+        if (policy == "last" and len(conflicts) > 0):
+            replaced.append(dedup.keys(conflicts)[0])
+        kept_rows += len(kept)
+        first = False
+
+    if (len(replaced) > 0):
+        kept_rows -= retract_replaced(dedup, output_file, conflicts_file, np.concatenate(replaced), chunksize)
+
+    return kept_rows
+
+def retract_replaced(dedup: deduplicator, output_file: str, conflicts_file: str, replaced: np.ndarray, chunksize: int = 500_000) -> int:
+    """
+    Keeps only the last row of every replaced key in the output of a "last" run, and only the
+    conflicts that replace a reading of an earlier run in its conflicts file.
+
+    Every replacement of a key in the run is a conflict, so a key with one more row in the
+    output than conflicts was first written by this run and all its conflicts are settled here.
+    With as many rows as conflicts, the first one replaced a reading of an earlier run. Both
+    files are streamed, only the replaced keys are held in memory.
+
+    Args:
+        dedup: deduplicator - the deduplicator of the run, for its keys
+        output_file: str - the csv file the kept rows were written to
+        conflicts_file: str - the csv file the conflicts were written to
+        replaced: np.ndarray - the key of every conflict, in written order
+        chunksize: int - the number of rows read per chunk
+
+    Return:
+        int (the number of rows removed from output_file)
+    """
+    keys, n_conflicts = np.unique(replaced, return_counts=True)
+
+    def positions(chunk: pd.DataFrame) -> np.ndarray:
+        # The position of every row's key in keys, -1 for keys that were never replaced
+        chunk_keys = dedup.keys(chunk)[0]
+        position = np.minimum(np.searchsorted(keys, chunk_keys), len(keys) - 1)
+        return np.where(keys[position] == chunk_keys, position, -1)
+
+    def rewrite(path: str, keep_row) -> int:
+        # Streams path into a temporary file through keep_row and returns the rows dropped
+        temporary = path + ".tmp"
+        seen = np.zeros(len(keys), dtype=np.int64)
+        dropped = 0
+        for index, chunk in enumerate(pd.read_csv(path, chunksize=chunksize)):
+            position = positions(chunk)
+            tracked = position >= 0
+            # The running occurrence of every tracked row's key, counted over the earlier chunks too
+            occurrence = np.full(len(chunk), -1, dtype=np.int64)
+            occurrence[tracked] = seen[position[tracked]] + pd.Series(position[tracked]).groupby(position[tracked]).cumcount().to_numpy()
+            np.add.at(seen, position[tracked], 1)
+
+            keep = keep_row(position, occurrence)
+            dropped += int((~keep).sum())
+            chunk[keep].to_csv(temporary, index=False, mode="w" if index == 0 else "a", header=index == 0)
+        os.replace(temporary, path)
+        return dropped
+
+    n_rows = np.zeros(len(keys), dtype=np.int64)
+    for chunk in pd.read_csv(output_file, chunksize=chunksize):
+        position = positions(chunk)
+        np.add.at(n_rows, position[position >= 0], 1)
+
+    retracted = 0
+    if ((n_rows > 1).any()):
+        retracted = rewrite(output_file, lambda position, occurrence: (position < 0) | (occurrence == n_rows[position] - 1))
+
+    earlier_run = n_rows == n_conflicts
+    rewrite(conflicts_file, lambda position, occurrence: (position >= 0) & earlier_run[position] & (occurrence == 0))
+
+    return retracted
+
 """
 """
 class converter:
@@ -22,7 +371,10 @@ class converter:
         kjFactor: int = 2_676,
         kWhFactor: int = 3_600,
         kilojoules_unit_string: str = "kJ",
-        kilojoules_display_string: str = "Kilojoules"
+        kilojoules_display_string: str = "Kilojoules",
+        quarantine_file_name: str | None = None,
+        dedup_policy: str | None = None,
+        dedup_store: str | None = None
     ) -> None:
         """
         Creates the converter class.
@@ -35,11 +387,21 @@ class converter:
         Args:
             path_string: str - the absolute or relative file path for the file that you want 
                                the converter to look at specifically
+            quarantine_file_name: str | None - where rows failing validation are written, defaults
+                                               to the meter output file name with a .quarantine.csv suffix
+            dedup_policy: str | None - how repeated readings of the same meter and window are handled
+                                       (see deduplicator), None keeps every reading
+            dedup_store: str | None - the folder of seen readings shared between runs, None only dedupes within the file
         
         Return:
             None (converter is instantiated)
         """
         self.file_name = path_string
+        self.quarantine_file_name = quarantine_file_name
+        self.quarantined_rows = 0
+        self.dedup_policy = dedup_policy
+        self.dedup_store = dedup_store
+        self.duplicate_rows = 0
         self.data = pd.read_csv(self.file_name)
         self.isMeter = isMeter
 
@@ -67,14 +429,7 @@ class converter:
             self.READING_WINDOW_END = self.data.columns.get_loc("readingwindowend")
 
         else:
-            required_columns = [
-                "buildingname", 
-                "grossarea", 
-                "latitude", 
-                "longitude"
-            ]
-
-            for col in required_columns:
+            for col in BUILDING_COLUMNS:
                 if col not in self.data.columns:
                     raise ValueError(f"Missing required column: {col}")
 
@@ -197,7 +552,7 @@ class converter:
         """
         Filters all of the meter data and converts the energy and power units to kJ.
 
-        Description.
+        The original unit is recorded as a utility column (see UTILITY_TYPES) before it is overwritten.
 
         Args:
             None
@@ -207,6 +562,8 @@ class converter:
         """
         try:
             if (self.isMeter):
+                self.data["utility"] = self.data["readingunits"].map(UTILITY_TYPES)
+
                 steam_values = self.data[self.data["readingunits"] == "kg"]
                 cooling_rate_values = self.data[self.data["readingunits"] == "kW"]
                 steam_rate_values = self.data[self.data["readingunits"] == "kg/hour"]
@@ -239,25 +596,60 @@ class converter:
         """
         try:
             if (not self.isMeter):
-                building_names = self.data["buildingname"].str.lower().str.split('(').str[0].str.strip()
-                gross_area = self.data["grossarea"]
-                latitude = self.data["latitude"]
-                longitude = self.data["longitude"]
-
-                # filtered_data = np.concatenate((building_names.to_numpy(), gross_area.to_numpy(), latitude.to_numpy(), longitude.to_numpy()))
-                filtered_data = np.column_stack((
-                    building_names.to_numpy(),
-                    gross_area.to_numpy(),
-                    latitude.to_numpy(),
-                    longitude.to_numpy()
-                ))
-
-                return pd.DataFrame(filtered_data, columns=["buildingname", "grossarea", "latitude", "longitude"])
+                return building_table(self.data)
         except Exception as e:
             print(f"Error occured in {self.filter_building_data.__name__}: {e}")
             raise RuntimeError(f"Error occured in {self.execute_meter_conversion.__name__}") from e
 
 
+    def validate_meter_data(self) -> pd.DataFrame:
+        """
+        Checks every meter row at once and splits off the rows that would break the conversion.
+
+        Each check runs over a whole column, a row fails when its window start or end can't be
+        parsed, its unit is not one of HANDLED_UNITS, its reading is missing, not a number or negative, or its
+        window ends at or before it starts. Failing rows are returned with a quarantinereason
+        column listing every check they failed.
+
+        Args:
+            None
+        
+        Return:
+            pd.DataFrame (the failing rows with their reasons, self.data keeps only the good rows)
+        """
+        try:
+            if (self.isMeter):
+                values = pd.to_numeric(self.data["readingvalue"], errors="coerce")
+                starts = pd.to_datetime(self.data["readingwindowstart"], errors="coerce", format="ISO8601")
+                ends = pd.to_datetime(self.data["readingwindowend"], errors="coerce", format="ISO8601")
+
+                checks = [
+                    (starts.isna(), "unparseable readingwindowstart"),
+                    (ends.isna(), "unparseable readingwindowend"),
+                    (~self.data["readingunits"].isin(HANDLED_UNITS), "unknown readingunits"),
+                    (self.data["readingvalue"].isna(), "missing readingvalue"),
+                    (values.isna() & self.data["readingvalue"].notna(), "unparseable readingvalue"),
+                    (values < 0, "negative readingvalue"),
+                    (ends <= starts, "zero-length window")
+                ]
+
+                reasons = pd.Series("", index=self.data.index)
+                for failed, reason in checks:
+                    reasons = reasons.where(~failed, reasons + reason + "; ")
+
+                bad = reasons != ""
+                quarantined = self.data[bad].copy()
+                quarantined["quarantinereason"] = reasons[bad].str.rstrip("; ")
+
+                self.data = self.data[~bad].copy()
+                self.data["readingvalue"] = values[~bad]
+                self.quarantined_rows = len(quarantined)
+
+                return quarantined
+        except Exception as e:
+            print(f"Error occured in {self.validate_meter_data.__name__}: {e}")
+            raise RuntimeError(f"Error occured in {self.execute_meter_conversion.__name__}") from e
+
     def execute_meter_conversion(self, output_file_name: str) -> None:
         """
         Top level function to execute all the meter data processing in one call.
@@ -274,6 +666,23 @@ class converter:
             if (not self.isMeter):
                 raise RuntimeError("execute_meter_conversion called in building mode")
 
+            quarantined = self.validate_meter_data()
+            quarantine_file_name = self.quarantine_file_name
+            if (quarantine_file_name is None):
+                quarantine_file_name = os.path.splitext(output_file_name)[0] + ".quarantine.csv"
+            quarantined.to_csv(quarantine_file_name, index=False)
+            if (self.quarantined_rows > 0):
+                print(f"{self.quarantined_rows} rows failed validation, see {quarantine_file_name}")
+
+            if (self.dedup_policy is not None):
+                validated_rows = len(self.data)
+                self.data, conflicts = deduplicator(self.dedup_store, self.dedup_policy).dedupe(self.data)
+                self.duplicate_rows = validated_rows - len(self.data)
+                if (self.dedup_policy in ["flag", "last"]):
+                    conflicts.to_csv(os.path.splitext(output_file_name)[0] + ".conflicts.csv", index=False)
+                if (self.duplicate_rows > 0):
+                    print(f"{self.duplicate_rows} duplicate rows dropped")
+
             filtered_basic_data = self.filter_meter_data()
             filtered_basic_data.to_csv(output_file_name, index=False)
         except Exception as e:
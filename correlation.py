@@ -0,0 +1,217 @@
+"""
+File: correlation.py
+Author: Ben Miller
+Brief: Lagged correlation between the hourly energy of every building and the outdoor
+       temperature and humidity, computed with FFTs over a building x hour matrix.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import numpy as np
+import pandas as pd
+import forecast as fc
+
+def fft_length(hours: int, lags: np.ndarray) -> int:
+    """
+    Returns an FFT length long enough that no lag wraps around onto another.
+
+    Args:
+        hours: int - the length of the series
+        lags: np.ndarray - the lags in hours
+
+    Return:
+        int (the next power of two of hours plus the largest absolute lag)
+    """
+    return 1 << int(np.ceil(np.log2(hours + np.abs(lags).max() + 1)))
+
+def spectra(values: np.ndarray, nfft: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Transforms the observed mask, the centered values and their squares of every row once,
+    so they can be reused against several other series.
+
+    Args:
+        values: np.ndarray - building x hour matrix with NaN for missing hours
+        nfft: int - the FFT length (see fft_length)
+
+    Return:
+        tuple[np.ndarray, np.ndarray, np.ndarray] (the spectra of the mask, the values and the squared values)
+    """
+    mask = np.isfinite(values).astype(float)
+    values = np.nan_to_num(values)
+    # Centering keeps the sums small, the correlation itself does not depend on it
+    values = (values - (values.sum(axis=1) / np.maximum(mask.sum(axis=1), 1))[:, None]) * mask
+
+    return tuple(np.fft.rfft(part, nfft, axis=1) for part in [mask, values, values * values])
+
+def cross_sums(a: np.ndarray, b: np.ndarray, lags: np.ndarray, nfft: int) -> np.ndarray:
+    """
+    Computes sum over t of a[t] * b[t + lag] for every row and lag from the spectra of a and b.
+
+    Args:
+        a: np.ndarray - building x frequency spectrum
+        b: np.ndarray - building x frequency spectrum
+        lags: np.ndarray - the lags in hours, negative lags are allowed
+        nfft: int - the FFT length the spectra were taken with
+
+    Return:
+        np.ndarray (building x lag sums)
+    """
+    circular = np.fft.irfft(np.conj(a) * b, nfft, axis=1)
+    # Negative lags wrap around to the end of the circular correlation
+    return circular[:, lags % nfft]
+
+def pearson_from_spectra(x: tuple, y: tuple, lags: np.ndarray, nfft: int, min_pairs: int = 48) -> np.ndarray:
+    """
+    Pearson correlation of x[t] with y[t + lag] for every row and lag, over the hours both are observed.
+
+    Every term of the correlation (pair count, sums, sums of squares and cross products over the
+    overlapping hours) is itself a cross correlation of masked series, so the result is exact
+    even with gaps in either series.
+
+    Args:
+        x: tuple - the spectra of x (see spectra), the weather
+        y: tuple - the spectra of y (see spectra), the energy
+        lags: np.ndarray - the lags in hours, positive means y follows x
+        nfft: int - the FFT length the spectra were taken with
+        min_pairs: int - lags with fewer overlapping hours are NaN
+
+    Return:
+        np.ndarray (building x lag correlation)
+    """
+    x_mask, x_values, x_squares = x
+    y_mask, y_values, y_squares = y
+
+    n = np.rint(cross_sums(x_mask, y_mask, lags, nfft))
+    sx, sy = cross_sums(x_values, y_mask, lags, nfft), cross_sums(x_mask, y_values, lags, nfft)
+    sxx, syy = cross_sums(x_squares, y_mask, lags, nfft), cross_sums(x_mask, y_squares, lags, nfft)
+    sxy = cross_sums(x_values, y_values, lags, nfft)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+
+    return np.where(n >= min_pairs, np.clip(r, -1, 1), np.nan)
+
+def pearson_by_lag(x: np.ndarray, y: np.ndarray, lags: np.ndarray, min_pairs: int = 48) -> np.ndarray:
+    """
+    Pearson correlation of x[t] with y[t + lag] for every row and lag, see pearson_from_spectra.
+
+    Args:
+        x: np.ndarray - building x hour matrix with NaN for missing hours (the weather)
+        y: np.ndarray - building x hour matrix with NaN for missing hours (the energy)
+        lags: np.ndarray - the lags in hours, positive means y follows x
+        min_pairs: int - lags with fewer overlapping hours are NaN
+
+    Return:
+        np.ndarray (building x lag correlation)
+    """
+    nfft = fft_length(x.shape[1], lags)
+    return pearson_from_spectra(spectra(x, nfft), spectra(y, nfft), lags, nfft, min_pairs)
+
+def best_lags(r: np.ndarray, lags: np.ndarray, tolerance: float = 0.01) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Picks the lag of every row at which the correlation is strongest.
+
+    A daily cycle repeats the peak of the correlation every 24 hours with almost the same value, so
+    the shortest lag among the peaks (local maxima of the absolute correlation) within tolerance
+    of the strongest one is picked, rather than whichever alias happens to be a little higher.
+
+    Args:
+        r: np.ndarray - building x lag correlation
+        lags: np.ndarray - the lags in hours of the columns of r
+        tolerance: float - how much weaker than the strongest correlation a shorter peak may be
+
+    Return:
+        tuple[np.ndarray, np.ndarray] (the column of the picked lag and whether the row has any correlation)
+    """
+    strength = np.where(np.isfinite(r), np.abs(r), -1)
+    padded = np.pad(strength, ((0, 0), (1, 1)), constant_values=-np.inf)
+    peak = (strength >= padded[:, :-2]) & (strength >= padded[:, 2:]) & np.isfinite(r)
+    near = peak & (strength >= strength.max(axis=1, keepdims=True) - tolerance)
+
+    found = np.isfinite(r).any(axis=1)
+    return np.argmin(np.where(near, np.abs(lags), np.inf), axis=1), found
+
+def lagged_correlation(energy_hourly: pd.DataFrame, building_cells: pd.DataFrame, weather_hourly: pd.DataFrame, min_lag: int = 0, max_lag: int = 48, batch_size: int = 128, min_pairs: int = 48, tolerance: float = 0.01) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Finds the lag at which the energy of every building follows temperature and humidity most closely.
+
+    Args:
+        energy_hourly: pd.DataFrame - the output of regression.hourly_energy
+        building_cells: pd.DataFrame - location -> cell_y, cell_x (see weather.weather_for_buildings)
+        weather_hourly: pd.DataFrame - the output of regression.hourly_weather
+        min_lag: int - the shortest lag in hours, negative lags test energy leading the weather
+        max_lag: int - the longest lag in hours
+        batch_size: int - the number of buildings transformed per batch, bounds the memory used
+        min_pairs: int - lags with fewer overlapping hours are ignored
+        tolerance: float - see best_lags
+
+    Return:
+        tuple[pd.DataFrame, pd.DataFrame] (per building the lag with the strongest correlation (by absolute
+                                           value, see best_lags) and its correlation plus the zero lag correlation, for
+                                           temperature and humidity, and the full correlation of every
+                                           building and lag)
+    """
+    _, locations, load, temperature, humidity = fc.matrices(energy_hourly, building_cells, weather_hourly)
+    lags = np.arange(min_lag, max_lag + 1)
+    nfft = fft_length(load.shape[1], lags)
+
+    curves = {"temperature": [], "humidity": []}
+    for start in range(0, len(locations), batch_size):
+        part = slice(start, start + batch_size)
+        energy = spectra(load[part], nfft)
+        curves["temperature"].append(pearson_from_spectra(spectra(temperature[part], nfft), energy, lags, nfft, min_pairs))
+        curves["humidity"].append(pearson_from_spectra(spectra(humidity[part], nfft), energy, lags, nfft, min_pairs))
+
+    summary = pd.DataFrame({"location": locations})
+    long = pd.DataFrame({"location": np.repeat(locations, len(lags)), "lag": np.tile(lags, len(locations))})
+    for name, parts in curves.items():
+        r = np.concatenate(parts, axis=0)
+        long[f"{name}_r"] = r.ravel()
+
+        best, found = best_lags(r, lags, tolerance)
+        summary[f"{name}_lag"] = np.where(found, lags[best], np.nan)
+        summary[f"{name}_r"] = np.where(found, r[np.arange(len(r)), best], np.nan)
+        summary[f"{name}_r0"] = r[:, np.flatnonzero(lags == 0)[0]] if (lags == 0).any() else np.nan
+
+    return summary, long
+
+if __name__ == "__main__":
+    """
+    Simple test cases for correlation are executed because of Debugging purposes, recovers the
+    thermal lag of synthetic buildings.
+
+    Description.
+
+    Args:
+        None
+
+    Return:
+        None (test cases are executed)
+    """
+    import time
+    rng = np.random.default_rng(0)
+    hours = pd.date_range("2025-01-01", periods=365 * 24, freq="h")
+    temperature = 55 + 25 * np.sin(2 * np.pi * np.arange(len(hours)) / (365 * 24)) + 10 * np.sin(2 * np.pi * (hours.hour.to_numpy() - 9) / 24)
+
+    energy = []
+    for building in range(300):
+        lag = building % 12
+        energy.append(pd.DataFrame({
+            "location": f"building {building}",
+            "minutely_15": hours,
+            "energy_per_sqft": 1 + 0.02 * np.roll(temperature, lag) + rng.normal(0, 0.1, len(hours))
+        }))
+    weather = pd.DataFrame({"cell_y": 0.0, "cell_x": 0.0, "minutely_15": hours, "apparent_temp": temperature, "humidity": 50 + rng.normal(0, 5, len(hours))})
+    cells = pd.DataFrame({"location": [f"building {building}" for building in range(300)], "cell_y": 0.0, "cell_x": 0.0})
+
+    started = time.perf_counter()
+    summary, _ = lagged_correlation(pd.concat(energy, ignore_index=True), cells, weather)
+    print(summary.head(12))
+    print(f"{len(summary)} buildings in {time.perf_counter() - started:.2f}s")
+
+    # The planted lag has to be found, not the same peak a day later
+    planted = summary["location"].str.split().str[-1].astype(int) % 12
+    assert (summary["temperature_lag"] == planted).all(), summary[summary["temperature_lag"] != planted]
+    print("planted lags recovered")
@@ -0,0 +1,474 @@
+"""
+File: forecast.py
+Author: Ben Miller
+Brief: Next day hourly load forecasts for every building from lagged load, hour of week and
+       weather features, fitted for all buildings in one batched solve and refitted
+       incrementally as new days arrive.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import numpy as np
+import pandas as pd
+
+# The longest lag, a week of hours, every forecast needs this much history
+HISTORY_HOURS = 168
+DAY_HOURS = 24
+# Hinges of the heating and cooling degree features (F)
+HEATING_BASE = 55.0
+COOLING_BASE = 65.0
+
+FEATURES = [
+    "intercept", "load_lag_24", "load_lag_168", "heating_degrees", "cooling_degrees", "humidity",
+    "day_sin_1", "day_cos_1", "day_sin_2", "day_cos_2", "day_sin_3", "day_cos_3",
+    "week_sin_1", "week_cos_1", "week_sin_2", "week_cos_2"
+]
+
+def to_grid(rows: np.ndarray, columns: np.ndarray, values: np.ndarray, shape: tuple[int, int]) -> np.ndarray:
+    """
+    Scatters values into a dense matrix, averaging repeated cells, without a pandas pivot.
+
+    Args:
+        rows: np.ndarray - the row of every value, negative rows are dropped
+        columns: np.ndarray - the column of every value, columns outside the matrix are dropped
+        values: np.ndarray - the values
+        shape: tuple[int, int] - the shape of the matrix
+
+    Return:
+        np.ndarray (the matrix, NaN where no value landed)
+    """
+    keep = (rows >= 0) & (columns >= 0) & (columns < shape[1]) & np.isfinite(values)
+    flat = rows[keep] * shape[1] + columns[keep]
+
+    sums = np.bincount(flat, weights=values[keep], minlength=shape[0] * shape[1])
+    counts = np.bincount(flat, minlength=shape[0] * shape[1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan).reshape(shape)
+
+def matrices(energy_hourly: pd.DataFrame, building_cells: pd.DataFrame, weather_hourly: pd.DataFrame, locations: np.ndarray | None = None) -> tuple:
+    """
+    Scatters the hourly energy and the weather of every building into building x hour matrices.
+
+    Args:
+        energy_hourly: pd.DataFrame - the output of regression.hourly_energy
+        building_cells: pd.DataFrame - location -> cell_y, cell_x (see weather.weather_for_buildings)
+        weather_hourly: pd.DataFrame - the output of regression.hourly_weather
+        locations: np.ndarray | None - the buildings (rows) to keep, every building with energy when None
+
+    Return:
+        tuple (hours, locations, load, temperature and humidity, missing hours are NaN)
+    """
+    if (locations is None):
+        locations = np.sort(energy_hourly["location"].unique())
+    buildings = pd.Index(locations)
+
+    first = energy_hourly["minutely_15"].min()
+    hours = pd.date_range(first, energy_hourly["minutely_15"].max(), freq="h")
+    shape = (len(buildings), len(hours))
+
+    def hour_of(times: pd.Series) -> np.ndarray:
+        return ((times - first) // pd.Timedelta("1h")).to_numpy(dtype=np.int64)
+
+    # hourly_energy already sums per building and hour, so the mean of one value is that sum
+    load = to_grid(
+        buildings.get_indexer(energy_hourly["location"]),
+        hour_of(energy_hourly["minutely_15"]),
+        energy_hourly["energy_per_sqft"].to_numpy(dtype=float),
+        shape
+    )
+
+    # The weather of every distinct cell, then one row per building through its cell
+    cells = building_cells.drop_duplicates("location").set_index("location").reindex(buildings)
+    cell_keys = pd.MultiIndex.from_frame(weather_hourly[["cell_y", "cell_x"]].drop_duplicates())
+    building_cell = cell_keys.get_indexer(pd.MultiIndex.from_frame(cells[["cell_y", "cell_x"]]))
+    weather_cell = cell_keys.get_indexer(pd.MultiIndex.from_frame(weather_hourly[["cell_y", "cell_x"]]))
+    weather_hour = hour_of(weather_hourly["minutely_15"])
+
+    weather = []
+    for column in ["apparent_temp", "humidity"]:
+        grid = to_grid(weather_cell, weather_hour, weather_hourly[column].to_numpy(dtype=float), (len(cell_keys), len(hours)))
+        grid = np.vstack([grid, np.full((1, len(hours)), np.nan)])
+        # Buildings without a cell (-1) pick the trailing all NaN row
+        weather.append(grid[building_cell])
+
+    return hours, buildings.to_numpy(), load, weather[0], weather[1]
+
+def design(hours: pd.DatetimeIndex, load: np.ndarray, temperature: np.ndarray, humidity: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Builds the feature rows of every building for every hour after the first HISTORY_HOURS.
+
+    Every lag is at least a day, so a whole day can be forecast at midnight.
+
+    Args:
+        hours: pd.DatetimeIndex - the hour of every column
+        load: np.ndarray - building x hour load, the first HISTORY_HOURS columns are history only
+        temperature: np.ndarray - building x hour apparent temperature
+        humidity: np.ndarray - building x hour humidity
+
+    Return:
+        tuple[np.ndarray, np.ndarray, np.ndarray] (building x hour x feature rows, building x hour
+                                                   targets and the mask of rows with every feature)
+    """
+    target = slice(HISTORY_HOURS, None)
+    buildings, count = load.shape[0], load.shape[1] - HISTORY_HOURS
+
+    hour_of_day = hours[target].hour.to_numpy()
+    hour_of_week = hour_of_day + DAY_HOURS * hours[target].dayofweek.to_numpy()
+    day_angle = 2 * np.pi * hour_of_day / DAY_HOURS
+    week_angle = 2 * np.pi * hour_of_week / HISTORY_HOURS
+
+    calendar = np.stack([
+        np.sin(day_angle), np.cos(day_angle),
+        np.sin(2 * day_angle), np.cos(2 * day_angle),
+        np.sin(3 * day_angle), np.cos(3 * day_angle),
+        np.sin(week_angle), np.cos(week_angle),
+        np.sin(2 * week_angle), np.cos(2 * week_angle)
+    ], axis=1)
+
+    x = np.empty((buildings, count, len(FEATURES)))
+    x[:, :, 0] = 1.0
+    x[:, :, 1] = load[:, HISTORY_HOURS - DAY_HOURS:-DAY_HOURS]
+    x[:, :, 2] = load[:, :-HISTORY_HOURS]
+    x[:, :, 3] = np.maximum(HEATING_BASE - temperature[:, target], 0)
+    x[:, :, 4] = np.maximum(temperature[:, target] - COOLING_BASE, 0)
+    x[:, :, 5] = humidity[:, target] / 100
+    x[:, :, 6:] = calendar[None, :, :]
+
+    valid = np.isfinite(x).all(axis=2)
+    return np.where(valid[:, :, None], x, 0.0), load[:, target], valid
+
+"""
+Brief: Batched ridge regression load forecaster. Every building has its own linear model but
+       the normal equations of all buildings are accumulated and solved as one stacked system,
+       and because the normal equations are sums over hours a new day is folded in by adding
+       its rows instead of refitting on the whole history.
+"""
+class load_forecaster:
+    def __init__(self, ridge: float = 1e-3, decay: float = 1.0, min_hours: int = 2 * HISTORY_HOURS, block_hours: int = HISTORY_HOURS) -> None:
+        """
+        Creates the load forecaster.
+
+        Args:
+            ridge: float - the ridge penalty relative to the size of every feature, keeps sparse buildings solvable
+            decay: float - the weight the existing normal equations keep per new day, below 1 forgets old behaviour
+            min_hours: int - buildings with fewer complete training hours get no forecast, counted with the decay weights
+            block_hours: int - the hours accumulated per vectorized block, bounds the memory used
+
+        Return:
+            None (load_forecaster is instantiated)
+        """
+        self.ridge = ridge
+        self.decay = decay
+        self.min_hours = min_hours
+        self.block_hours = block_hours
+
+        self.locations = None
+        self.coefficients = None
+
+    def accumulate(self, hours: pd.DatetimeIndex, load: np.ndarray, temperature: np.ndarray, humidity: np.ndarray) -> None:
+        """
+        Adds the rows of every hour after the first HISTORY_HOURS to the normal equations.
+
+        Args:
+            hours: pd.DatetimeIndex - the hour of every column
+            load: np.ndarray - building x hour load
+            temperature: np.ndarray - building x hour apparent temperature
+            humidity: np.ndarray - building x hour humidity
+
+        Return:
+            None
+        """
+        for start in range(HISTORY_HOURS, len(hours), self.block_hours):
+            block = slice(start - HISTORY_HOURS, min(start + self.block_hours, len(hours)))
+            x, y, valid = design(hours[block], load[:, block], temperature[:, block], humidity[:, block])
+            valid &= np.isfinite(y)
+            x = x * valid[:, :, None]
+            y = np.where(valid, y, 0.0)
+
+            self.xtx += np.einsum("bhf,bhg->bfg", x, x)
+            self.xty += np.einsum("bhf,bh->bf", x, y)
+            self.n += valid.sum(axis=1)
+
+    def solve(self) -> None:
+        """
+        Solves the normal equations of every building at once.
+
+        Args:
+            None
+
+        Return:
+            None
+        """
+        scale = np.diagonal(self.xtx, axis1=1, axis2=2)
+        penalty = self.ridge * scale + 1e-12
+        # The intercept is not shrunk
+        penalty[:, 0] = 1e-12
+        system = self.xtx + penalty[:, :, None] * np.eye(len(FEATURES))[None, :, :]
+
+        self.coefficients = np.linalg.solve(system, self.xty[:, :, None])[:, :, 0]
+        self.coefficients[self.n < self.min_hours] = np.nan
+
+    def remember(self, hours: pd.DatetimeIndex, load: np.ndarray, temperature: np.ndarray, humidity: np.ndarray) -> None:
+        """
+        Keeps the last HISTORY_HOURS as the lags of the next rows.
+
+        Args:
+            hours: pd.DatetimeIndex - the hour of every column
+            load: np.ndarray - building x hour load
+            temperature: np.ndarray - building x hour apparent temperature
+            humidity: np.ndarray - building x hour humidity
+
+        Return:
+            None
+        """
+        self.hours = hours[-HISTORY_HOURS:]
+        self.load = load[:, -HISTORY_HOURS:]
+        self.temperature = temperature[:, -HISTORY_HOURS:]
+        self.humidity = humidity[:, -HISTORY_HOURS:]
+
+    def fit_matrices(self, hours: pd.DatetimeIndex, locations: np.ndarray, load: np.ndarray, temperature: np.ndarray, humidity: np.ndarray) -> None:
+        """
+        Fits every building from scratch on already pivoted matrices (see matrices).
+
+        Args:
+            hours: pd.DatetimeIndex - the hour of every column
+            locations: np.ndarray - the building of every row
+            load: np.ndarray - building x hour load
+            temperature: np.ndarray - building x hour apparent temperature
+            humidity: np.ndarray - building x hour humidity
+
+        Return:
+            None
+        """
+        if (len(hours) <= HISTORY_HOURS):
+            raise ValueError(f"Forecasting needs more than {HISTORY_HOURS} hours of energy and weather")
+
+        self.locations = locations
+        self.xtx = np.zeros((len(locations), len(FEATURES), len(FEATURES)))
+        self.xty = np.zeros((len(locations), len(FEATURES)))
+        # Float, the hour count is decayed together with the normal equations
+        self.n = np.zeros(len(locations))
+
+        self.accumulate(hours, load, temperature, humidity)
+        self.remember(hours, load, temperature, humidity)
+        self.solve()
+
+    def fit(self, energy_hourly: pd.DataFrame, building_cells: pd.DataFrame, weather_hourly: pd.DataFrame) -> None:
+        """
+        Fits every building from scratch.
+
+        Args:
+            energy_hourly: pd.DataFrame - the output of regression.hourly_energy
+            building_cells: pd.DataFrame - location -> cell_y, cell_x (see weather.weather_for_buildings)
+            weather_hourly: pd.DataFrame - the output of regression.hourly_weather
+
+        Return:
+            None
+        """
+        self.building_cells = building_cells
+        self.fit_matrices(*matrices(energy_hourly, building_cells, weather_hourly))
+
+    def extend(self, hours: pd.DatetimeIndex, load: np.ndarray, temperature: np.ndarray, humidity: np.ndarray) -> None:
+        """
+        Folds hours that follow the remembered history into the fit.
+
+        Args:
+            hours: pd.DatetimeIndex - the new hours, directly after the last fitted hour
+            load: np.ndarray - building x hour load of the fitted buildings
+            temperature: np.ndarray - building x hour apparent temperature
+            humidity: np.ndarray - building x hour humidity
+
+        Return:
+            None
+        """
+        if (self.decay < 1):
+            weight = self.decay ** (len(hours) / DAY_HOURS)
+            self.xtx *= weight
+            self.xty *= weight
+            self.n *= weight
+
+        hours = self.hours.append(hours)
+        load = np.concatenate([self.load, load], axis=1)
+        temperature = np.concatenate([self.temperature, temperature], axis=1)
+        humidity = np.concatenate([self.humidity, humidity], axis=1)
+
+        self.accumulate(hours, load, temperature, humidity)
+        self.remember(hours, load, temperature, humidity)
+        self.solve()
+
+    def update(self, energy_hourly: pd.DataFrame, weather_hourly: pd.DataFrame) -> None:
+        """
+        Refits incrementally with newly arrived data, typically the last day.
+
+        Only hours after the last fitted hour are used, buildings that were not part of the
+        original fit are ignored until the next full fit.
+
+        Args:
+            energy_hourly: pd.DataFrame - new hourly energy (see regression.hourly_energy)
+            weather_hourly: pd.DataFrame - new hourly weather (see regression.hourly_weather)
+
+        Return:
+            None
+        """
+        if (self.coefficients is None):
+            raise RuntimeError("The load forecaster has not been fitted")
+
+        energy_hourly = energy_hourly[energy_hourly["minutely_15"] > self.hours[-1]]
+        if (len(energy_hourly) == 0):
+            return
+
+        hours, _, load, temperature, humidity = matrices(energy_hourly, self.building_cells, weather_hourly, self.locations)
+        # Hours missing between the fitted history and the new data stay NaN
+        gap = pd.date_range(self.hours[-1], hours[-1], freq="h")[1:]
+        position = gap.get_indexer(hours)
+
+        def widen(values: np.ndarray) -> np.ndarray:
+            wide = np.full((len(self.locations), len(gap)), np.nan)
+            wide[:, position] = values
+            return wide
+
+        self.extend(gap, widen(load), widen(temperature), widen(humidity))
+
+    def predict(self, hours: pd.DatetimeIndex, load: np.ndarray, temperature: np.ndarray, humidity: np.ndarray) -> np.ndarray:
+        """
+        Forecasts the hours after the first HISTORY_HOURS of the given matrices.
+
+        Args:
+            hours: pd.DatetimeIndex - the history hours followed by the forecast hours
+            load: np.ndarray - building x hour load, only the lags are read
+            temperature: np.ndarray - building x hour apparent temperature
+            humidity: np.ndarray - building x hour humidity
+
+        Return:
+            np.ndarray (building x forecast hour load, NaN where a feature or the model is missing)
+        """
+        x, _, valid = design(hours, load, temperature, humidity)
+        forecast = np.einsum("bhf,bf->bh", x, self.coefficients)
+        return np.where(valid, forecast, np.nan)
+
+    def predict_next_day(self, weather_hourly: pd.DataFrame | None = None) -> pd.DataFrame:
+        """
+        Forecasts the 24 hours after the last fitted hour.
+
+        Args:
+            weather_hourly: pd.DataFrame | None - the forecast weather of those hours (see regression.hourly_weather),
+                                                  the last 24 observed hours are repeated when None
+
+        Return:
+            pd.DataFrame (location, minutely_15 (the hour) and forecast)
+        """
+        if (self.coefficients is None):
+            raise RuntimeError("The load forecaster has not been fitted")
+
+        ahead = pd.date_range(self.hours[-1], periods=DAY_HOURS + 1, freq="h")[1:]
+        temperature, humidity = self.temperature[:, -DAY_HOURS:], self.humidity[:, -DAY_HOURS:]
+        if (weather_hourly is not None):
+            weather = self.building_cells[self.building_cells["location"].isin(self.locations)]\
+                .merge(weather_hourly, on=["cell_y", "cell_x"], how="inner")
+            temperature = weather.pivot_table(index="location", columns="minutely_15", values="apparent_temp")\
+                .reindex(index=self.locations, columns=ahead).to_numpy(dtype=float)
+            humidity = weather.pivot_table(index="location", columns="minutely_15", values="humidity")\
+                .reindex(index=self.locations, columns=ahead).to_numpy(dtype=float)
+
+        unknown = np.full((len(self.locations), DAY_HOURS), np.nan)
+        forecast = self.predict(
+            self.hours.append(ahead),
+            np.concatenate([self.load, unknown], axis=1),
+            np.concatenate([self.temperature, temperature], axis=1),
+            np.concatenate([self.humidity, humidity], axis=1)
+        )
+
+        return pd.DataFrame({
+            "location": np.repeat(self.locations, DAY_HOURS),
+            "minutely_15": np.tile(ahead, len(self.locations)),
+            "forecast": forecast.ravel()
+        })
+
+    def backtest(self, energy_hourly: pd.DataFrame, building_cells: pd.DataFrame, weather_hourly: pd.DataFrame, days: int = 7) -> pd.DataFrame:
+        """
+        Rolling origin backtest over the last days of the data.
+
+        The model is fitted on everything before the first test day, every test day is then
+        forecast at its midnight and folded in with update before the next day, exactly as the
+        daily refit would run. The observed weather stands in for the weather forecast. The
+        forecaster is left fitted on all of the data.
+
+        Args:
+            energy_hourly: pd.DataFrame - the output of regression.hourly_energy
+            building_cells: pd.DataFrame - location -> cell_y, cell_x (see weather.weather_for_buildings)
+            weather_hourly: pd.DataFrame - the output of regression.hourly_weather
+            days: int - the number of test days
+
+        Return:
+            pd.DataFrame (location, mae, rmse, cv_rmse, persistence_mae (yesterday's load as the
+                          forecast), skill (1 - mae / persistence_mae) and n_hours)
+        """
+        self.building_cells = building_cells
+        hours, locations, load, temperature, humidity = matrices(energy_hourly, building_cells, weather_hourly)
+        split = len(hours) - days * DAY_HOURS
+        if (split <= HISTORY_HOURS + DAY_HOURS):
+            raise ValueError(f"Backtesting {days} days needs more than {HISTORY_HOURS + DAY_HOURS + days * DAY_HOURS} hours of data")
+
+        self.fit_matrices(hours[:split], locations, load[:, :split], temperature[:, :split], humidity[:, :split])
+
+        forecasts = []
+        for day in range(days):
+            window = slice(split + day * DAY_HOURS - HISTORY_HOURS, split + (day + 1) * DAY_HOURS)
+            forecasts.append(self.predict(hours[window], load[:, window], temperature[:, window], humidity[:, window]))
+
+            today = slice(split + day * DAY_HOURS, split + (day + 1) * DAY_HOURS)
+            self.extend(hours[today], load[:, today], temperature[:, today], humidity[:, today])
+
+        forecast = np.concatenate(forecasts, axis=1)
+        actual = load[:, split:]
+        persistence = load[:, split - DAY_HOURS:-DAY_HOURS]
+        scored = np.isfinite(forecast) & np.isfinite(actual) & np.isfinite(persistence)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            count = scored.sum(axis=1)
+            error = np.where(scored, forecast - actual, 0.0)
+            mae = np.abs(error).sum(axis=1) / count
+            rmse = np.sqrt((error ** 2).sum(axis=1) / count)
+            mean = np.where(scored, actual, 0.0).sum(axis=1) / count
+            persistence_mae = np.abs(np.where(scored, persistence - actual, 0.0)).sum(axis=1) / count
+
+            return pd.DataFrame({
+                "location": locations,
+                "mae": mae,
+                "rmse": rmse,
+                "cv_rmse": rmse / mean,
+                "persistence_mae": persistence_mae,
+                "skill": 1 - mae / persistence_mae,
+                "n_hours": count
+            })
+
+if __name__ == "__main__":
+    """
+    Simple test cases for forecast are executed because of Debugging purposes.
+
+    Description.
+
+    Args:
+        None
+
+    Return:
+        None (test cases are executed)
+    """
+    rng = np.random.default_rng(0)
+    hours = pd.date_range("2025-06-01", periods=60 * DAY_HOURS, freq="h")
+    temperature = 70 + 10 * np.sin(2 * np.pi * (hours.hour.to_numpy() - 9) / DAY_HOURS)
+
+    energy, weather = [], []
+    for building in range(500):
+        occupied = ((hours.hour >= 8) & (hours.hour < 18) & (hours.dayofweek < 5)).astype(float)
+        load = 1 + rng.uniform(0.5, 2) * occupied + 0.05 * np.maximum(temperature - 65, 0) + rng.normal(0, 0.05, len(hours))
+        energy.append(pd.DataFrame({"location": f"building {building}", "minutely_15": hours, "energy_per_sqft": load}))
+
+    weather = pd.DataFrame({"cell_y": 0.0, "cell_x": 0.0, "minutely_15": hours, "apparent_temp": temperature, "humidity": 50.0})
+    cells = pd.DataFrame({"location": [f"building {building}" for building in range(500)], "cell_y": 0.0, "cell_x": 0.0})
+
+    forecaster = load_forecaster()
+    print(forecaster.backtest(pd.concat(energy, ignore_index=True), cells, weather).describe())
+    print(forecaster.predict_next_day().head())
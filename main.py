@@ -11,9 +11,12 @@ Copyright: Copyright (c) 2026
 import convert
 import requestClass
 import regression as rg
+import charts
 import numpy as np
 import tkinter as tk
 from tkinter import filedialog as fd
+from tkinter import ttk
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import threading
 
 """
@@ -29,7 +32,8 @@ class gui:
         aspect_ratio: float = 16/9,
         wrap_length: int = 150,
         justify_string: str = "center",
-        button_width: int = 25
+        button_width: int = 25,
+        preview_fraction: float | None = 0.05
     ) -> None:
         """
         Creates the converter class.
@@ -42,11 +46,14 @@ class gui:
         Args:
             path_string: str - the absolute or relative file path for the file that you want 
                                the converter to look at specifically
+            preview_fraction: float | None - the sample fraction of the regression preview shown before
+                                             the exact results, None waits for the exact results only
         
         Return:
             None (converter is instantiated)
         """
         self.HEIGHT = height
+        self.preview_fraction = preview_fraction
         self.ASPECT_RATIO = aspect_ratio
         self.title = title
 
@@ -158,19 +165,29 @@ class gui:
 
         return file_to_create
 
-    def on_meter_conversion_done(self) -> None:
+    def on_meter_conversion_done(self, quarantined_rows: int = 0, duplicate_rows: int = 0) -> None:
         """
         Updates the UI to sow that the conversion for the meter processing has been completed.
 
         Description.
 
         Args:
-            None
+            quarantined_rows: int - the number of rows that failed validation and were quarantined
+            duplicate_rows: int - the number of repeated readings that were dropped
         
         Return:
             None
         """
-        self.finishMeterLabel.config(text="Done!")
+        notes = []
+        if (quarantined_rows > 0):
+            notes.append(f"{quarantined_rows} rows quarantined")
+        if (duplicate_rows > 0):
+            notes.append(f"{duplicate_rows} duplicate rows dropped")
+
+        if (len(notes) > 0):
+            self.finishMeterLabel.config(text=f"Done! ({', '.join(notes)})")
+        else:
+            self.finishMeterLabel.config(text="Done!")
         self.buttonToExecuteConversion.config(state=tk.NORMAL)
 
     def execute_meter_conversion_safe(self, input_file: str, output_file: str) -> None:
@@ -188,9 +205,10 @@ class gui:
             None
         """
         try:
-            convert.converter(path_string=input_file, isMeter=True).execute_meter_conversion(output_file)
+            conv = convert.converter(path_string=input_file, isMeter=True)
+            conv.execute_meter_conversion(output_file)
 
-            self.root.after(0, self.on_meter_conversion_done)
+            self.root.after(0, lambda rows=conv.quarantined_rows, duplicates=conv.duplicate_rows: self.on_meter_conversion_done(rows, duplicates))
         except Exception as e:
             self.root.after(0, lambda err=e: self.finishBuildingLabel.config(text=str(err)))
 
@@ -343,7 +361,8 @@ class gui:
         """
         Executed regression and showcases new tkinter window for more accurate results.
 
-        Description.
+        The regression runs on a background thread, a preview from a stratified sample is
+        shown first and replaced by the exact results once the full run finishes.
 
         Args:
             None
@@ -356,36 +375,223 @@ class gui:
 
                 raise RuntimeError("Unable to create regression for files that have not been entered yet!")
             
-            degree = 2
             # rg.regression(2, "test1.csv", "test2.csv")
             print(f"filteredBuilt: {self.currentFileToFilteredBuild}, toCreate: {self.currentFileToCreate}")
-            
-            reg = rg.regression(degree, self.currentFileToCreate, self.currentFileToFilteredBuild, "Energy Consumption v. Sqft")
 
             newWindow = tk.Toplevel(self.root)
             newWindow.title("Regression Results")
-            newWindow.geometry("250x150")
+            newWindow.geometry("900x650")
+
+            statusLabel = tk.Label(newWindow, text="Running regression...", justify=tk.LEFT)
+            statusLabel.pack()
+
+            resultsFrame = tk.Frame(newWindow)
+            resultsFrame.pack(fill=tk.BOTH, expand=True)
 
+            tk.Button(newWindow, text="Close Window", command=newWindow.destroy).pack()
+
+            self.buttonToRunPowerRegression['state'] = tk.DISABLED
+
+            worker = threading.Thread(
+                target=self.execute_regression_safe,
+                args=(self.currentFileToCreate, self.currentFileToFilteredBuild, newWindow, statusLabel, resultsFrame),
+                daemon=True
+            )
+            worker.start()
+        except Exception as e:
+            print(f"Error occured in {self.create_regression_for_energy_per_sqrt.__name__}: {e}")
+            raise RuntimeError(f"Error occured in {self.create_regression_for_energy_per_sqrt.__name__}") from e
+
+    def execute_regression_safe(self, energy_file: str, building_file: str, window: tk.Toplevel, status_label: tk.Label, results_frame: tk.Frame) -> None:
+        """
+        Runs the preview and then the full regression, handing each result to the GUI thread.
+
+        Description.
+
+        Args:
+            energy_file: str - the converted meter file ( selected in the GUI )
+            building_file: str - the filtered building file ( selected in the GUI )
+            window: tk.Toplevel - the results window
+            status_label: tk.Label - tells whether the preview or the exact results are shown
+            results_frame: tk.Frame - the frame the results are shown in
         
-            # topLabel = tk.Label(newWindow, text=f"Polynomial Regression Results (Deg = {degree}): {reg.coefficients}")
+        Return:
+            None
+        """
+        degree = 2
+        try:
+            # A failed preview is reported but does not stop the exact run
+            if (self.preview_fraction is not None):
+                try:
+                    preview = rg.regression(degree, energy_file, building_file, "Energy Consumption v. Sqft", sample_fraction=self.preview_fraction)
+                    self.root.after(0, lambda reg=preview: self.show_regression_results(window, status_label, results_frame, reg))
+                except Exception as e:
+                    print(f"Error occured in {self.execute_regression_safe.__name__} (preview): {e}")
+                    self.root.after(0, lambda err=e: status_label.config(text=f"Preview failed, running the exact regression... ({err})") if window.winfo_exists() else None)
+
+            try:
+                reg = rg.regression(degree, energy_file, building_file, "Energy Consumption v. Sqft")
+                self.root.after(0, lambda reg=reg: self.show_regression_results(window, status_label, results_frame, reg))
+            except Exception as e:
+                print(f"Error occured in {self.execute_regression_safe.__name__}: {e}")
+                self.root.after(0, lambda err=e: status_label.config(text=str(err)) if window.winfo_exists() else None)
+        finally:
+            self.root.after(0, lambda: self.buttonToRunPowerRegression.config(state=tk.NORMAL))
+
+    def show_regression_results(self, window: tk.Toplevel, status_label: tk.Label, results_frame: tk.Frame, reg: rg.regression) -> None:
+        """
+        Shows the results of a regression, replacing whatever was shown before (the preview).
+
+        Description.
+
+        Args:
+            window: tk.Toplevel - the results window
+            status_label: tk.Label - tells whether the preview or the exact results are shown
+            results_frame: tk.Frame - the frame the results are shown in
+            reg: rg.regression - the finished regression
+
+        Return:
+            None
+        """
+        try:
+            # The window may have been closed while the regression was running
+            if (not window.winfo_exists()):
+                return
+
+            for child in results_frame.winfo_children():
+                child.destroy()
+
+            if (reg.preview):
+                status_label.config(text=f"Preview from a {reg.sampleFraction:.0%} stratified sample, exact results are still running...")
+            else:
+                status_label.config(text="Exact results")
+
+            tabs = ttk.Notebook(results_frame)
+            tabs.pack(fill=tk.BOTH, expand=True)
+
+            summaryTab = tk.Frame(tabs)
+            tabs.add(summaryTab, text="Summary")
+
+            # topLabel = tk.Label(summaryTab, text=f"Polynomial Regression Results (Deg = {degree}): {reg.coefficients}")
             # topLabel.pack()
 
-            secondLabel = tk.Label(newWindow, text=f"Best Energy Consumption Candidate: {reg.bestEnergyCandidate}")
+            if (reg.preview):
+                bound = (reg.previewBounds["total_energy_per_sqft_error"] / reg.previewBounds["total_energy_per_sqft"]).median()
+                tk.Label(summaryTab, text=f"Total Energy per Sqft: estimated within a median of +/- {bound:.1%} (95% bounds)", justify=tk.LEFT).pack()
+
+            secondLabel = tk.Label(summaryTab, text=f"Best Energy Consumption Candidate: {reg.bestEnergyCandidate}", justify=tk.LEFT)
             secondLabel.pack()
 
-            thirdLabel = tk.Label(newWindow, text=f"Worst Energy Consumption Candidate: {reg.worstEnergyCandidate}")
+            thirdLabel = tk.Label(summaryTab, text=f"Worst Energy Consumption Candidate: {reg.worstEnergyCandidate}", justify=tk.LEFT)
             thirdLabel.pack()
 
-            tk.Label(newWindow, text=f"Best Weather Candidate: {reg.bestWeatherCandidate}").pack()
-            tk.Label(newWindow, text=f"Worst Weather Candidate: {reg.worstWeatherCandidate}").pack()
-            
+            tk.Label(summaryTab, text=f"Best Weather Candidate: {reg.bestWeatherCandidate}", justify=tk.LEFT).pack()
+            tk.Label(summaryTab, text=f"Worst Weather Candidate: {reg.worstWeatherCandidate}", justify=tk.LEFT).pack()
 
-            tk.Button(newWindow, text="Close Window", command=newWindow.destroy).pack()
+            campus = reg.rollup.view("campus").groupby("utility")["energy"].sum()
+            tk.Label(summaryTab, text="Campus Energy by Utility (kJ): " + ", ".join(f"{utility} {energy:.3g}" for utility, energy in campus.items()), justify=tk.LEFT).pack()
+
+            # Demand is electricity only, data without any has no peaks
+            if (len(reg.peakDemand) > 0):
+                highest = reg.peakDemand.sort_values("peak_kw", ascending=False).iloc[0]
+                tk.Label(summaryTab, text=f"Highest Peak Demand: {highest['location']} {highest['peak_kw']:.1f} kW at {highest['peak_time']} (load factor {highest['load_factor']:.2f})", justify=tk.LEFT).pack()
+
+            if (reg.forecastBacktest is not None):
+                tk.Label(summaryTab, text=f"Next Day Forecast: median CV(RMSE) {reg.forecastBacktest['cv_rmse'].median():.1%}, median skill over persistence {reg.forecastBacktest['skill'].median():.2f}", justify=tk.LEFT).pack()
+
+            tk.Label(summaryTab, text=f"Median Thermal Lag: {reg.weatherCorrelation['temperature_lag'].median():g} h (median correlation {reg.weatherCorrelation['temperature_r'].median():.2f})", justify=tk.LEFT).pack()
+
+            if (reg.changePointModels is not None):
+                models = reg.changePointModels["model"].value_counts().to_dict()
+                tk.Label(summaryTab, text=f"Change Point Models: {models} (fitted humidity weight {reg.fittedAlpha:g})", justify=tk.LEFT).pack()
+
+            energyTab = tk.Frame(tabs)
+            tabs.add(energyTab, text="Energy per Sqft")
+            self.embed_figure(energyTab, reg.energyFigure)
+
+            weatherTab = tk.Frame(tabs)
+            tabs.add(weatherTab, text="Weather Normalized")
+            self.embed_figure(weatherTab, reg.weatherFigure)
+
+            timeSeriesTab = tk.Frame(tabs)
+            tabs.add(timeSeriesTab, text="Energy v. Weather")
+            self.create_time_series_tab(timeSeriesTab, reg)
 
-            
         except Exception as e:
-            print(f"Error occured in {self.create_regression_for_energy_per_sqrt.__name__}: {e}")
-            raise RuntimeError(f"Error occured in {self.create_regression_for_energy_per_sqrt.__name__}") from e
+            print(f"Error occured in {self.show_regression_results.__name__}: {e}")
+            raise RuntimeError(f"Error occured in {self.show_regression_results.__name__}") from e
+
+    def embed_figure(self, master: tk.Widget, figure) -> FigureCanvasTkAgg:
+        """
+        Embeds a matplotlib figure with its navigation toolbar into a tkinter widget.
+
+        Description.
+
+        Args:
+            master: tk.Widget - the widget that the figure is packed into
+            figure: Figure - the matplotlib figure to show
+
+        Return:
+            FigureCanvasTkAgg (the canvas that draws the figure)
+        """
+        canvas = FigureCanvasTkAgg(figure, master=master)
+        toolbar = NavigationToolbar2Tk(canvas, master, pack_toolbar=False)
+        toolbar.update()
+        toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+        canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        canvas.draw()
+
+        return canvas
+
+    def create_time_series_tab(self, master: tk.Widget, reg: rg.regression) -> None:
+        """
+        Creates the per-building energy v. weather time series view with a building picker.
+
+        The chart is rebuilt whenever another building is picked, the series are decimated
+        by charts.time_series_view so zooming stays responsive on long series.
+
+        Args:
+            master: tk.Widget - the widget that the view is packed into
+            reg: rg.regression - the finished regression to take the series from
+
+        Return:
+            None
+        """
+        if (len(reg.locations) == 0):
+            tk.Label(master, text="No buildings to show").pack()
+            return
+
+        controls = tk.Frame(master)
+        controls.pack(side=tk.TOP, fill=tk.X)
+        chartFrame = tk.Frame(master)
+        chartFrame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+        selectedBuilding = tk.StringVar(master, value=reg.locations[0])
+        selectedMethod = tk.StringVar(master, value="lttb")
+
+        def _show_building(*_):
+            for child in chartFrame.winfo_children():
+                child.destroy()
+
+            energy, weather = reg.building_time_series(selectedBuilding.get())
+            view = charts.time_series_view(
+                energy,
+                weather,
+                title=selectedBuilding.get(),
+                method=selectedMethod.get()
+            )
+            self.embed_figure(chartFrame, view.figure)
+            # Keep the view alive for as long as its chart is shown (it owns the zoom callback)
+            chartFrame.view = view
+
+        tk.Label(controls, text="Building:").pack(side=tk.LEFT)
+        ttk.Combobox(controls, textvariable=selectedBuilding, values=reg.locations, state="readonly").pack(side=tk.LEFT)
+        tk.Label(controls, text="Decimation:").pack(side=tk.LEFT)
+        ttk.Combobox(controls, textvariable=selectedMethod, values=list(charts.DECIMATORS), state="readonly", width=8).pack(side=tk.LEFT)
+
+        selectedBuilding.trace_add("write", _show_building)
+        selectedMethod.trace_add("write", _show_building)
+        _show_building()
 
     def create_display(self) -> None:
         """
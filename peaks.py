@@ -0,0 +1,460 @@
+"""
+File: peaks.py
+Author: Ben Miller
+Brief: Streaming peak demand analytics per building, the top 15 minute intervals, daily and
+       monthly peaks and the load factor, computed in one pass over converted meter data.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import heapq
+import numpy as np
+import pandas as pd
+import regression as rg
+import spatial
+
+"""
+Brief: One pass peak demand tracker. The interval demand of a building is the sum of all of
+       its electricity meters per reading time, the k highest intervals of every building are
+       kept in a bounded min-heap and the daily peaks and monthly sums grow with the number of
+       days only. Intervals are closed once the stream has moved past them, so no step ever
+       sorts or holds the raw readings.
+"""
+class peak_demand:
+    def __init__(self, k: int = 10, freq: str = "15min", lateness: str | None = "1h", retention: str | None = "1D", utility: str | None = "electricity") -> None:
+        """
+        Creates the peak demand tracker.
+
+        An interval stays open until the stream has moved lateness past it, so the meters of
+        one building that straddle a chunk boundary still add up to one interval. The total of
+        a closed interval is kept for retention behind the watermark, a reading arriving after
+        its interval was closed is merged into that total, which updates the heaps, daily peaks
+        and monthly sums in place instead of counting the interval a second time. Readings
+        older than retention (late_rows counts all late readings, dropped_rows these) only add
+        to the monthly energy. For time ordered data the state is bounded by retention, data
+        in any other order (the converter writes it meter by meter) is exact with retention
+        None, which keeps one total per building and interval. lateness None keeps every
+        interval open until flush.
+
+        Demand is only meaningful for one utility, the readings of the others are ignored.
+
+        Args:
+            k: int - the number of highest intervals kept per building
+            freq: str - the reading interval, used to turn interval energy (kJ) into demand (kW)
+            lateness: str | None - how long an interval stays open for more readings, None until flush
+            retention: str | None - how long closed interval totals are kept for late readings, None for ever
+            utility: str | None - the utility column value to track, None tracks every reading
+                                  (data without a utility column is always tracked whole)
+
+        Return:
+            None (peak_demand is instantiated)
+        """
+        self.k = k
+        self.freq = pd.Timedelta(freq)
+        self.lateness = pd.Timedelta(lateness) if lateness is not None else None
+        self.retention = pd.Timedelta(retention) if retention is not None else None
+        self.utility = utility
+
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forgets everything seen so far.
+
+        Args:
+            None
+
+        Return:
+            None
+        """
+        # location -> min-heap of (energy, time in ns) of its k highest intervals
+        self.heaps = {}
+        # Intervals that may still receive readings (location, time, energy), in parts until flush when lateness is None
+        self.pending = None
+        self.pending_parts = []
+        # Totals of closed intervals within retention, by interval key (see interval_keys)
+        self.closed_keys = pd.Index([], dtype=np.int64)
+        self.closed_energy = np.zeros(0)
+        self.closed_times = np.zeros(0, dtype=np.int64)
+        self.location_codes = {}
+        # Highest interval of every building and day (location, day, peak, peak_time)
+        self.daily = pd.DataFrame({
+            "location": pd.Series(dtype=object),
+            "day": pd.Series(dtype="datetime64[ns]"),
+            "peak": pd.Series(dtype=float),
+            "peak_time": pd.Series(dtype="datetime64[ns]")
+        })
+        # Running sums per building and month (location, month, energy, n_intervals)
+        self.monthly = pd.DataFrame({
+            "location": pd.Series(dtype=object),
+            "month": pd.Series(dtype="period[M]"),
+            "energy": pd.Series(dtype=float),
+            "n_intervals": pd.Series(dtype=np.int64)
+        })
+        self.watermark = None
+        self.late_rows = 0
+        self.dropped_rows = 0
+
+    def interval_keys(self, intervals: pd.DataFrame) -> np.ndarray:
+        """
+        Packs the location and time of every interval into one int64 key.
+
+        Args:
+            intervals: pd.DataFrame - location and time of the intervals
+
+        Return:
+            np.ndarray (location code in the high 32 bits, minutes since the epoch in the low 32)
+        """
+        for location in intervals["location"].unique():
+            self.location_codes.setdefault(location, len(self.location_codes))
+
+        codes = intervals["location"].map(self.location_codes).to_numpy(dtype=np.int64)
+        minutes = intervals["time"].to_numpy(dtype="datetime64[ns]").view(np.int64) // 60_000_000_000
+        return (codes << 32) | minutes
+
+    def update(self, merged: pd.DataFrame) -> None:
+        """
+        Streams a chunk of joined meter rows through the tracker.
+
+        Args:
+            merged: pd.DataFrame - rows with location, time, readingvalue and utility (see regression.join_energy_area)
+
+        Return:
+            None
+        """
+        try:
+            if (self.utility is not None and "utility" in merged.columns):
+                merged = merged[merged["utility"] == self.utility]
+
+            intervals = merged.groupby(["location", "time"], as_index=False)["readingvalue"].sum()
+            intervals = intervals.rename(columns={"readingvalue": "energy"})
+
+            if (self.lateness is None):
+                # Nothing closes before flush, the parts are only added up once
+                self.pending_parts.append(intervals)
+                return
+
+            if (self.watermark is not None):
+                late = intervals["time"] <= self.watermark
+                self.late_rows += int(merged["time"].le(self.watermark).sum())
+                if (self.retention is not None):
+                    self.dropped_rows += int(merged["time"].lt(self.watermark - self.retention).sum())
+                self.merge_late(intervals[late])
+                intervals = intervals[~late]
+
+            if (self.pending is not None):
+                intervals = pd.concat([self.pending, intervals], ignore_index=True)\
+                    .groupby(["location", "time"], as_index=False)["energy"].sum()
+            if (len(intervals) == 0):
+                return
+
+            ready = intervals["time"] < intervals["time"].max() - self.lateness
+            self.close(intervals[ready])
+            self.pending = intervals[~ready]
+            if (ready.any()):
+                self.watermark = intervals.loc[ready, "time"].max()
+                self.forget()
+        except Exception as e:
+            print(f"Error occured in {self.update.__name__}: {e}")
+            raise RuntimeError(f"Error occured in {self.update.__name__}") from e
+
+    def flush(self) -> None:
+        """
+        Closes every interval that is still open at the end of the stream.
+
+        Args:
+            None
+
+        Return:
+            None
+        """
+        if (len(self.pending_parts) > 0):
+            self.pending = pd.concat(self.pending_parts, ignore_index=True)\
+                .groupby(["location", "time"], as_index=False)["energy"].sum()
+            self.pending_parts = []
+
+        if (self.pending is None or len(self.pending) == 0):
+            return
+
+        self.watermark = self.pending["time"].max()
+        self.close(self.pending)
+        self.pending = None
+        self.forget()
+
+    def forget(self) -> None:
+        """
+        Drops the closed interval totals that fell out of retention behind the watermark.
+
+        Args:
+            None
+
+        Return:
+            None
+        """
+        if (self.retention is None or len(self.closed_keys) == 0):
+            return
+
+        kept = self.closed_times >= (self.watermark - self.retention).value
+        if (not kept.all()):
+            self.closed_keys = self.closed_keys[kept]
+            self.closed_energy = self.closed_energy[kept]
+            self.closed_times = self.closed_times[kept]
+
+    def close(self, intervals: pd.DataFrame) -> None:
+        """
+        Folds complete intervals into the heaps, daily peaks and monthly sums.
+
+        Args:
+            intervals: pd.DataFrame - location, time and energy of complete intervals
+
+        Return:
+            None
+        """
+        if (len(intervals) == 0):
+            return
+
+        if (self.lateness is not None):
+            self.closed_keys = self.closed_keys.append(pd.Index(self.interval_keys(intervals)))
+            self.closed_energy = np.concatenate((self.closed_energy, intervals["energy"].to_numpy(dtype=float)))
+            self.closed_times = np.concatenate((self.closed_times, intervals["time"].to_numpy(dtype="datetime64[ns]").view(np.int64)))
+
+        # Only the k highest of every building can enter its heap
+        highest = intervals.loc[intervals.groupby("location")["energy"].nlargest(self.k).index.get_level_values(-1)]
+        for location, time, energy in highest[["location", "time", "energy"]].itertuples(index=False):
+            self.push(location, time.value, energy)
+
+        self.fold_daily(intervals)
+        self.fold_monthly(intervals.assign(n_intervals=1))
+
+    def merge_late(self, intervals: pd.DataFrame) -> None:
+        """
+        Adds late readings to intervals that were already closed.
+
+        Totals only grow (readings are positive), so an interval can only rise in its heap and
+        its day, both are updated from the merged total. Intervals that were never closed are
+        closed now, intervals that fell out of retention only add to the monthly energy.
+
+        Args:
+            intervals: pd.DataFrame - location, time and energy of the late readings per interval
+
+        Return:
+            None
+        """
+        if (len(intervals) == 0):
+            return
+
+        position = self.closed_keys.get_indexer(self.interval_keys(intervals))
+        known = position >= 0
+        forgotten = np.zeros(len(intervals), dtype=bool)
+        if (self.retention is not None):
+            forgotten = ~known & (intervals["time"] < self.watermark - self.retention).to_numpy()
+
+        self.close(intervals[~known & ~forgotten])
+        self.fold_monthly(intervals[forgotten].assign(n_intervals=0))
+
+        merged = intervals[known].copy()
+        merged["energy"] = self.closed_energy[position[known]] + merged["energy"].to_numpy(dtype=float)
+        self.closed_energy[position[known]] = merged["energy"].to_numpy()
+
+        for location, time, energy in merged[["location", "time", "energy"]].itertuples(index=False):
+            heap = self.heaps.get(location, [])
+            if (len(heap) < self.k or energy > heap[0][0]):
+                self.push(location, time.value, energy)
+
+        self.fold_daily(merged)
+        self.fold_monthly(intervals[known].assign(n_intervals=0))
+
+    def push(self, location: str, time: int, energy: float) -> None:
+        """
+        Offers the total of an interval to the heap of its building, replacing the interval's
+        earlier total when it is already in there.
+
+        Args:
+            location: str - the building
+            time: int - the interval start in ns
+            energy: float - the interval total
+
+        Return:
+            None
+        """
+        heap = self.heaps.setdefault(location, [])
+        for index, (_, held) in enumerate(heap):
+            if (held == time):
+                heap[index] = (energy, time)
+                heapq.heapify(heap)
+                return
+
+        if (len(heap) < self.k):
+            heapq.heappush(heap, (energy, time))
+        elif ((energy, time) > heap[0]):
+            heapq.heapreplace(heap, (energy, time))
+
+    def fold_daily(self, intervals: pd.DataFrame) -> None:
+        """
+        Raises the daily peaks by interval totals.
+
+        Args:
+            intervals: pd.DataFrame - location, time and energy (the whole interval total)
+
+        Return:
+            None
+        """
+        if (len(intervals) == 0):
+            return
+
+        days = intervals.assign(day=intervals["time"].dt.floor("D"))\
+            .rename(columns={"energy": "peak", "time": "peak_time"})[["location", "day", "peak", "peak_time"]]
+        days = pd.concat([self.daily, days], ignore_index=True) if len(self.daily) > 0 else days.reset_index(drop=True)
+        self.daily = days.loc[days.groupby(["location", "day"])["peak"].idxmax()].reset_index(drop=True)
+
+    def fold_monthly(self, intervals: pd.DataFrame) -> None:
+        """
+        Adds energy and interval counts to the monthly sums.
+
+        Args:
+            intervals: pd.DataFrame - location, time, energy (what is added) and n_intervals (the new intervals)
+
+        Return:
+            None
+        """
+        if (len(intervals) == 0):
+            return
+
+        months = intervals.assign(month=intervals["time"].dt.to_period("M"))\
+            .groupby(["location", "month"], as_index=False)[["energy", "n_intervals"]].sum()
+        if (len(self.monthly) > 0):
+            months = pd.concat([self.monthly, months], ignore_index=True)\
+                .groupby(["location", "month"], as_index=False)[["energy", "n_intervals"]].sum()
+        self.monthly = months
+
+    def kilowatts(self, energy: pd.Series) -> pd.Series:
+        """
+        Turns the energy of one interval into the average demand over it.
+
+        Args:
+            energy: pd.Series - kJ per interval
+
+        Return:
+            pd.Series (kW)
+        """
+        return energy.astype(float) / self.freq.total_seconds()
+
+    def top_intervals(self) -> pd.DataFrame:
+        """
+        Returns the k highest intervals of every building.
+
+        Args:
+            None
+
+        Return:
+            pd.DataFrame (location, rank, time, energy and demand_kw, highest first)
+        """
+        rows = [
+            (location, rank + 1, pd.Timestamp(time), energy)
+            for location, heap in self.heaps.items()
+            for rank, (energy, time) in enumerate(sorted(heap, reverse=True))
+        ]
+        top = pd.DataFrame(rows, columns=["location", "rank", "time", "energy"])
+        top["demand_kw"] = self.kilowatts(top["energy"])
+        return top.sort_values(["location", "rank"]).reset_index(drop=True)
+
+    def daily_peaks(self) -> pd.DataFrame:
+        """
+        Returns the highest interval of every building and day.
+
+        Args:
+            None
+
+        Return:
+            pd.DataFrame (location, day, peak_time, peak and peak_kw)
+        """
+        daily = self.daily.sort_values(["location", "day"]).reset_index(drop=True)
+        daily["peak_kw"] = self.kilowatts(daily["peak"])
+        return daily[["location", "day", "peak_time", "peak", "peak_kw"]]
+
+    def monthly_peaks(self) -> pd.DataFrame:
+        """
+        Returns the billing peak and load factor of every building and month.
+
+        The load factor is the average demand over the peak demand, 1 is a perfectly flat load.
+
+        Args:
+            None
+
+        Return:
+            pd.DataFrame (location, month, peak_time, peak, peak_kw, mean_kw and load_factor)
+        """
+        daily = self.daily.assign(month=self.daily["day"].dt.to_period("M"))\
+            .sort_values("peak", ascending=False, kind="stable")\
+            .drop_duplicates(["location", "month"])
+        monthly = self.monthly.merge(daily[["location", "month", "peak_time", "peak"]], on=["location", "month"], how="inner")
+
+        monthly["peak_kw"] = self.kilowatts(monthly["peak"])
+        monthly["mean_kw"] = self.kilowatts(monthly["energy"] / monthly["n_intervals"])
+        monthly["load_factor"] = monthly["mean_kw"] / monthly["peak_kw"]
+
+        return monthly[["location", "month", "peak_time", "peak", "peak_kw", "mean_kw", "load_factor"]]\
+            .sort_values(["location", "month"])\
+            .reset_index(drop=True)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Returns the peak and load factor of every building over the whole period.
+
+        Args:
+            None
+
+        Return:
+            pd.DataFrame (location, peak_time, peak_kw, mean_kw, load_factor and n_intervals)
+        """
+        totals = self.monthly.groupby("location", as_index=False)[["energy", "n_intervals"]].sum()
+        peaks = self.top_intervals()
+        peaks = peaks[peaks["rank"] == 1].rename(columns={"time": "peak_time", "demand_kw": "peak_kw"})
+
+        summary = peaks[["location", "peak_time", "peak_kw"]].merge(totals, on="location", how="inner")
+        summary["mean_kw"] = self.kilowatts(summary["energy"] / summary["n_intervals"])
+        summary["load_factor"] = summary["mean_kw"] / summary["peak_kw"]
+        summary["n_intervals"] = summary["n_intervals"].astype(np.int64)
+
+        return summary[["location", "peak_time", "peak_kw", "mean_kw", "load_factor", "n_intervals"]]
+
+def peak_file(meter_file: str, area: pd.DataFrame, spatial_index: spatial.spatial_index | None = None, k: int = 10, lateness: str | None = None, chunksize: int = 500_000) -> peak_demand:
+    """
+    Streams a converted meter csv file through the peak demand tracker chunk by chunk.
+
+    Description.
+
+    Args:
+        meter_file: str - the converted meter csv file
+        area: pd.DataFrame - the building table
+        spatial_index: spatial.spatial_index | None - resolves meters by location when given
+        k: int - the number of highest intervals kept per building
+        lateness: str | None - see peak_demand, None is exact for files in any order
+        chunksize: int - the number of rows read per chunk
+
+    Return:
+        peak_demand (the tracker after the whole file, see its top_intervals, daily_peaks, monthly_peaks and summary)
+    """
+    tracker = peak_demand(k, lateness=lateness)
+    for chunk in pd.read_csv(meter_file, chunksize=chunksize):
+        tracker.update(rg.join_energy_area(chunk, area, spatial_index))
+    tracker.flush()
+
+    return tracker
+
+if __name__ == '__main__':
+    """
+    Simple test cases for peaks are executed because of Debugging purposes.
+
+    Description.
+
+    Args:
+        None
+
+    Return:
+        None (test cases are executed)
+    """
+    buildings = pd.read_csv("buildings.csv")
+    print(peak_file("output.csv", buildings).summary())
@@ -0,0 +1,268 @@
+"""
+File: pipeline.py
+Author: Ben Miller
+Brief: Headless command line runner for the full flow (meter conversion, building conversion,
+       regression) that runs independent stages in parallel processes and skips stages whose
+       outputs are already newer than their inputs.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import convert
+import regression as rg
+
+def run_meter_conversion(input_file: str, output_file: str) -> None:
+    """
+    Stage target, converts the raw meter data.
+
+    Args:
+        input_file: str - the raw meter csv file
+        output_file: str - the converted meter csv file
+
+    Return:
+        None
+    """
+    convert.converter(path_string=input_file, isMeter=True).execute_meter_conversion(output_file)
+
+def run_building_conversion(input_file: str, output_file: str) -> None:
+    """
+    Stage target, filters the raw building data.
+
+    Args:
+        input_file: str - the raw building csv file
+        output_file: str - the filtered building csv file
+
+    Return:
+        None
+    """
+    convert.converter(path_string=input_file, isMeter=False).execute_building_conversion(output_file)
+
+def run_regression(meter_file: str, building_file: str, output_dir: str) -> None:
+    """
+    Stage target, runs the regression and writes its csv reports into output_dir.
+
+    Args:
+        meter_file: str - the converted meter csv file
+        building_file: str - the filtered building csv file
+        output_dir: str - the folder the reports are written to
+
+    Return:
+        None
+    """
+    # No chdir, the worker processes are reused by the next stages
+    rg.regression(2, meter_file, building_file, "Energy Consumption v. Sqft", report_dir=output_dir)
+
+"""
+Brief: One step of the pipeline, what it reads, what it writes and which steps must finish first.
+"""
+class stage:
+    def __init__(self, name: str, target, args: tuple, inputs: list[str], outputs: list[str], depends: list[str] | None = None) -> None:
+        """
+        Creates a pipeline stage.
+
+        Args:
+            name: str - the unique name of the stage
+            target: callable - a module level function run in a worker process
+            args: tuple - the arguments for target
+            inputs: list[str] - the files the stage reads
+            outputs: list[str] - the files the stage writes
+            depends: list[str] | None - the names of the stages that must finish first
+
+        Return:
+            None (stage is instantiated)
+        """
+        self.name = name
+        self.target = target
+        self.args = args
+        self.inputs = inputs
+        self.outputs = outputs
+        self.depends = list(depends) if depends is not None else []
+
+    def is_up_to_date(self) -> bool:
+        """
+        Checks whether every output exists and is newer than every input.
+
+        Args:
+            None
+
+        Return:
+            bool (True when the stage can be skipped)
+        """
+        if (not all(os.path.exists(path) for path in self.outputs)):
+            return False
+        if (not all(os.path.exists(path) for path in self.inputs)):
+            return False
+
+        newest_input = max((os.path.getmtime(path) for path in self.inputs), default=0)
+        oldest_output = min(os.path.getmtime(path) for path in self.outputs)
+        return oldest_output >= newest_input
+
+def timed(target, args: tuple) -> float:
+    """
+    Runs a stage target inside a worker process and measures it.
+
+    Args:
+        target: callable - the stage target
+        args: tuple - the arguments for target
+
+    Return:
+        float (the seconds the stage took)
+    """
+    started = time.perf_counter()
+    target(*args)
+    return time.perf_counter() - started
+
+def run_stages(stages: list[stage], jobs: int = 2, force: bool = False) -> dict:
+    """
+    Runs the stages in dependency order, every stage whose dependencies are done is started
+    right away so independent stages overlap in separate processes.
+
+    A stage that fails blocks everything that depends on it, independent stages still run.
+
+    Args:
+        stages: list[stage] - the stages of the pipeline
+        jobs: int - the number of worker processes
+        force: bool - run every stage even when its outputs are up to date
+
+    Return:
+        dict (stage name -> (status, seconds)), status is ran, skipped, failed or blocked
+    """
+    by_name = {item.name: item for item in stages}
+    for item in stages:
+        for dependency in item.depends:
+            if (dependency not in by_name):
+                raise ValueError(f"Stage {item.name} depends on unknown stage {dependency}")
+
+    results = {}
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while (len(results) < len(stages)):
+            settled = len(results)
+            for item in stages:
+                if (item.name in results or item.name in running.values()):
+                    continue
+
+                states = [results.get(dependency, (None,))[0] for dependency in item.depends]
+                if (any(state in ["failed", "blocked"] for state in states)):
+                    results[item.name] = ("blocked", 0.0)
+                    continue
+                if (not all(state in ["ran", "skipped"] for state in states)):
+                    continue
+
+                if (not force and item.is_up_to_date()):
+                    results[item.name] = ("skipped", 0.0)
+                    continue
+
+                print(f"[{item.name}] started")
+                running[pool.submit(timed, item.target, item.args)] = item.name
+
+            if (len(running) == 0):
+                if (len(results) == settled):
+                    # Nothing could start and nothing is running, the rest wait on each other
+                    raise ValueError("Stages have circular dependencies")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = ("ran", future.result())
+                    print(f"[{name}] finished in {results[name][1]:.2f}s")
+                except Exception as e:
+                    results[name] = ("failed", 0.0)
+                    print(f"[{name}] failed: {e}")
+
+    return results
+
+def print_summary(stages: list[stage], results: dict, total_seconds: float) -> None:
+    """
+    Prints the per stage timing summary.
+
+    Args:
+        stages: list[stage] - the stages of the pipeline in declaration order
+        results: dict - the output of run_stages
+        total_seconds: float - the wall clock time of the whole run
+
+    Return:
+        None
+    """
+    width = max(len(item.name) for item in stages)
+    print()
+    print(f"{'stage'.ljust(width)}  {'status'.ljust(8)}  {'seconds':>7}")
+    for item in stages:
+        status, seconds = results[item.name]
+        print(f"{item.name.ljust(width)}  {status.ljust(8)}  {seconds:7.2f}")
+    print(f"{'total'.ljust(width)}  {''.ljust(8)}  {total_seconds:7.2f}")
+
+def build_stages(args: argparse.Namespace) -> list[stage]:
+    """
+    Builds the standard meter, building, regression pipeline from the command line arguments.
+
+    Args:
+        args: argparse.Namespace - the parsed command line arguments
+
+    Return:
+        list[stage] (the pipeline stages)
+    """
+    # Only the reports regression always writes, the change point models and the load forecast
+    # are skipped when there is too little data and would keep the stage from ever being up to date
+    reports = [
+        os.path.join(args.output_dir, "energyPerformance.csv"),
+        os.path.join(args.output_dir, "weatherPerformance.csv"),
+        os.path.join(args.output_dir, "peakDemand.csv"),
+        os.path.join(args.output_dir, "monthlyPeaks.csv"),
+        os.path.join(args.output_dir, "energySketch.npz"),
+        os.path.join(args.output_dir, "energyRollup.csv"),
+        os.path.join(args.output_dir, "weatherCorrelation.csv")
+    ]
+
+    return [
+        stage("meters", run_meter_conversion, (args.meter_input, args.meter_output), [args.meter_input], [args.meter_output]),
+        stage("buildings", run_building_conversion, (args.building_input, args.building_output), [args.building_input], [args.building_output]),
+        stage(
+            "regression",
+            run_regression,
+            (args.meter_output, args.building_output, args.output_dir),
+            [args.meter_output, args.building_output],
+            reports,
+            depends=["meters", "buildings"]
+        )
+    ]
+
+if __name__ == "__main__":
+    """
+    Runs the full pipeline from the command line.
+
+    Description.
+
+    Args:
+        None
+
+    Return:
+        None (exits with status 1 when a stage failed)
+    """
+    parser = argparse.ArgumentParser(description="Runs meter conversion, building conversion and regression")
+    parser.add_argument("meter_input", help="raw meter csv file")
+    parser.add_argument("building_input", help="raw building csv file")
+    parser.add_argument("--meter-output", default="meters-converted.csv")
+    parser.add_argument("--building-output", default="buildings-converted.csv")
+    parser.add_argument("--output-dir", default=".", help="folder for the regression reports")
+    parser.add_argument("--jobs", type=int, default=2, help="number of worker processes")
+    parser.add_argument("--force", action="store_true", help="run stages even when up to date")
+    args = parser.parse_args()
+
+    stages = build_stages(args)
+    started = time.perf_counter()
+    results = run_stages(stages, args.jobs, args.force)
+    print_summary(stages, results, time.perf_counter() - started)
+
+    if (any(status in ["failed", "blocked"] for status, _ in results.values())):
+        sys.exit(1)
@@ -0,0 +1,225 @@
+"""
+File: quantiles.py
+Author: Ben Miller
+Brief: Approximate per building quantiles of energy per sqft from mergeable sketches, so p5,
+       p50 and p95 can be reported without holding the readings in memory.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import regression as rg
+import spatial
+
+# Values at or below this land in the lowest bucket, energy per sqft is always positive
+MIN_VALUE = 1e-12
+
+"""
+Brief: Relative error quantile sketch per building (logarithmic buckets, as in DDSketch). Every
+       value is counted in the bucket gamma**(k-1) < value <= gamma**k, so any quantile is
+       returned within relative_accuracy of a true value. Only the non empty (location, bucket)
+       counts are stored, and two sketches merge by adding their counts, which makes chunked
+       and parallel sketching give exactly the same result as one pass.
+"""
+class quantile_sketch:
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        """
+        Creates an empty sketch.
+
+        Args:
+            relative_accuracy: float - the relative error of every returned quantile
+
+        Return:
+            None (quantile_sketch is instantiated)
+        """
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        # (location, bucket) -> count, only non empty buckets
+        self.counts = pd.Series(dtype=np.int64, index=pd.MultiIndex.from_arrays([[], []], names=["location", "bucket"]))
+
+    def add(self, locations: pd.Series, values: pd.Series) -> None:
+        """
+        Counts values into the sketch of their building.
+
+        Args:
+            locations: pd.Series - the building of every value
+            values: pd.Series - the values
+
+        Return:
+            None
+        """
+        values = np.maximum(values.to_numpy(dtype=float), MIN_VALUE)
+        keep = np.isfinite(values)
+        buckets = np.ceil(np.log(values[keep]) / self.log_gamma).astype(np.int64)
+
+        counts = pd.DataFrame({"location": locations.to_numpy()[keep], "bucket": buckets})\
+            .groupby(["location", "bucket"]).size()
+        self.counts = self.counts.add(counts, fill_value=0).astype(np.int64)
+
+    def update(self, merged: pd.DataFrame) -> None:
+        """
+        Counts the energy per sqft of a chunk of joined meter rows.
+
+        Args:
+            merged: pd.DataFrame - rows with location and energy_per_sqft (see regression.join_energy_area)
+
+        Return:
+            None
+        """
+        self.add(merged["location"], merged["energy_per_sqft"])
+
+    def merge(self, other: "quantile_sketch") -> None:
+        """
+        Adds the counts of another sketch, for example one built by a parallel worker.
+
+        Args:
+            other: quantile_sketch - a sketch with the same relative accuracy
+
+        Return:
+            None
+        """
+        if (not np.isclose(self.gamma, other.gamma)):
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+
+        self.counts = self.counts.add(other.counts, fill_value=0).astype(np.int64)
+
+    def quantiles(self, qs: tuple[float, ...] = (0.05, 0.5, 0.95)) -> pd.DataFrame:
+        """
+        Estimates quantiles of every building at once.
+
+        Args:
+            qs: tuple[float, ...] - the quantiles in [0, 1]
+
+        Return:
+            pd.DataFrame (location, count and one p<q> column per quantile, for example p5, p50 and p95)
+        """
+        counts = self.counts.sort_index()
+        locations = counts.index.get_level_values("location").to_numpy()
+        buckets = counts.index.get_level_values("bucket").to_numpy()
+        running = counts.to_numpy().cumsum()
+
+        # Start and total of every building within the flat cumulative counts
+        first = np.flatnonzero(np.r_[True, locations[1:] != locations[:-1]])
+        totals = np.add.reduceat(counts.to_numpy(), first)
+        before = running[first] - counts.to_numpy()[first]
+
+        result = pd.DataFrame({"location": locations[first], "count": totals})
+        for q in qs:
+            # The bucket holding the value of rank q * (count - 1)
+            rank = before + np.floor(q * (totals - 1)) + 1
+            position = np.searchsorted(running, rank, side="left")
+            result[f"p{q * 100:g}"] = 2 * self.gamma ** buckets[position] / (self.gamma + 1)
+
+        return result
+
+    def save(self, path: str) -> None:
+        """
+        Persists the sketch.
+
+        Args:
+            path: str - the .npz file to write
+
+        Return:
+            None
+        """
+        np.savez_compressed(
+            path,
+            relative_accuracy=self.relative_accuracy,
+            locations=self.counts.index.get_level_values("location").to_numpy(dtype=str),
+            buckets=self.counts.index.get_level_values("bucket").to_numpy(),
+            counts=self.counts.to_numpy()
+        )
+
+def load_sketch(path: str) -> quantile_sketch:
+    """
+    Loads a sketch written by quantile_sketch.save.
+
+    Args:
+        path: str - the .npz file to read
+
+    Return:
+        quantile_sketch (the persisted sketch)
+    """
+    with np.load(path) as stored:
+        sketch = quantile_sketch(float(stored["relative_accuracy"]))
+        sketch.counts = pd.Series(
+            stored["counts"],
+            index=pd.MultiIndex.from_arrays([stored["locations"].astype(object), stored["buckets"]], names=["location", "bucket"])
+        )
+
+    return sketch
+
+def sketch_chunk(chunk: pd.DataFrame, area: pd.DataFrame, spatial_index: spatial.spatial_index | None, relative_accuracy: float) -> quantile_sketch:
+    """
+    Sketches one chunk of converted meter data, the unit of work of a parallel worker.
+
+    Args:
+        chunk: pd.DataFrame - converted meter rows
+        area: pd.DataFrame - the building table
+        spatial_index: spatial.spatial_index | None - resolves meters by location when given
+        relative_accuracy: float - the relative error of the sketch
+
+    Return:
+        quantile_sketch (the sketch of the chunk)
+    """
+    sketch = quantile_sketch(relative_accuracy)
+    sketch.update(rg.join_energy_area(chunk, area, spatial_index))
+    return sketch
+
+def sketch_file(meter_file: str, area: pd.DataFrame, spatial_index: spatial.spatial_index | None = None, relative_accuracy: float = 0.01, jobs: int = 1, chunksize: int = 500_000) -> quantile_sketch:
+    """
+    Sketches a converted meter csv file chunk by chunk, optionally in parallel worker processes.
+
+    At most two chunks per worker are in flight, so memory stays bounded by the chunk size.
+
+    Args:
+        meter_file: str - the converted meter csv file
+        area: pd.DataFrame - the building table
+        spatial_index: spatial.spatial_index | None - resolves meters by location when given
+        relative_accuracy: float - the relative error of the sketch
+        jobs: int - the number of worker processes, 1 sketches in this process
+        chunksize: int - the number of rows read per chunk
+
+    Return:
+        quantile_sketch (the merged sketch of the whole file)
+    """
+    sketch = quantile_sketch(relative_accuracy)
+    chunks = pd.read_csv(meter_file, chunksize=chunksize)
+
+    if (jobs <= 1):
+        for chunk in chunks:
+            sketch.merge(sketch_chunk(chunk, area, spatial_index, relative_accuracy))
+        return sketch
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        running = []
+        for chunk in chunks:
+            running.append(pool.submit(sketch_chunk, chunk, area, spatial_index, relative_accuracy))
+            if (len(running) >= 2 * jobs):
+                sketch.merge(running.pop(0).result())
+        for future in running:
+            sketch.merge(future.result())
+
+    return sketch
+
+if __name__ == '__main__':
+    """
+    Simple test cases for quantiles are executed because of Debugging purposes.
+
+    Description.
+
+    Args:
+        None
+
+    Return:
+        None (test cases are executed)
+    """
+    buildings = pd.read_csv("buildings.csv")
+    energy_sketch = sketch_file("output.csv", buildings, jobs=2)
+    energy_sketch.save("energySketch.npz")
+    print(load_sketch("energySketch.npz").quantiles())
@@ -8,19 +8,281 @@ Date: 02-2026
 Copyright: Copyright (c) 2026
 """
 
-import matplotlib.pyplot as plt 
+import os
 import numpy as np
 import pandas as pd
 import requestClass
-import requests
 import time
+import charts
+import weather as wt
+import spatial
+import backend as qb
+import changepoint as cp
+import peaks as pk
+import forecast as fc
+import quantiles as qs
+import rollup as ru
+import correlation as cr
+import sampling as sm
+
+# Humidity weight of the weather load, used until the change point models fit one
+ALPHA = 15
+# Hours with a weather load at or below this are too mild to normalize by
+WEATHER_LOAD_CUTOFF = 30
+
+def join_energy_area(energy: pd.DataFrame, area: pd.DataFrame, spatial_index: spatial.spatial_index | None = None) -> pd.DataFrame:
+    """
+    Joins converted meter data with the building table and computes the energy per sqft of every reading.
+
+    Both tables get a normalized location column. Meters whose site name matches no building
+    are resolved by their coordinates when a spatial index is given and the meter data has them.
+
+    Args:
+        energy: pd.DataFrame - converted meter data (sitename, readingvalue, readingtime)
+        area: pd.DataFrame - the building table (buildingname, grossarea)
+        spatial_index: spatial.spatial_index | None - the index over the building table
+
+    Return:
+        pd.DataFrame (the readings with location, grossarea, energy_per_sqft, time and minutely_15 (the hour))
+    """
+    energy['location'] = energy['sitename'].str.lower().str.strip()
+    area['location'] = area['buildingname'].str.lower().str.strip()
+
+    if (spatial_index is not None and "latitude" in energy.columns and "longitude" in energy.columns):
+        # Meters whose site name matches no building but that carry a location
+        energy['location'] = spatial.resolve_locations(energy, spatial_index, area['location'])
+
+    merged = energy.merge(
+        area[['location', 'grossarea']],
+        on='location',
+        how='inner'
+    )
+
+
+    merged['energy_per_sqft'] = merged['readingvalue'] / merged['grossarea']
+    merged = merged[merged['readingvalue'] > 0].copy()
+
+    merged["time"] = pd.to_datetime(merged["readingtime"])
+    merged["minutely_15"] = merged["time"].dt.floor("h")
+
+    return merged
+
+def energy_stats(merged: pd.DataFrame) -> pd.DataFrame:
+    """
+    Computes the per building energy per sqft statistics.
+
+    Description.
+
+    Args:
+        merged: pd.DataFrame - the output of join_energy_area
+
+    Return:
+        pd.DataFrame (location, best, worst, variance and total energy per sqft)
+    """
+    return merged.groupby('location')['energy_per_sqft'].agg(
+        best_energy_per_sqft='min',
+        worst_energy_per_sqft='max',
+        variance_energy_per_sqft='var',
+        total_energy_per_sqft='sum'
+    ).reset_index()
+
+def rollup_stats(cube: "ru.rollup_cube", area: pd.DataFrame) -> pd.DataFrame:
+    """
+    Computes the per building energy per sqft statistics of energy_stats from the building
+    partials of a rollup cube, so the readings do not have to be aggregated a second time.
+
+    Every reading of a building is divided by the same gross area, so its minimum, maximum and
+    total are divided by the area and its variance by the area squared.
+
+    Args:
+        cube: ru.rollup_cube - the cube of the joined readings (see join_energy_area)
+        area: pd.DataFrame - the building table with its location column
+
+    Return:
+        pd.DataFrame (location, best, worst, variance and total energy per sqft)
+    """
+    buildings = cube.view("location", by_utility=False, by_period=False)\
+        .merge(area[["location", "grossarea"]].drop_duplicates("location"), on="location", how="inner")
+
+    return pd.DataFrame({
+        "location": buildings["location"],
+        "best_energy_per_sqft": buildings["minimum"] / buildings["grossarea"],
+        "worst_energy_per_sqft": buildings["maximum"] / buildings["grossarea"],
+        "variance_energy_per_sqft": buildings["variance"] / buildings["grossarea"] ** 2,
+        "total_energy_per_sqft": buildings["energy"] / buildings["grossarea"]
+    })
+
+"""
+Brief: The full resolution energy of every building, the readings of all its meters summed per
+       reading time. Filled chunk by chunk from the regression's single pass over the meter data,
+       so the per-building time series view never reads the meter file again.
+"""
+class building_series:
+    def __init__(self) -> None:
+        """
+        Creates an empty store.
+
+        Args:
+            None
+
+        Return:
+            None (building_series is instantiated)
+        """
+        self.parts = []
+        self.series = None
+
+    def update(self, merged: pd.DataFrame) -> None:
+        """
+        Adds a chunk of joined meter rows.
+
+        Args:
+            merged: pd.DataFrame - rows with location, time and energy_per_sqft (see join_energy_area)
+
+        Return:
+            None
+        """
+        self.parts.append(merged.groupby(["location", "time"])["energy_per_sqft"].sum())
+
+    def combine(self) -> None:
+        """
+        Adds the chunks together into one series, so that get only has to look a building up.
+
+        Args:
+            None
+
+        Return:
+            None
+        """
+        if (len(self.parts) > 0):
+            # A reading time split over two chunks is added back together
+            self.series = pd.concat(([self.series] if self.series is not None else []) + self.parts)\
+                .groupby(level=["location", "time"]).sum()
+            self.parts = []
+
+    def get(self, location: str) -> pd.Series:
+        """
+        Returns the energy series of one building.
+
+        Args:
+            location: str - the normalized building name
+
+        Return:
+            pd.Series (the energy per sqft indexed by time)
+        """
+        self.combine()
+
+        if (self.series is None or location not in self.series.index.get_level_values("location")):
+            return pd.Series(dtype=float, index=pd.DatetimeIndex([], name="time"), name="energy_per_sqft")
+
+        return self.series.xs(location, level="location")
+
+def hourly_energy(merged: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sums the energy per sqft of every building per hour.
+
+    Description.
+
+    Args:
+        merged: pd.DataFrame - the output of join_energy_area
+
+    Return:
+        pd.DataFrame (location, minutely_15 (the hour) and energy_per_sqft)
+    """
+    return (
+        merged
+        .groupby(["location", "minutely_15"])
+        .agg(energy_per_sqft=("energy_per_sqft", "sum"))
+        .reset_index()
+    )
+
+def hourly_weather(weather: pd.DataFrame) -> pd.DataFrame:
+    """
+    Averages the 15 minute weather of every weather cell per hour.
+
+    Weather arrives every 15 minutes, averaging it down to the hourly energy bucket means
+    every energy row joins exactly one weather row instead of fanning out to four.
+
+    Args:
+        weather: pd.DataFrame - the 15 minute weather of every cell (see weather.weather_for_buildings)
+
+    Return:
+        pd.DataFrame (cell_y, cell_x, minutely_15 (the hour), apparent_temp and humidity)
+    """
+    weather["minutely_15"] = weather["time"].dt.floor("h")
+    weather["minutely_15"] = weather["minutely_15"].dt.tz_localize(None)
+
+    return (
+        weather
+        .groupby(["cell_y", "cell_x", "minutely_15"])
+        .agg(apparent_temp=("apparent_temp", "mean"), humidity=("humidity", "mean"))
+        .reset_index()
+    )
+
+def join_weather(energy_hourly: pd.DataFrame, building_cells: pd.DataFrame, weather_hourly: pd.DataFrame, alpha: float = ALPHA) -> pd.DataFrame:
+    """
+    Joins the hourly energy per sqft of every building with the weather of its weather cell.
+
+    Readings below the weather load cutoff are dropped and the energy is normalized by the
+    weather load.
+
+    Args:
+        energy_hourly: pd.DataFrame - the output of hourly_energy
+        building_cells: pd.DataFrame - location -> cell_y, cell_x (see weather.weather_for_buildings)
+        weather_hourly: pd.DataFrame - the output of hourly_weather
+        alpha: float - the humidity weight of the weather load, the fitted change_point_model.alpha when there is one
+
+    Return:
+        pd.DataFrame (location, minutely_15 (the hour), energy_per_sqft, apparent_temp, humidity,
+                      weather_load and energy_weather_norm)
+    """
+    energy_weather = pd.merge(
+        energy_hourly.merge(building_cells, on="location", how="inner"),
+        weather_hourly,
+        on=["cell_y", "cell_x", "minutely_15"],
+        how="inner",
+        validate="many_to_one"
+    )
+
+    energy_weather["weather_load"] = (
+        energy_weather["apparent_temp"] +
+        alpha * (energy_weather["humidity"] / 100)
+    )
+
+    energy_weather = energy_weather[energy_weather["weather_load"] > WEATHER_LOAD_CUTOFF].copy()
+
+    energy_weather["energy_weather_norm"] = (
+        energy_weather["energy_per_sqft"] /
+        energy_weather["weather_load"]
+    )
+
+    return energy_weather
+
+def weather_stats(energy_weather: pd.DataFrame) -> pd.DataFrame:
+    """
+    Computes the per building weather normalized energy statistics.
+
+    Description.
+
+    Args:
+        energy_weather: pd.DataFrame - the output of join_weather
+
+    Return:
+        pd.DataFrame (location, best, worst and variance of the weather normalized energy)
+    """
+    return energy_weather.groupby("location")[
+        "energy_weather_norm"
+    ].agg(
+        best="min",
+        worst="max",
+        variance="var"
+    ).reset_index()
 
 """
 Brief: Regression class to execute main functionality of graph generation, 
        data processing, and database management.
 """
 class regression:
-    def __init__(self, degree: int, x: str, y: str, title: str = "Sample Graph") -> None:
+    def __init__(self, degree: int, x: str, y: str, title: str = "Sample Graph", backend: str = "auto", hierarchy: str | None = None, sample_fraction: float | None = None, report_dir: str | None = None) -> None:
         """
         Creates the regression class.
 
@@ -32,14 +294,27 @@ class regression:
             x: str - the string file path for the x-axis to be represented by
             y: str - the string file path for the y-axis to be represented by
             title: str - the title for the graph to be genereated
+            backend: str - the query backend for the energy and weather stages (see backend.get_backend)
+            hierarchy: str | None - the building hierarchy csv for the rollups (see rollup.load_hierarchy)
+            sample_fraction: float | None - runs a preview on a stratified sample of this fraction of the
+                                            meter data (see sampling.sample_mask), None runs on all of it
+            report_dir: str | None - the folder the reports are written to, the working directory for a
+                                     full run and preview for a preview when None
         
         Return:
             None (regression is instantiated)
         """
         self.degree = degree
-        self.csv_file_x = pd.read_csv(x)
-        self.csv_file_y = pd.read_csv(y)
+        # Only the headers are needed to tell the files apart, the backend reads the meter data itself
+        self.csv_file_x = pd.read_csv(x, nrows=0)
+        self.csv_file_y = pd.read_csv(y, nrows=0)
         self.title = title
+        self.backend = qb.get_backend(backend)
+        self.sampleFraction = sample_fraction
+        self.preview = sample_fraction is not None
+        # A preview never overwrites the reports of a full run
+        self.reportDir = report_dir if report_dir is not None else ("preview" if self.preview else ".")
+        os.makedirs(self.reportDir, exist_ok=True)
 
         if (
             "grossarea" in self.csv_file_x.columns and "readingvalue" in self.csv_file_y.columns or
@@ -49,28 +324,45 @@ class regression:
             # Y axis is power consumption
             
             
-            energy = self.csv_file_x
-            area = self.csv_file_y
-
-            energy['location'] = energy['sitename'].str.lower().str.strip()
+            self.energy_file = x if "readingvalue" in self.csv_file_x.columns else y
+            area = pd.read_csv(y if self.energy_file == x else x)
             area['location'] = area['buildingname'].str.lower().str.strip()
-
-            merged = energy.merge(
-                area[['location', 'grossarea']],
-                on='location',
-                how='inner'
+            self.spatialIndex = spatial.spatial_index(area)
+            if (self.preview):
+                self.energy_file, population = sm.stratified_sample(self.energy_file, area, sample_fraction, spatial_index=self.spatialIndex)
+            # One streamed pass over the meter file for the hourly energy, the billing peaks, the
+            # quantile sketch, the rollups and the per-building time series
+            # The converter writes the meters one after another, closed intervals keep their totals
+            # for the whole run so the later meters of a building merge into them exactly
+            self.peaks = pk.peak_demand(retention=None)
+            self.sketch = qs.quantile_sketch()
+            self.rollup = ru.rollup_cube(ru.load_hierarchy(hierarchy) if hierarchy is not None else None, freq="M")
+            self.series = building_series()
+            energy_hourly, (first_time, last_time) = self.backend.energy_stage(
+                self.energy_file,
+                area,
+                self.spatialIndex,
+                [self.peaks, self.sketch, self.rollup, self.series]
             )
-
-
-            merged['energy_per_sqft'] = merged['readingvalue'] / merged['grossarea']
-            merged = merged[merged['readingvalue'] > 0]
-
-            stats = merged.groupby('location')['energy_per_sqft'].agg(
-                best_energy_per_sqft='min',
-                worst_energy_per_sqft='max',
-                variance_energy_per_sqft='var'
-            ).reset_index()
-
+            self.peaks.flush()
+            # Combined here, on the worker thread, so picking a building in the GUI is only a lookup
+            self.series.combine()
+            if (self.preview):
+                self.rollup.scale(sm.scale_factors(energy_hourly, sample_fraction, population))
+            self.sketch.save(self.report_path("energySketch.npz"))
+            self.rollup.cube().to_csv(self.report_path("energyRollup.csv"), index=False)
+
+            # The building statistics come from the building partials of the cube
+            stats = rollup_stats(self.rollup, area)
+            if (self.preview):
+                # The sample sums only cover the sampled hours, the totals are estimated with their error bounds
+                self.previewBounds = sm.estimate_totals(energy_hourly, sample_fraction, population)
+                stats = stats.drop(columns="total_energy_per_sqft")\
+                    .merge(self.previewBounds.drop(columns="n_hours"), on="location", how="left")
+
+            # Percentiles are not decided by single outlier readings like best and worst are
+            stats = stats.merge(self.sketch.quantiles().drop(columns="count"), on="location", how="left")
+            stats["p50_percentile"] = stats["p50"].rank(pct=True) * 100
 
             top_n = 10
             worst_buildings = stats.sort_values(
@@ -82,7 +374,7 @@ class regression:
                 ascending=False
             )
 
-            pd.concat([best_buildings.head(top_n), worst_buildings]).to_csv("energyPerformance.csv")
+            pd.concat([best_buildings.head(top_n), worst_buildings]).to_csv(self.report_path("energyPerformance.csv"))
 
             # Sort ascending and get top row
             worst_building = stats.sort_values(by='worst_energy_per_sqft', ascending=False).iloc[0]
@@ -95,114 +387,134 @@ class regression:
             ).iloc[0]
             self.bestEnergyCandidate = best_building
 
-            x = np.arange(len(worst_buildings))
-            w = 0.4
-
-            plt.figure()
-            plt.bar(x - w/2, worst_buildings['worst_energy_per_sqft'], w, label='Worst')
-            plt.bar(x + w/2, worst_buildings['best_energy_per_sqft'], w, label='Best')
-
-            plt.xticks(x, worst_buildings['location'], rotation=45, ha='right')
-            plt.yscale('log')
-            plt.ylabel("Energy (kJ / sqft)")
-            plt.title("Best vs Worst Energy per Sqft (Top 10)")
-            plt.legend()
-            plt.tight_layout()
-            plt.show()
-
-            campus_lat = area["latitude"].mean()
-            campus_lon = area["longitude"].mean()
-
-            url = "https://historical-forecast-api.open-meteo.com/v1/forecast"
-
-            params = {
-                "latitude": campus_lat,
-                "longitude": campus_lon,
-                "start_date": pd.to_datetime(merged["readingtime"]).min().strftime('%Y-%m-%d'),
-                "end_date": pd.to_datetime(merged["readingtime"]).max().strftime('%Y-%m-%d'), # "2026-02-20"
-                "minutely_15": [
-                    "temperature_2m",
-                    "relative_humidity_2m",
-                    "apparent_temperature"
-                ],
-                "temperature_unit": "fahrenheit",
-                "precipitation_unit": "inch"
-            }
-
-            response = requests.get(url, params=params)
-            data = response.json()
-
-            weather = pd.DataFrame({
-                "time": pd.to_datetime(data["minutely_15"]["time"]),
-                "apparent_temp": data["minutely_15"]["apparent_temperature"],
-                "humidity": data["minutely_15"]["relative_humidity_2m"],
-            })
-
-            weather["minutely_15"] = weather["time"].dt.floor("h")
-            weather["minutely_15"] = weather["minutely_15"].dt.tz_localize(None)
-            
-            merged["time"] = pd.to_datetime(merged["readingtime"])
-            merged["minutely_15"] = merged["time"].dt.floor("h")
-
-
-            energy_hourly = (
-                merged
-                .groupby(["location", "minutely_15"])
-                .agg(energy_per_sqft=("energy_per_sqft", "sum"))
-                .reset_index()
-            )
-
-            energy_weather = pd.merge(
-                energy_hourly,
-                weather[["minutely_15", "apparent_temp", "humidity"]],
-                on="minutely_15",
-                how="inner"
-            )
-
-            ALPHA = 15
-
-            energy_weather["weather_load"] = (
-                energy_weather["apparent_temp"] +
-                ALPHA * (energy_weather["humidity"] / 100)
+            self.energyFigure = charts.bar_figure(
+                worst_buildings['location'],
+                worst_buildings['worst_energy_per_sqft'],
+                worst_buildings['best_energy_per_sqft'],
+                "Energy (kJ / sqft)",
+                "Best vs Worst Energy per Sqft (Top 10)"
             )
 
-            energy_weather = energy_weather[energy_weather["weather_load"] > 30]
-
-            energy_weather["energy_weather_norm"] = (
-                energy_weather["energy_per_sqft"] /
-                energy_weather["weather_load"]
+            building_cells, weather = wt.weather_for_buildings(
+                area,
+                first_time.strftime('%Y-%m-%d'),
+                last_time.strftime('%Y-%m-%d')
             )
 
-            stats_weather = energy_weather.groupby("location")[
-                "energy_weather_norm"
-            ].agg(
-                best="min",
-                worst="max",
-                variance="var"
-            ).reset_index()
+            weather_hourly = hourly_weather(weather.copy())
+
+            # Heating / cooling change point models, with the humidity weight of the weather load fitted too
+            self.changePoint = cp.change_point_model()
+            try:
+                self.changePointModels = self.changePoint.fit(cp.daily_energy_weather(energy_hourly, building_cells, weather_hourly))
+                self.changePointModels.to_csv(self.report_path("changePointModels.csv"))
+                self.fittedAlpha = self.changePoint.alpha
+            except ValueError as e:
+                print(f"Skipping change point models: {e}")
+                self.changePointModels = None
+                self.fittedAlpha = None
+
+            # The weather load is normalized with the fitted humidity weight, not the default one
+            alpha = self.fittedAlpha if (self.fittedAlpha is not None) else ALPHA
+            energy_weather, stats_weather = self.backend.weather_stage(energy_hourly, building_cells, weather_hourly, alpha)
             
             top = stats_weather.sort_values("worst", ascending=False).head(10)
             bottom = stats_weather.sort_values("best", ascending=True).head(10)
 
-            pd.concat([top, bottom]).to_csv("weatherPerformance.csv")
+            pd.concat([top, bottom]).to_csv(self.report_path("weatherPerformance.csv"))
 
             self.worstWeatherCandidate = stats_weather.sort_values("worst", ascending=False).iloc[0]
             self.bestWeatherCandidate = stats_weather.sort_values("best", ascending=True).iloc[0]
 
-            x = np.arange(len(top))
-            w = 0.4
-
-            plt.figure()
-            plt.bar(x - w/2, top["worst"], w, label="Worst")
-            plt.bar(x + w/2, top["best"], w, label="Best")
+            self.weatherFigure = charts.bar_figure(
+                top["location"],
+                top["worst"],
+                top["best"],
+                "Energy / Weather Load",
+                "Weather-Normalized Energy per Sqft (Campus)"
+            )
 
-            plt.xticks(x, top["location"], rotation=45, ha="right")
-            plt.yscale("log")
-            plt.ylabel("Energy / Weather Load")
-            plt.title("Weather-Normalized Energy per Sqft (Campus)")
-            plt.legend()
-            plt.tight_layout()
-            plt.show()
+            self.peakDemand = self.peaks.summary()
+            self.monthlyPeaks = self.peaks.monthly_peaks()
+            self.peakDemand.sort_values("peak_kw", ascending=False).to_csv(self.report_path("peakDemand.csv"))
+            self.monthlyPeaks.to_csv(self.report_path("monthlyPeaks.csv"))
+
+            # Next day hourly load, scored by a rolling backtest over the last week
+            self.forecaster = fc.load_forecaster()
+            self.forecastBacktest = None
+            self.loadForecast = None
+            # The lagged features need consecutive hours, which a sample does not have
+            if (self.preview):
+                print("Skipping load forecast: not available in preview")
+            else:
+                try:
+                    self.forecastBacktest = self.forecaster.backtest(energy_hourly, building_cells, weather_hourly)
+                    self.loadForecast = self.forecaster.predict_next_day()
+                    self.forecastBacktest.to_csv(self.report_path("forecastBacktest.csv"))
+                    self.loadForecast.to_csv(self.report_path("loadForecast.csv"))
+                except ValueError as e:
+                    print(f"Skipping load forecast: {e}")
+
+            # Thermal lag, how many hours the energy of every building trails the weather
+            self.weatherCorrelation, self.weatherCorrelationCurves = cr.lagged_correlation(energy_hourly, building_cells, weather_hourly)
+            self.weatherCorrelation.to_csv(self.report_path("weatherCorrelation.csv"))
+
+            self.area = area
+            self.stats = stats
+            self.weather = weather
+            self.building_cells = building_cells
+            self.locations = sorted(stats["location"].unique())
 
         else:
             raise RuntimeError("Unable to understand arrays in terms of the x axis and y axis")   
+
+    def report_path(self, name: str) -> str:
+        """
+        Returns where a report is written.
+
+        Description.
+
+        Args:
+            name: str - the file name of the report
+
+        Return:
+            str (the path of the report within self.reportDir)
+        """
+        return os.path.join(self.reportDir, name)
+
+    def building_time_series(self, location: str) -> tuple[pd.Series, pd.Series]:
+        """
+        Returns the full resolution energy and weather series for a single building.
+
+        The energy readings of every meter at the building are summed per reading time,
+        the weather is the native 15 minute apparent temperature of the building's weather cell.
+
+        Args:
+            location: str - the normalized building name (see self.locations)
+
+        Return:
+            tuple[pd.Series, pd.Series] (the energy per sqft and apparent temperature series indexed by time)
+        """
+        energy = self.series.get(location).rename("Energy (kJ / sqft)")
+
+        cell = self.building_cells[self.building_cells["location"] == location].iloc[0]
+        weather = self.weather[(self.weather["cell_y"] == cell["cell_y"]) & (self.weather["cell_x"] == cell["cell_x"])]
+        weather = weather.set_index(weather["time"].dt.tz_localize(None))["apparent_temp"]
+        weather = weather.rename("Apparent Temperature (F)")
+
+        return energy, weather
+
+    def better_neighbours(self, location: str, radius_meters: float = 500.0) -> pd.DataFrame:
+        """
+        Lists the buildings near a building that use less energy per sqft over the whole period.
+
+        Description.
+
+        Args:
+            location: str - the normalized building name (see self.locations)
+            radius_meters: float - the neighbourhood radius in meters
+
+        Return:
+            pd.DataFrame (location, distance and total_energy_per_sqft of every better neighbour)
+        """
+        return spatial.better_neighbours(self.spatialIndex, self.area, self.stats, location, radius_meters)
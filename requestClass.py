@@ -1,9 +1,8 @@
 """
 File: requestClass.py
 Author: Ben Miller
-Brief: Handles API output and JSON parsing. 
-       Currently dead due to time constraints and inability to attain API keys, could've done
-       it within regression.py for weather amenities.
+Brief: Handles API output and JSON parsing. Building records are queried page by page
+       over a pooled session and land in the same building table the converter produces.
 Version: 0.1
 Date: 02-2026
 
@@ -11,23 +10,290 @@ Copyright: Copyright (c) 2026
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import matplotlib.pyplot as plt
 import convert
 import json
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
 
-def query_api(url: str) -> None:
+# Where the records of a page are found when the API wraps them in an object
+PAGE_RECORD_KEYS = ["items", "results", "data", "buildings"]
+
+def page_records(body: list | dict) -> list[dict]:
     """
-    Queries the API to receive more information about OSU floors and other criteria.
+    Extracts the records of one page, pages are either a plain list of records or an
+    object holding them under one of PAGE_RECORD_KEYS.
 
     Description.
 
+    Args:
+        body: list | dict - the decoded JSON of a page
+    
+    Return:
+        list[dict] (the records of the page)
+    """
+    if (isinstance(body, list)):
+        return body
+
+    for key in PAGE_RECORD_KEYS:
+        if key in body:
+            return body[key]
+
+    raise ValueError(f"Page holds no records, expected a list or one of {PAGE_RECORD_KEYS}")
+
+def page_count(body: list | dict, page_size: int) -> int | None:
+    """
+    Reads the number of pages from a page, when the API reports it.
+
+    Description.
+
+    Args:
+        body: list | dict - the decoded JSON of a page
+        page_size: int - the number of records requested per page
+    
+    Return:
+        int | None (the number of pages, None when unknown)
+    """
+    if (not isinstance(body, dict)):
+        return None
+
+    for key in ["total_pages", "pages"]:
+        if key in body:
+            return int(body[key])
+    for key in ["total", "count"]:
+        if key in body:
+            return -(-int(body[key]) // page_size)
+
+    return None
+
+def records_table(records: list[dict]) -> pd.DataFrame:
+    """
+    Turns API records into the building table of convert.building_table, the API field
+    names are matched case insensitively (buildingName -> buildingname).
+
+    Description.
+
+    Args:
+        records: list[dict] - the records of one or more pages
+    
+    Return:
+        pd.DataFrame (buildingname, grossarea, latitude and longitude)
+    """
+    data = pd.DataFrame([{key.lower(): value for key, value in record.items()} for record in records])
+    if (len(data) == 0):
+        return pd.DataFrame(columns=convert.BUILDING_COLUMNS)
+
+    for col in convert.BUILDING_COLUMNS:
+        if col not in data.columns:
+            raise ValueError(f"Missing required column: {col}")
+
+    return convert.building_table(data)
+
+"""
+Brief: Paginated client for the building API. Pages are fetched concurrently over one pooled
+       session, and every page is cached on disk with its ETag and Last-Modified validators, so
+       refreshing only downloads the pages that changed (unchanged pages come back as 304).
+"""
+class api_client:
+    def __init__(self, url: str, page_size: int = 100, workers: int = 8, cache_dir: str | None = ".api_cache", timeout: float = 30.0) -> None:
+        """
+        Creates the client and its connection pool.
+
+        Description.
+
+        Args:
+            url: str - the url of the paginated building records, queried with page and per_page
+            page_size: int - the number of records requested per page
+            workers: int - the number of pages fetched at once, also the size of the connection pool
+            cache_dir: str | None - the folder pages are cached in, None disables conditional requests
+            timeout: float - seconds before a single request is given up
+        
+        Return:
+            None (api_client is instantiated)
+        """
+        self.url = url
+        self.page_size = page_size
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        retries = Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.lock = threading.Lock()
+        self.fetched_pages = 0
+        self.cached_pages = 0
+
+    def close(self) -> None:
+        """
+        Closes the pooled connections.
+
+        Description.
+
+        Args:
+            None
+        
+        Return:
+            None
+        """
+        self.session.close()
+
+    def cache_path(self, page: int) -> str:
+        """
+        Returns the cache file of one page of this url and page size.
+
+        Description.
+
+        Args:
+            page: int - the page number
+        
+        Return:
+            str (the path of the cached page)
+        """
+        key = hashlib.sha1(f"{self.url}|{self.page_size}|{page}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get_page(self, page: int, missing_ok: bool = False) -> list | dict:
+        """
+        Fetches one page, revalidating the cached copy when there is one.
+
+        Description.
+
+        Args:
+            page: int - the page number, starting at 1
+            missing_ok: bool - return an empty page instead of raising when the page is not found (404)
+        
+        Return:
+            list | dict (the decoded JSON of the page)
+        """
+        cached = None
+        headers = {}
+        if (self.cache_dir is not None and os.path.exists(self.cache_path(page))):
+            with open(self.cache_path(page), 'r') as file:
+                cached = json.load(file)
+            if (cached["etag"] is not None):
+                headers["If-None-Match"] = cached["etag"]
+            if (cached["last_modified"] is not None):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self.session.get(self.url, params={"page": page, "per_page": self.page_size}, headers=headers, timeout=self.timeout)
+
+        if (response.status_code == 304 and cached is not None):
+            with self.lock:
+                self.cached_pages += 1
+            return cached["body"]
+        if (response.status_code == 304):
+            # Not modified but nothing cached to return, the body is empty so the page is fetched again unconditionally
+            response = self.session.get(self.url, params={"page": page, "per_page": self.page_size}, timeout=self.timeout)
+
+        if (response.status_code == 404 and missing_ok):
+            return []
+        response.raise_for_status()
+        body = response.json()
+        with self.lock:
+            self.fetched_pages += 1
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if (self.cache_dir is not None and (etag is not None or last_modified is not None)):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Written aside and renamed, so a page is never read half written
+            partial = f"{self.cache_path(page)}.{threading.get_ident()}.tmp"
+            with open(partial, 'w') as file:
+                json.dump({"etag": etag, "last_modified": last_modified, "body": body}, file)
+            os.replace(partial, self.cache_path(page))
+
+        return body
+
+    def pages(self):
+        """
+        Yields the records of every page in page order while the following pages are fetched.
+
+        When the API reports the number of pages they are all requested at once, otherwise
+        pages are requested workers at a time until one comes back short. Those batches can
+        run past the last page, so a page that is not found (404) counts as an empty one.
+
+        Args:
+            None
+        
+        Return:
+            Iterator[list[dict]] (the records of every page)
+        """
+        first = self.get_page(1)
+        records = page_records(first)
+        yield records
+
+        total = page_count(first, self.page_size)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            if (total is not None):
+                for body in pool.map(self.get_page, range(2, total + 1)):
+                    yield page_records(body)
+                return
+
+            page = 2
+            while (len(records) >= self.page_size):
+                for body in pool.map(lambda number: self.get_page(number, missing_ok=True), range(page, page + self.workers)):
+                    records = page_records(body)
+                    yield records
+                    if (len(records) < self.page_size):
+                        break
+                page += self.workers
+
+    def buildings(self, output_file: str | None = None) -> pd.DataFrame:
+        """
+        Streams every page into the building table, appending each page to the output
+        file as soon as it arrives.
+
+        Description.
+
+        Args:
+            output_file: str | None - the csv file the table is written to, None only returns it
+        
+        Return:
+            pd.DataFrame (buildingname, grossarea, latitude and longitude of every record)
+        """
+        tables = []
+        for records in self.pages():
+            table = records_table(records)
+            if (output_file is not None):
+                table.to_csv(output_file, index=False, mode="w" if len(tables) == 0 else "a", header=len(tables) == 0)
+            tables.append(table)
+
+        return pd.concat(tables, ignore_index=True)
+
+def query_api(url: str, output_file: str | None = None, page_size: int = 100, workers: int = 8, cache_dir: str | None = ".api_cache") -> pd.DataFrame:
+    """
+    Queries the API to receive more information about OSU floors and other criteria.
+
+    The records are fetched concurrently page by page (see api_client) and written as the
+    same building table convert.converter.execute_building_conversion produces.
+
     Args:
         url: str - the base url to then request from
+        output_file: str | None - the csv file the building table is written to, None only returns it
+        page_size: int - the number of records requested per page
+        workers: int - the number of pages fetched at once
+        cache_dir: str | None - the folder pages are cached in, None disables conditional requests
     
     Return:
-        None (None)
+        pd.DataFrame (the building table)
     """
-    pass
+    client = api_client(url, page_size, workers, cache_dir)
+    try:
+        return client.buildings(output_file)
+    except Exception as e:
+        print(f"Error occured in {query_api.__name__}: {e}")
+        raise RuntimeError(f"Error occured in {query_api.__name__}") from e
+    finally:
+        client.close()
 
 def parse_json(file_name: str) -> list[list]:
     """
@@ -74,3 +340,70 @@ if __name__ == "__main__":
         None (test cases are executed)
     """
     parse_json("buildingOne.json")
+
+    # Local stub of the building API, 1050 records with an ETag per page
+    import tempfile
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    stub_records = [
+        {"buildingName": f"Building {i} (Hall)", "grossArea": 1_000 + i, "latitude": 40.0 + i / 1e4, "longitude": -83.0 - i / 1e4}
+        for i in range(1050)
+    ]
+
+    class stub_handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            query = parse_qs(urlparse(self.path).query)
+            page, per_page = int(query["page"][0]), int(query["per_page"][0])
+            items = stub_records[(page - 1) * per_page:page * per_page]
+            # The /untotalled flavour reports no total and answers 404 past the last page
+            if (self.path.startswith("/untotalled")):
+                if (len(items) == 0):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = json.dumps(items).encode()
+            else:
+                body = json.dumps({"items": items, "total": len(stub_records)}).encode()
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+            if (self.headers.get("If-None-Match") == etag):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub_handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{server.server_address[1]}/buildings"
+
+    with tempfile.TemporaryDirectory() as cache:
+        for run in ["cold", "refresh"]:
+            client = api_client(stub_url, page_size=100, cache_dir=cache)
+            started = time.perf_counter()
+            table = client.buildings(os.path.join(cache, "buildings.csv"))
+            print(f"{run}: {len(table)} buildings, {client.fetched_pages} pages fetched, {client.cached_pages} unchanged in {time.perf_counter() - started:.3f}s")
+            client.close()
+
+        print(pd.read_csv(os.path.join(cache, "buildings.csv")).head())
+
+    # Without a total the last batch of pages runs past the end, 1050 and an exact 1000 records
+    for size in [1050, 1000]:
+        del stub_records[size:]
+        client = api_client(f"http://127.0.0.1:{server.server_address[1]}/untotalled", page_size=100, cache_dir=None)
+        table = client.buildings()
+        client.close()
+        assert len(table) == size, len(table)
+        print(f"untotalled: {len(table)} buildings, {client.fetched_pages} pages fetched")
+    server.shutdown()
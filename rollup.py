@@ -0,0 +1,257 @@
+"""
+File: rollup.py
+Author: Ben Miller
+Brief: Hierarchical meter -> building -> group -> campus energy rollups by utility type, built
+       in one pass from mergeable partial aggregates.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import numpy as np
+import pandas as pd
+import convert
+import regression as rg
+import spatial
+
+# The columns of a partial aggregate, all of them merge by sum except minimum and maximum
+PARTIAL_COLUMNS = ["energy", "energy_squared", "n_readings", "minimum", "maximum"]
+
+def load_hierarchy(path: str) -> pd.DataFrame:
+    """
+    Reads a hierarchy table, one row per building with one column per level above it.
+
+    The buildings are named by a buildingname column like the building file and
+    normalized the same way, every other column (group, campus, ...) is a level.
+
+    Args:
+        path: str - the hierarchy csv file
+
+    Return:
+        pd.DataFrame (location and one column per level)
+    """
+    hierarchy = pd.read_csv(path)
+    if ("buildingname" not in hierarchy.columns):
+        raise ValueError("Missing required column: buildingname")
+
+    hierarchy["location"] = hierarchy["buildingname"].str.lower().str.strip()
+    return hierarchy.drop(columns="buildingname").drop_duplicates("location")
+
+def combine(partials: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    """
+    Merges partial aggregates that share keys.
+
+    Args:
+        partials: pd.DataFrame - partial aggregates, possibly with repeated keys
+        keys: list[str] - the key columns
+
+    Return:
+        pd.DataFrame (one partial aggregate per key)
+    """
+    return partials.groupby(keys, as_index=False, observed=True).agg(
+        energy=("energy", "sum"),
+        energy_squared=("energy_squared", "sum"),
+        n_readings=("n_readings", "sum"),
+        minimum=("minimum", "min"),
+        maximum=("maximum", "max")
+    )
+
+"""
+Brief: Rollup cube over the meter hierarchy. Raw readings are only ever aggregated once, into
+       partial aggregates per meter and utility (sum, sum of squares, count, min, max), every
+       building, group and campus view is rolled up from those partials. Partials of separate
+       chunks or workers merge exactly, so the cube can be built chunked or in parallel.
+"""
+class rollup_cube:
+    def __init__(self, hierarchy: pd.DataFrame | None = None, freq: str | None = None, meter_column: str | None = None) -> None:
+        """
+        Creates an empty rollup cube.
+
+        Args:
+            hierarchy: pd.DataFrame | None - location and one column per level above the building
+                                             (see load_hierarchy), one campus level when None
+            freq: str | None - also split every aggregate by period of this pandas frequency ("M" for months)
+            meter_column: str | None - the meter identifier column, picked by convert.meter_key_column when None
+
+        Return:
+            None (rollup_cube is instantiated)
+        """
+        self.hierarchy = hierarchy if hierarchy is not None else pd.DataFrame({"location": pd.Series(dtype=object)})
+        # Without a campus level every building rolls up into one campus, listed or not
+        self.single_campus = "campus" not in self.hierarchy.columns
+        if (self.single_campus):
+            self.hierarchy = self.hierarchy.assign(campus="campus")
+
+        self.freq = freq
+        self.meter_column = meter_column
+        self.keys = ["meter", "location", "utility"] + (["period"] if freq is not None else [])
+        self.partials = pd.DataFrame(columns=self.keys + PARTIAL_COLUMNS)
+
+    @property
+    def levels(self) -> list[str]:
+        """
+        The levels of the cube from the finest to the coarsest.
+
+        Args:
+            None
+
+        Return:
+            list[str] (meter, location and the hierarchy levels)
+        """
+        return ["meter", "location"] + [column for column in self.hierarchy.columns if column != "location"]
+
+    def update(self, merged: pd.DataFrame) -> None:
+        """
+        Aggregates a chunk of joined meter rows into the leaf partials.
+
+        Data converted before the utility column existed is counted as utility "unknown".
+
+        Args:
+            merged: pd.DataFrame - rows with location and readingvalue (see regression.join_energy_area)
+
+        Return:
+            None
+        """
+        meter_column = self.meter_column if self.meter_column is not None else convert.meter_key_column(merged.columns)
+        value = merged["readingvalue"].astype(float)
+
+        leaf = pd.DataFrame({
+            "meter": merged[meter_column].to_numpy(),
+            "location": merged["location"].to_numpy(),
+            "utility": merged["utility"].fillna("unknown").to_numpy() if "utility" in merged.columns else "unknown",
+            "energy": value.to_numpy(),
+            "energy_squared": value.to_numpy() ** 2,
+            "n_readings": 1,
+            "minimum": value.to_numpy(),
+            "maximum": value.to_numpy()
+        })
+        if (self.freq is not None):
+            leaf["period"] = pd.to_datetime(merged["readingtime"]).dt.to_period(self.freq).to_numpy()
+
+        leaf = combine(leaf, self.keys)
+        self.partials = leaf if len(self.partials) == 0 else combine(pd.concat([self.partials, leaf], ignore_index=True), self.keys)
+
+    def merge(self, other: "rollup_cube") -> None:
+        """
+        Adds the partials of another cube, for example one built by a parallel worker.
+
+        Args:
+            other: rollup_cube - a cube with the same keys
+
+        Return:
+            None
+        """
+        if (other.keys != self.keys):
+            raise ValueError("Only cubes with the same keys can be merged")
+
+        if (len(self.partials) == 0):
+            self.partials = other.partials.copy()
+            return
+
+        self.partials = combine(pd.concat([self.partials, other.partials], ignore_index=True), self.keys)
+
+    def scale(self, factors: float | pd.Series) -> None:
+        """
+        Weights every partial aggregate, so a cube built from a sample estimates the totals of
+        the whole data. Minimum and maximum stay those of the sample.
+
+        Args:
+            factors: float | pd.Series - the weight of every reading, or location -> weight
+                                         (see sampling.scale_factors)
+
+        Return:
+            None
+        """
+        weight = self.partials["location"].map(factors).fillna(1.0).to_numpy() if isinstance(factors, pd.Series) else factors
+        for column in ["energy", "energy_squared", "n_readings"]:
+            self.partials[column] = self.partials[column] * weight
+
+    def view(self, level: str, by_utility: bool = True, by_period: bool = True) -> pd.DataFrame:
+        """
+        Rolls the leaf partials up to one level of the hierarchy.
+
+        Buildings missing from the hierarchy table are reported as "ungrouped".
+
+        Args:
+            level: str - one of self.levels
+            by_utility: bool - keep one row per utility, otherwise all utilities are added up (everything is kJ)
+            by_period: bool - keep one row per period when split by freq, otherwise all periods are added up
+
+        Return:
+            pd.DataFrame (the level key, utility, period when split by freq, energy, n_readings, n_meters,
+                          mean, variance, minimum and maximum of the readings)
+        """
+        if (level not in self.levels):
+            raise ValueError(f"Unknown rollup level: {level}, expected one of {self.levels}")
+
+        partials = self.partials
+        if (level not in ["meter", "location"]):
+            partials = partials.merge(self.hierarchy[["location", level]], on="location", how="left")
+            partials[level] = partials[level].fillna("campus" if level == "campus" and self.single_campus else "ungrouped")
+
+        keys = [level] + (["utility"] if by_utility else []) + (["period"] if self.freq is not None and by_period else [])
+        meters = partials.groupby(keys, observed=True)["meter"].nunique().rename("n_meters").reset_index()
+        rolled = combine(partials, keys).merge(meters, on=keys, how="left")
+
+        n = rolled["n_readings"].astype(float)
+        rolled["mean"] = rolled["energy"] / n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rolled["variance"] = ((rolled["energy_squared"] - rolled["energy"] ** 2 / n) / (n - 1)).clip(lower=0)
+
+        return rolled[keys + ["energy", "n_readings", "n_meters", "mean", "variance", "minimum", "maximum"]]
+
+    def cube(self) -> pd.DataFrame:
+        """
+        Stacks every level of the cube into one table.
+
+        Args:
+            None
+
+        Return:
+            pd.DataFrame (level and key columns followed by the columns of view)
+        """
+        views = []
+        for level in self.levels:
+            views.append(self.view(level).rename(columns={level: "key"}).assign(level=level))
+
+        stacked = pd.concat(views, ignore_index=True)
+        return stacked[["level"] + [column for column in stacked.columns if column != "level"]]
+
+def rollup_file(meter_file: str, area: pd.DataFrame, hierarchy: pd.DataFrame | None = None, spatial_index: spatial.spatial_index | None = None, freq: str | None = None, chunksize: int = 500_000) -> rollup_cube:
+    """
+    Streams a converted meter csv file through a rollup cube chunk by chunk.
+
+    Description.
+
+    Args:
+        meter_file: str - the converted meter csv file
+        area: pd.DataFrame - the building table
+        hierarchy: pd.DataFrame | None - see rollup_cube
+        spatial_index: spatial.spatial_index | None - resolves meters by location when given
+        freq: str | None - see rollup_cube
+        chunksize: int - the number of rows read per chunk
+
+    Return:
+        rollup_cube (the cube of the whole file)
+    """
+    cube = rollup_cube(hierarchy, freq)
+    for chunk in pd.read_csv(meter_file, chunksize=chunksize):
+        cube.update(rg.join_energy_area(chunk, area, spatial_index))
+
+    return cube
+
+if __name__ == '__main__':
+    """
+    Simple test cases for rollup are executed because of Debugging purposes.
+
+    Description.
+
+    Args:
+        None
+
+    Return:
+        None (test cases are executed)
+    """
+    buildings = pd.read_csv("buildings.csv")
+    print(rollup_file("output.csv", buildings, freq="M").view("campus"))
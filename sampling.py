@@ -0,0 +1,266 @@
+"""
+File: sampling.py
+Author: Ben Miller
+Brief: Stratified samples of converted meter data for fast previews, and the estimates with
+       error bounds that scale the sample back up to the whole data.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+import regression as rg
+import spatial
+
+# Days are counted from here, so the same day is picked no matter where a chunk starts
+EPOCH = pd.Timestamp("1970-01-01")
+
+def stratum_offsets(sites: np.ndarray, seed: int = 0) -> np.ndarray:
+    """
+    Gives every stratum (site and hour of day) its own fixed offset in [0, 1).
+
+    Description.
+
+    Args:
+        sites: np.ndarray - the distinct normalized site names
+        seed: int - picks another set of offsets, and with it another sample
+
+    Return:
+        np.ndarray (site x hour of day offsets)
+    """
+    hashed = pd.util.hash_pandas_object(
+        pd.DataFrame({"site": np.repeat(sites, 24), "hour": np.tile(np.arange(24), len(sites))}),
+        index=False,
+        hash_key=f"{seed:016d}"[-16:]
+    ).to_numpy()
+
+    return ((hashed >> np.uint64(11)).astype(float) / 2 ** 53).reshape(len(sites), 24)
+
+def strata(chunk: pd.DataFrame) -> tuple[pd.Series, np.ndarray, np.ndarray]:
+    """
+    Splits the rows of converted meter data into their strata and days.
+
+    Description.
+
+    Args:
+        chunk: pd.DataFrame - converted meter rows (sitename, readingtime)
+
+    Return:
+        tuple[pd.Series, np.ndarray, np.ndarray] (the normalized site, the hour of day and the day number of every row)
+    """
+    time = pd.to_datetime(chunk["readingtime"], format="ISO8601")
+    if (time.dt.tz is not None):
+        time = time.dt.tz_localize(None)
+
+    hours = time.dt.hour.to_numpy()
+    days = ((time.dt.floor("D") - EPOCH) // pd.Timedelta("1D")).to_numpy()
+
+    return chunk["sitename"].str.lower().str.strip(), hours, days
+
+def sample_mask(chunk: pd.DataFrame, fraction: float, seed: int = 0) -> np.ndarray:
+    """
+    Picks the rows of a chunk of converted meter data that belong to the sample.
+
+    The strata are the buildings (site names) and the hours of the day, within each stratum
+    the sample is whole hours on every 1 / fraction-th day (systematic, from the offset of
+    the stratum). Every stratum keeps the same fraction of its days spread evenly over the
+    whole period, and all readings of a kept hour are kept, so hourly sums stay exact.
+    The decision only depends on the row itself, so chunks can be sampled independently.
+
+    Args:
+        chunk: pd.DataFrame - converted meter rows (sitename, readingtime)
+        fraction: float - the fraction of the data to keep, in (0, 1]
+        seed: int - picks another sample
+
+    Return:
+        np.ndarray (True for the rows in the sample)
+    """
+    sites, hours, days = strata(chunk)
+    codes, distinct = pd.factorize(sites)
+    offsets = stratum_offsets(np.asarray(distinct, dtype=object), seed)[codes, hours]
+
+    # True on exactly one of every 1 / fraction consecutive days
+    position = (days + offsets) * fraction
+    return np.floor(position) > np.floor(position - fraction)
+
+def stratified_sample(meter_file: str, area: pd.DataFrame, fraction: float = 0.05, seed: int = 0, spatial_index: spatial.spatial_index | None = None, cache_dir: str = ".sample_cache", chunksize: int = 500_000) -> tuple[str, pd.DataFrame]:
+    """
+    Writes the stratified sample of a converted meter csv file (see sample_mask) to the cache folder.
+
+    The number of hours of every stratum in the whole file is counted on the way and written
+    next to the sample, the estimates scale the sample up by it (see estimate_totals). It is
+    counted over the same rows the estimates see, the positive readings joined with the
+    building table (see regression.join_energy_area). Both are reused while they are newer
+    than the meter file, so only the first preview of a file pays for reading all of it.
+
+    Args:
+        meter_file: str - the converted meter csv file
+        area: pd.DataFrame - the building table
+        fraction: float - the fraction of the data to keep, in (0, 1]
+        seed: int - picks another sample
+        spatial_index: spatial.spatial_index | None - resolves meters by location when given
+        cache_dir: str - the folder the sample and its strata are written to
+        chunksize: int - the number of rows read per chunk
+
+    Return:
+        tuple[str, pd.DataFrame] (the path of the sampled csv file and the location, hour and
+                                  n_hours of every stratum)
+    """
+    try:
+        if (not 0 < fraction <= 1):
+            raise ValueError(f"The sample fraction must be in (0, 1], got {fraction}")
+
+        # Another meter file of the same name or another building table gets its own sample
+        source = hashlib.sha1(os.path.abspath(meter_file).encode())
+        source.update(pd.util.hash_pandas_object(area, index=False).to_numpy().tobytes())
+        name = f"{os.path.splitext(os.path.basename(meter_file))[0]}-{source.hexdigest()[:12]}"
+
+        sample_file = os.path.join(cache_dir, f"{name}.sample-{fraction:g}-{seed}.csv")
+        strata_file = os.path.join(cache_dir, f"{name}.sample-{fraction:g}-{seed}.strata.csv")
+        if (
+            os.path.exists(sample_file) and os.path.exists(strata_file) and
+            min(os.path.getmtime(sample_file), os.path.getmtime(strata_file)) >= os.path.getmtime(meter_file)
+            ):
+            return sample_file, pd.read_csv(strata_file)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        first = True
+        hours_seen = []
+        for chunk in pd.read_csv(meter_file, chunksize=chunksize):
+            kept = chunk[sample_mask(chunk, fraction, seed)]
+            kept.to_csv(sample_file, index=False, mode="w" if first else "a", header=first)
+            first = False
+
+            joined = rg.join_energy_area(chunk, area, spatial_index)
+            sites, hours, days = strata(joined.assign(sitename=joined["location"]))
+            hours_seen.append(pd.DataFrame({"location": sites.to_numpy(), "hour": hours, "day": days}).drop_duplicates())
+
+        population = pd.concat(hours_seen, ignore_index=True).drop_duplicates()\
+            .groupby(["location", "hour"], as_index=False).size()\
+            .rename(columns={"size": "n_hours"})
+        population.to_csv(strata_file, index=False)
+
+        return sample_file, population
+    except Exception as e:
+        print(f"Error occured in {stratified_sample.__name__}: {e}")
+        raise RuntimeError(f"Error occured in {stratified_sample.__name__}") from e
+
+def estimate_totals(energy_hourly: pd.DataFrame, fraction: float, population: pd.DataFrame | None = None, z: float = 1.96) -> pd.DataFrame:
+    """
+    Estimates the total energy per sqft of every building from the hourly energy of a sample.
+
+    Stratified estimator over the building and hour of day strata of sample_mask, the mean
+    of every stratum is scaled up by its number of hours in the whole data (1 / fraction
+    times the sampled hours where that is unknown). The variance of every stratum mean is
+    estimated from successive differences, as fits a systematic sample, and the bounds are
+    the normal approximation.
+
+    Args:
+        energy_hourly: pd.DataFrame - the output of regression.hourly_energy on a sample
+        fraction: float - the fraction the sample was drawn with
+        population: pd.DataFrame | None - location, hour and n_hours of every stratum (see stratified_sample)
+        z: float - the normal quantile of the bounds, 1.96 for 95%
+
+    Return:
+        pd.DataFrame (location, total_energy_per_sqft, total_energy_per_sqft_error (half the
+                      width of the interval) and n_hours (the sampled hours))
+    """
+    hourly = energy_hourly.assign(hour=energy_hourly["minutely_15"].dt.hour)\
+        .sort_values(["location", "hour", "minutely_15"])
+    # Successive differences within a stratum, the sampled days are evenly spaced so the
+    # seasonal trend cancels out of them instead of counting as sampling error
+    same = (hourly["location"].eq(hourly["location"].shift()) & hourly["hour"].eq(hourly["hour"].shift())).to_numpy()
+    hourly["squared_step"] = np.where(same, hourly["energy_per_sqft"].diff() ** 2, np.nan)
+
+    sampled = hourly.groupby(["location", "hour"])\
+        .agg(n=("energy_per_sqft", "size"), mean=("energy_per_sqft", "mean"), squared_steps=("squared_step", "sum"))\
+        .reset_index()
+    sampled["var"] = sampled["squared_steps"] / (2 * (sampled["n"] - 1))
+
+    size = sampled["n"] / fraction
+    if (population is not None):
+        size = sampled.merge(population, on=["location", "hour"], how="left")["n_hours"].fillna(size)
+    size = np.maximum(size, sampled["n"])
+
+    sampled["total"] = size * sampled["mean"]
+    # A stratum with a single sampled hour has no variance estimate, it adds none
+    sampled["variance"] = size ** 2 * (1 - sampled["n"] / size) * sampled["var"].fillna(0) / sampled["n"]
+
+    totals = sampled.groupby("location", as_index=False).agg(
+        total_energy_per_sqft=("total", "sum"),
+        variance=("variance", "sum"),
+        n_hours=("n", "sum")
+    )
+    totals["total_energy_per_sqft_error"] = z * np.sqrt(totals["variance"])
+
+    return totals[["location", "total_energy_per_sqft", "total_energy_per_sqft_error", "n_hours"]]
+
+def scale_factors(energy_hourly: pd.DataFrame, fraction: float, population: pd.DataFrame | None = None) -> pd.Series:
+    """
+    Returns how much every building has to be scaled up from the sample to the whole data, its
+    hours in the whole data over its sampled hours (1 / fraction where that is unknown).
+
+    Description.
+
+    Args:
+        energy_hourly: pd.DataFrame - the output of regression.hourly_energy on a sample
+        fraction: float - the fraction the sample was drawn with
+        population: pd.DataFrame | None - location, hour and n_hours of every stratum (see stratified_sample)
+
+    Return:
+        pd.Series (location -> scale factor)
+    """
+    sampled = energy_hourly.groupby("location").size()
+    if (population is None):
+        return pd.Series(1 / fraction, index=sampled.index)
+
+    hours = population.groupby("location")["n_hours"].sum().reindex(sampled.index)
+    return (hours / sampled).fillna(1 / fraction)
+
+if __name__ == '__main__':
+    """
+    Simple test cases for sampling are executed because of Debugging purposes, checks the
+    coverage of the bounds on a synthetic year.
+
+    Description.
+
+    Args:
+        None
+
+    Return:
+        None (test cases are executed)
+    """
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2025-01-01", periods=365 * 96, freq="15min")
+    season = 1 + 0.5 * np.sin(2 * np.pi * np.arange(len(times)) / len(times))
+    daily = 1 + 0.5 * np.sin(2 * np.pi * (times.hour.to_numpy() - 6) / 24)
+
+    readings = pd.concat([
+        pd.DataFrame({
+            "sitename": f"Building {building}",
+            "readingtime": times,
+            "energy_per_sqft": season * daily * rng.gamma(4, 0.25, len(times))
+        })
+        for building in range(50)
+    ], ignore_index=True)
+    readings["location"] = readings["sitename"].str.lower()
+    readings["minutely_15"] = readings["readingtime"].dt.floor("h")
+    exact = readings.groupby("location")["energy_per_sqft"].sum()
+
+    hourly = readings.groupby(["location", "minutely_15"], as_index=False)["energy_per_sqft"].sum()
+    population = hourly.assign(hour=hourly["minutely_15"].dt.hour).groupby(["location", "hour"], as_index=False).size()\
+        .rename(columns={"size": "n_hours"})
+    for fraction in [0.02, 0.05, 0.1]:
+        covered = []
+        for seed in range(20):
+            sample = hourly.assign(sitename=hourly["location"], readingtime=hourly["minutely_15"])
+            sampled_hourly = hourly[sample_mask(sample, fraction, seed)]
+            totals = estimate_totals(sampled_hourly, fraction, population).set_index("location")
+            covered.append((abs(totals["total_energy_per_sqft"] - exact) <= totals["total_energy_per_sqft_error"]).mean())
+
+        print(f"fraction {fraction}: kept {sample_mask(sample, fraction).mean():.4f}, median relative error bound "
+              f"{(totals['total_energy_per_sqft_error'] / exact).median():.2%}, 95% interval coverage {np.mean(covered):.2%}")
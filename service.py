@@ -0,0 +1,403 @@
+"""
+File: service.py
+Author: Ben Miller
+Brief: Local HTTP query service that loads the converted meter data and building table once,
+       keeps the joined frame and per building statistics warm in memory and refreshes them
+       incrementally when the files change.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import argparse
+import io
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import regression as rg
+import rollup as ru
+import spatial
+import weather as wt
+
+"""
+Brief: The datasets behind the service. Every building keeps its readings sorted by time with a
+       running sum, so a date range query is two binary searches and a subtraction.
+"""
+class warm_dataset:
+    def __init__(self, meter_file: str, building_file: str) -> None:
+        """
+        Creates the warm dataset and loads both files.
+
+        Args:
+            meter_file: str - the converted meter csv file
+            building_file: str - the converted building csv file
+
+        Return:
+            None (warm_dataset is instantiated)
+        """
+        self.meter_file = meter_file
+        self.building_file = building_file
+        self.lock = threading.RLock()
+        self.reload()
+
+    def file_state(self, file_name: str) -> tuple[float, int]:
+        """
+        Returns the modification time and size of a file.
+
+        Args:
+            file_name: str - the file to look at
+
+        Return:
+            tuple[float, int] (mtime and size in bytes)
+        """
+        info = os.stat(file_name)
+        return info.st_mtime, info.st_size
+
+    def complete_lines(self, content: bytes) -> bytes:
+        """
+        Cuts a block of the meter file back to its last complete line.
+
+        Args:
+            content: bytes - bytes read from the meter file
+
+        Return:
+            bytes (content up to and including its last newline)
+        """
+        return content[:content.rfind(b"\n") + 1]
+
+    def reload(self) -> None:
+        """
+        Loads both files from scratch and rebuilds everything kept in memory.
+
+        Args:
+            None
+
+        Return:
+            None
+        """
+        with self.lock:
+            area = pd.read_csv(self.building_file)
+            area['location'] = area['buildingname'].str.lower().str.strip()
+            self.area = area
+            self.spatialIndex = spatial.spatial_index(area)
+
+            self.building_state = self.file_state(self.building_file)
+            modified, size = self.file_state(self.meter_file)
+            with open(self.meter_file, "rb") as file:
+                self.meter_header = file.readline()
+                file.seek(0)
+                content = self.complete_lines(file.read(size))
+
+            # The offset is what was actually read, a line still being written is read on the next refresh
+            self.meter_state = (modified, len(content))
+            energy = pd.read_csv(io.BytesIO(content))
+            self.meter_columns = list(energy.columns)
+
+            self.merged = rg.join_energy_area(energy, self.area, self.spatialIndex)
+            # The statistics come from the mergeable partials of a rollup cube, see regression.rollup_stats
+            self.rollup = ru.rollup_cube()
+            self.rollup.update(self.merged)
+            self.stats = rg.rollup_stats(self.rollup, self.area)
+            self.series = {}
+            self.index_series(self.merged)
+            self.energy_weather = None
+
+    def append(self, energy: pd.DataFrame) -> None:
+        """
+        Folds newly appended meter rows into everything kept in memory.
+
+        Only the buildings that received new rows have their time series rebuilt and the
+        statistics are updated from mergeable partials.
+
+        Args:
+            energy: pd.DataFrame - the new converted meter rows
+
+        Return:
+            None
+        """
+        with self.lock:
+            added = rg.join_energy_area(energy, self.area, self.spatialIndex)
+            self.merged = pd.concat([self.merged, added], ignore_index=True)
+            self.rollup.update(added)
+            self.stats = rg.rollup_stats(self.rollup, self.area)
+            self.index_series(self.merged[self.merged["location"].isin(added["location"].unique())])
+            self.energy_weather = None
+
+    def index_series(self, merged: pd.DataFrame) -> None:
+        """
+        Rebuilds the sorted time series and running sums of the buildings in merged.
+
+        Args:
+            merged: pd.DataFrame - every reading of the buildings to rebuild
+
+        Return:
+            None
+        """
+        for location, building in merged.groupby("location"):
+            building = building.sort_values("time")
+            values = building["energy_per_sqft"].to_numpy(dtype=float)
+            self.series[location] = (
+                building["time"].to_numpy(),
+                values,
+                np.concatenate(([0.0], np.cumsum(values)))
+            )
+
+    def refresh(self) -> str:
+        """
+        Checks both files and brings the warm datasets up to date.
+
+        A meter file that only grew (same header, larger size) is read from the previous end
+        of file onwards, any other change reloads from scratch. Only complete lines are read,
+        a line that is still being written is picked up by the next refresh.
+
+        Args:
+            None
+
+        Return:
+            str ("unchanged", "appended" or "reloaded")
+        """
+        try:
+            building_state = self.file_state(self.building_file)
+            meter_state = self.file_state(self.meter_file)
+
+            if (building_state == self.building_state and meter_state == self.meter_state):
+                return "unchanged"
+
+            with self.lock:
+                if (building_state == self.building_state and meter_state[1] > self.meter_state[1]):
+                    with open(self.meter_file, "rb") as file:
+                        header = file.readline()
+                        if (header == self.meter_header):
+                            # Only up to the size stat'd above, bytes appended since are read next time
+                            file.seek(self.meter_state[1])
+                            appended = self.complete_lines(file.read(meter_state[1] - self.meter_state[1]))
+                            self.meter_state = (meter_state[0], self.meter_state[1] + len(appended))
+                            if (len(appended) == 0):
+                                return "unchanged"
+
+                            self.append(pd.read_csv(io.BytesIO(appended), header=None, names=self.meter_columns))
+                            return "appended"
+
+                self.reload()
+                return "reloaded"
+        except Exception as e:
+            print(f"Error occured in {self.refresh.__name__}: {e}")
+            raise RuntimeError(f"Error occured in {self.refresh.__name__}") from e
+
+    def energy(self, location: str, start: str | None = None, end: str | None = None) -> dict:
+        """
+        Answers the energy per sqft of a building over a date range.
+
+        Args:
+            location: str - the building name (normalized like the building table)
+            start: str | None - the first reading time to include, None for the beginning
+            end: str | None - the reading time to stop before, None for the end
+
+        Return:
+            dict (the building, range, reading count, total, mean, best and worst energy per sqft)
+        """
+        location = location.lower().strip()
+        times, values, running = self.series[location]
+
+        lo = 0 if start is None else int(np.searchsorted(times, np.datetime64(pd.Timestamp(start)), side="left"))
+        hi = len(times) if end is None else int(np.searchsorted(times, np.datetime64(pd.Timestamp(end)), side="left"))
+        count = max(hi - lo, 0)
+        total = float(running[hi] - running[lo]) if count > 0 else 0.0
+
+        return {
+            "location": location,
+            "start": start,
+            "end": end,
+            "readings": count,
+            "total_energy_per_sqft": total,
+            "mean_energy_per_sqft": total / count if count > 0 else None,
+            "best_energy_per_sqft": float(values[lo:hi].min()) if count > 0 else None,
+            "worst_energy_per_sqft": float(values[lo:hi].max()) if count > 0 else None
+        }
+
+    def top(self, n: int = 10, by: str = "worst_energy_per_sqft", ascending: bool = False) -> list[dict]:
+        """
+        Answers the top n buildings by one of the per building statistics.
+
+        Args:
+            n: int - the number of buildings
+            by: str - the statistic to rank by
+            ascending: bool - rank from the lowest value up instead
+
+        Return:
+            list[dict] (one record per building)
+        """
+        if (by not in self.stats.columns):
+            raise ValueError(f"Unknown statistic: {by}")
+
+        return self.stats.sort_values(by, ascending=ascending).head(n).to_dict(orient="records")
+
+    def weather(self, n: int = 10, location: str | None = None) -> list[dict]:
+        """
+        Answers the weather normalized statistics of one building or the worst n buildings.
+
+        The weather join needs the weather API, it is computed on the first weather query
+        and kept until the meter data changes.
+
+        Args:
+            n: int - the number of buildings when no location is given
+            location: str | None - a single building to answer for
+
+        Return:
+            list[dict] (one record per building)
+        """
+        with self.lock:
+            if (self.energy_weather is None):
+                building_cells, weather = wt.weather_for_buildings(
+                    self.area,
+                    self.merged["time"].min().strftime('%Y-%m-%d'),
+                    self.merged["time"].max().strftime('%Y-%m-%d')
+                )
+                self.energy_weather = rg.join_weather(rg.hourly_energy(self.merged), building_cells, rg.hourly_weather(weather))
+                self.stats_weather = rg.weather_stats(self.energy_weather)
+
+        if (location is not None):
+            return self.stats_weather[self.stats_weather["location"] == location.lower().strip()].to_dict(orient="records")
+
+        return self.stats_weather.sort_values("worst", ascending=False).head(n).to_dict(orient="records")
+
+"""
+Brief: Request handler that maps GET paths onto warm_dataset queries and answers in JSON.
+"""
+class query_handler(BaseHTTPRequestHandler):
+    dataset: warm_dataset = None
+
+    def do_GET(self) -> None:
+        """
+        Answers a GET request.
+
+        Routes:
+            /energy?building=&start=&end=   energy per sqft of a building over a date range
+            /top?n=&by=&ascending=          top n buildings by a statistic
+            /weather?n=&building=           weather normalized statistics
+            /buildings                      every known building
+            /refresh                        force a refresh check
+
+        Args:
+            None
+
+        Return:
+            None (the response is written to the client)
+        """
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        started = time.perf_counter()
+
+        try:
+            if (url.path == "/energy"):
+                body = self.dataset.energy(query["building"], query.get("start"), query.get("end"))
+            elif (url.path == "/top"):
+                body = self.dataset.top(
+                    int(query.get("n", 10)),
+                    query.get("by", "worst_energy_per_sqft"),
+                    query.get("ascending", "false").lower() == "true"
+                )
+            elif (url.path == "/weather"):
+                body = self.dataset.weather(int(query.get("n", 10)), query.get("building"))
+            elif (url.path == "/buildings"):
+                body = sorted(self.dataset.series)
+            elif (url.path == "/refresh"):
+                body = {"refresh": self.dataset.refresh()}
+            else:
+                self.respond(404, {"error": f"Unknown path: {url.path}"})
+                return
+        except KeyError as e:
+            self.respond(404, {"error": f"Not found: {e}"})
+            return
+        except ValueError as e:
+            self.respond(400, {"error": str(e)})
+            return
+        except Exception as e:
+            # For example the weather API failing inside refresh or weather
+            self.respond(500, {"error": str(e)})
+            return
+
+        self.respond(200, {"result": body, "elapsed_ms": (time.perf_counter() - started) * 1000})
+
+    def respond(self, status: int, body: dict) -> None:
+        """
+        Writes a JSON response.
+
+        Args:
+            status: int - the HTTP status code
+            body: dict - the JSON body
+
+        Return:
+            None
+        """
+        payload = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        """
+        Keeps the console quiet, every request would otherwise be printed.
+        """
+        pass
+
+def serve(meter_file: str, building_file: str, host: str = "127.0.0.1", port: int = 8050, refresh_seconds: float = 5.0) -> ThreadingHTTPServer:
+    """
+    Loads the datasets and starts the query service with a background refresh thread.
+
+    Args:
+        meter_file: str - the converted meter csv file
+        building_file: str - the converted building csv file
+        host: str - the address to listen on, local only by default
+        port: int - the port to listen on
+        refresh_seconds: float - how often the files are checked for changes
+
+    Return:
+        ThreadingHTTPServer (the started server, call serve_forever on it)
+    """
+    dataset = warm_dataset(meter_file, building_file)
+    handler = type("bound_query_handler", (query_handler,), {"dataset": dataset})
+    server = ThreadingHTTPServer((host, port), handler)
+
+    def _refresh_loop():
+        while (True):
+            time.sleep(refresh_seconds)
+            try:
+                dataset.refresh()
+            except RuntimeError:
+                pass
+
+    threading.Thread(target=_refresh_loop, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    """
+    Starts the query service from the command line.
+
+    Description.
+
+    Args:
+        None
+
+    Return:
+        None (the service runs until interrupted)
+    """
+    parser = argparse.ArgumentParser(description="Local query service over converted meter and building data")
+    parser.add_argument("meter_file")
+    parser.add_argument("building_file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--refresh", type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = serve(args.meter_file, args.building_file, args.host, args.port, args.refresh)
+    print(f"Serving on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,249 @@
+"""
+File: spatial.py
+Author: Ben Miller
+Brief: Grid spatial index over the building coordinates for nearest building and radius
+       queries, used to resolve meters by location and to compare neighbouring buildings.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_METERS = 6_371_000
+
+"""
+Brief: Uniform grid over the buildings projected onto a local plane in meters. The points are
+       sorted by cell key, so a query only looks at the few cells around it through a binary
+       search instead of scanning every building.
+"""
+class spatial_index:
+    def __init__(self, buildings: pd.DataFrame, cell_meters: float = 250.0) -> None:
+        """
+        Creates the spatial index.
+
+        Buildings without coordinates are left out of the index. Distances use an
+        equirectangular projection around the mean latitude, which is well within a
+        meter of the great circle distance at campus and regional scale.
+
+        Args:
+            buildings: pd.DataFrame - the building table (location, latitude, longitude)
+            cell_meters: float - the size of a grid cell, roughly the typical query radius
+
+        Return:
+            None (spatial_index is instantiated)
+        """
+        latitude = pd.to_numeric(buildings["latitude"], errors="coerce").to_numpy(dtype=float)
+        longitude = pd.to_numeric(buildings["longitude"], errors="coerce").to_numpy(dtype=float)
+        known = ~(np.isnan(latitude) | np.isnan(longitude))
+        if (not known.any()):
+            raise ValueError("No buildings with a known location to index")
+
+        self.cell_meters = cell_meters
+        self.origin_lat = latitude[known].mean()
+        self.origin_lon = longitude[known].mean()
+        self.lon_scale = np.cos(np.radians(self.origin_lat))
+
+        x, y = self.project(latitude[known], longitude[known])
+        cx, cy = self.cell_of(x, y)
+        keys = self.key_of(cx, cy)
+
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.x = x[order]
+        self.y = y[order]
+        self.locations = buildings["location"].to_numpy()[known][order]
+
+    def project(self, latitude: np.ndarray, longitude: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Projects coordinates onto the local plane of the index.
+
+        Args:
+            latitude: np.ndarray - latitudes in degrees
+            longitude: np.ndarray - longitudes in degrees
+
+        Return:
+            tuple[np.ndarray, np.ndarray] (x and y in meters from the index origin)
+        """
+        x = EARTH_RADIUS_METERS * np.radians(np.asarray(longitude, dtype=float) - self.origin_lon) * self.lon_scale
+        y = EARTH_RADIUS_METERS * np.radians(np.asarray(latitude, dtype=float) - self.origin_lat)
+        return x, y
+
+    def cell_of(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the integer grid cell of projected points.
+
+        Args:
+            x: np.ndarray - x in meters
+            y: np.ndarray - y in meters
+
+        Return:
+            tuple[np.ndarray, np.ndarray] (the cell column and row)
+        """
+        return np.floor(x / self.cell_meters).astype(np.int64), np.floor(y / self.cell_meters).astype(np.int64)
+
+    def key_of(self, cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+        """
+        Packs a cell column and row into one sortable integer key.
+
+        Args:
+            cx: np.ndarray - the cell column
+            cy: np.ndarray - the cell row
+
+        Return:
+            np.ndarray (the cell keys)
+        """
+        # 2**21 cells either way is far more than the earth at any sensible cell size
+        return (cy + 2**21) * 2**22 + (cx + 2**21)
+
+    def candidates(self, x: float, y: float, reach: int) -> np.ndarray:
+        """
+        Returns the positions of every indexed building in the square of cells around a point.
+
+        Args:
+            x: float - the projected x of the query point
+            y: float - the projected y of the query point
+            reach: int - how many cells to look in every direction
+
+        Return:
+            np.ndarray (positions into the sorted index arrays)
+        """
+        cx, cy = self.cell_of(np.array([x]), np.array([y]))
+        offsets = np.arange(-reach, reach + 1)
+        # One key range per cell row, the columns within a row are contiguous keys
+        rows = cy[0] + offsets
+        lows = np.searchsorted(self.keys, self.key_of(np.full(len(rows), cx[0] - reach), rows), side="left")
+        highs = np.searchsorted(self.keys, self.key_of(np.full(len(rows), cx[0] + reach), rows), side="right")
+
+        counts = highs - lows
+        if (counts.sum() == 0):
+            return np.zeros(0, dtype=np.int64)
+        # Concatenated aranges of [lows[i], highs[i]) without a Python loop
+        return np.repeat(lows - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+    def radius(self, latitude: float, longitude: float, radius_meters: float) -> pd.DataFrame:
+        """
+        Finds every building within radius_meters of a point.
+
+        Args:
+            latitude: float - the latitude of the query point
+            longitude: float - the longitude of the query point
+            radius_meters: float - the search radius in meters
+
+        Return:
+            pd.DataFrame (location and distance in meters, nearest first)
+        """
+        x, y = self.project(latitude, longitude)
+        reach = int(np.ceil(radius_meters / self.cell_meters))
+        found = self.candidates(float(x), float(y), reach)
+
+        distance = np.hypot(self.x[found] - x, self.y[found] - y)
+        inside = distance <= radius_meters
+        found, distance = found[inside], distance[inside]
+        order = np.argsort(distance, kind="stable")
+
+        return pd.DataFrame({"location": self.locations[found[order]], "distance": distance[order]})
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1, max_distance: float = np.inf) -> pd.DataFrame:
+        """
+        Finds the k nearest buildings to a point.
+
+        The search grows ring by ring until k buildings have been seen and the k-th one
+        is closer than any building outside the searched square could be.
+
+        Args:
+            latitude: float - the latitude of the query point
+            longitude: float - the longitude of the query point
+            k: int - the number of buildings to return
+            max_distance: float - ignore buildings further away than this many meters
+
+        Return:
+            pd.DataFrame (location and distance in meters, nearest first, at most k rows)
+        """
+        x, y = self.project(latitude, longitude)
+        k = min(k, len(self.keys))
+        limit = np.ceil(max_distance / self.cell_meters) if np.isfinite(max_distance) else np.inf
+
+        reach = 0
+        while (True):
+            found = self.candidates(float(x), float(y), reach)
+            distance = np.hypot(self.x[found] - x, self.y[found] - y)
+            # Anything outside the searched square is at least reach cells away
+            covered = reach * self.cell_meters
+            if (len(found) >= len(self.keys) or reach >= limit or (len(found) >= k and np.sort(distance)[k - 1] <= covered)):
+                break
+            reach = reach * 2 + 1
+
+        inside = distance <= max_distance
+        found, distance = found[inside], distance[inside]
+        order = np.argsort(distance, kind="stable")[:k]
+
+        return pd.DataFrame({"location": self.locations[found[order]], "distance": distance[order]})
+
+def location_renames(sites: pd.DataFrame, index: spatial_index, known_locations: pd.Series, max_distance: float = 100.0) -> dict:
+    """
+    Maps meter sites whose name matches no building onto the nearest building by coordinates.
+
+    Args:
+        sites: pd.DataFrame - location, latitude and longitude of the meter sites
+        index: spatial_index - the index over the building table
+        known_locations: pd.Series - the building names that match by name already
+        max_distance: float - the furthest a meter may be from the building it is matched to, in meters
+
+    Return:
+        dict (unmatched site location -> building location)
+    """
+    sites = sites[~sites["location"].isin(known_locations)].dropna().drop_duplicates("location")
+
+    renames = {}
+    for site in sites.itertuples(index=False):
+        nearest = index.nearest(site.latitude, site.longitude, k=1, max_distance=max_distance)
+        if (len(nearest) > 0):
+            renames[site.location] = nearest["location"].iloc[0]
+
+    return renames
+
+def resolve_locations(energy: pd.DataFrame, index: spatial_index, known_locations: pd.Series, max_distance: float = 100.0) -> pd.Series:
+    """
+    Resolves the location of every meter row, see location_renames.
+
+    Only meters that carry latitude and longitude can be resolved, everything else keeps its
+    name (and is then dropped by the inner merge as before).
+
+    Args:
+        energy: pd.DataFrame - meter data with location, latitude and longitude
+        index: spatial_index - the index over the building table
+        known_locations: pd.Series - the building names that match by name already
+        max_distance: float - the furthest a meter may be from the building it is matched to, in meters
+
+    Return:
+        pd.Series (the resolved location of every row of energy)
+    """
+    sites = energy[["location", "latitude", "longitude"]].drop_duplicates("location")
+    return energy["location"].replace(location_renames(sites, index, known_locations, max_distance))
+
+def better_neighbours(index: spatial_index, area: pd.DataFrame, stats: pd.DataFrame, location: str, radius_meters: float = 500.0, column: str = "total_energy_per_sqft") -> pd.DataFrame:
+    """
+    Lists the buildings within radius_meters of a building that use less energy per sqft.
+
+    Args:
+        index: spatial_index - the index over the building table
+        area: pd.DataFrame - the building table (location, latitude, longitude)
+        stats: pd.DataFrame - per building statistics keyed by location
+        location: str - the building to compare against
+        radius_meters: float - the neighbourhood radius in meters
+        column: str - the statistic to compare, lower is better
+
+    Return:
+        pd.DataFrame (location, distance and the statistic of every better neighbour, best first)
+    """
+    building = area[area["location"] == location].iloc[0]
+    own = stats.loc[stats["location"] == location, column].iloc[0]
+
+    neighbours = index.radius(float(building["latitude"]), float(building["longitude"]), radius_meters)
+    neighbours = neighbours[neighbours["location"] != location]\
+        .merge(stats[["location", column]], on="location", how="inner")
+
+    return neighbours[neighbours[column] < own].sort_values(column).reset_index(drop=True)
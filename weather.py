@@ -0,0 +1,136 @@
+"""
+File: weather.py
+Author: Ben Miller
+Brief: Fetches historical weather per weather grid cell so that every building is matched
+       with the weather at its own location, each cell is only fetched and cached once.
+Version: 0.1
+Date: 02-2026
+
+Copyright: Copyright (c) 2026
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import requests
+
+WEATHER_URL = "https://historical-forecast-api.open-meteo.com/v1/forecast"
+
+def snap_to_cell(latitude: pd.Series, longitude: pd.Series, cell_size: float = 0.1) -> pd.DataFrame:
+    """
+    Snaps coordinates onto a regular latitude / longitude grid.
+
+    Buildings within the same cell share one weather series, 0.1 degrees is roughly
+    the resolution of the weather models behind the API (about 11 km).
+
+    Args:
+        latitude: pd.Series - the latitude of every building
+        longitude: pd.Series - the longitude of every building
+        cell_size: float - the size of a grid cell in degrees
+
+    Return:
+        pd.DataFrame (cell_y and cell_x integer cell indices, cell_lat and cell_lon cell centers)
+    """
+    cell_y = np.floor(latitude.to_numpy(dtype=float) / cell_size)
+    cell_x = np.floor(longitude.to_numpy(dtype=float) / cell_size)
+
+    return pd.DataFrame({
+        "cell_y": cell_y,
+        "cell_x": cell_x,
+        "cell_lat": (cell_y + 0.5) * cell_size,
+        "cell_lon": (cell_x + 0.5) * cell_size
+    }, index=latitude.index)
+
+def fetch_weather(latitude: float, longitude: float, start_date: str, end_date: str, cache_dir: str | None = ".weather_cache") -> pd.DataFrame:
+    """
+    Fetches the 15 minute apparent temperature and humidity at a single location.
+
+    Responses are cached on disk per location and date range, so repeated runs over the
+    same period never hit the API again.
+
+    Args:
+        latitude: float - the latitude to fetch the weather for
+        longitude: float - the longitude to fetch the weather for
+        start_date: str - the first day to fetch (YYYY-MM-DD)
+        end_date: str - the last day to fetch (YYYY-MM-DD)
+        cache_dir: str | None - the folder responses are cached in, None disables the cache
+
+    Return:
+        pd.DataFrame (time, apparent_temp and humidity every 15 minutes)
+    """
+    cache_file = None
+    if (cache_dir is not None):
+        cache_file = os.path.join(cache_dir, f"{latitude:.4f}_{longitude:.4f}_{start_date}_{end_date}.csv")
+        if (os.path.exists(cache_file)):
+            return pd.read_csv(cache_file, parse_dates=["time"])
+
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "start_date": start_date,
+        "end_date": end_date,
+        "minutely_15": [
+            "temperature_2m",
+            "relative_humidity_2m",
+            "apparent_temperature"
+        ],
+        "temperature_unit": "fahrenheit",
+        "precipitation_unit": "inch"
+    }
+
+    response = requests.get(WEATHER_URL, params=params)
+    data = response.json()
+
+    weather = pd.DataFrame({
+        "time": pd.to_datetime(data["minutely_15"]["time"]),
+        "apparent_temp": data["minutely_15"]["apparent_temperature"],
+        "humidity": data["minutely_15"]["relative_humidity_2m"],
+    })
+
+    if (cache_file is not None):
+        os.makedirs(cache_dir, exist_ok=True)
+        weather.to_csv(cache_file, index=False)
+
+    return weather
+
+def weather_for_buildings(area: pd.DataFrame, start_date: str, end_date: str, cell_size: float = 0.1, cache_dir: str | None = ".weather_cache") -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Resolves the weather for every building through its weather grid cell.
+
+    Buildings are snapped to cells, the distinct cells are fetched once each, so the number
+    of requests scales with the number of cells rather than the number of buildings.
+    Buildings without coordinates use the cell at the mean of the known coordinates.
+
+    Args:
+        area: pd.DataFrame - the building table (location, latitude, longitude)
+        start_date: str - the first day to fetch (YYYY-MM-DD)
+        end_date: str - the last day to fetch (YYYY-MM-DD)
+        cell_size: float - the size of a grid cell in degrees
+        cache_dir: str | None - the folder responses are cached in, None disables the cache
+
+    Return:
+        tuple[pd.DataFrame, pd.DataFrame] (location -> cell_y, cell_x for every building and the
+                                           15 minute weather of every cell keyed by cell_y, cell_x)
+    """
+    try:
+        latitude = pd.to_numeric(area["latitude"], errors="coerce")
+        longitude = pd.to_numeric(area["longitude"], errors="coerce")
+        latitude = latitude.fillna(latitude.mean())
+        longitude = longitude.fillna(longitude.mean())
+
+        cells = snap_to_cell(latitude, longitude, cell_size)
+        building_cells = pd.concat([area[["location"]], cells[["cell_y", "cell_x"]]], axis=1)\
+            .drop_duplicates("location")
+
+        distinct = cells.drop_duplicates(["cell_y", "cell_x"])
+        weather = []
+        for cell in distinct.itertuples(index=False):
+            cell_weather = fetch_weather(cell.cell_lat, cell.cell_lon, start_date, end_date, cache_dir)
+            cell_weather["cell_y"] = cell.cell_y
+            cell_weather["cell_x"] = cell.cell_x
+            weather.append(cell_weather)
+
+        return building_cells, pd.concat(weather, ignore_index=True)
+    except Exception as e:
+        print(f"Error occured in {weather_for_buildings.__name__}: {e}")
+        raise RuntimeError(f"Error occured in {weather_for_buildings.__name__}") from e